@@ -0,0 +1,153 @@
+"""
+Database contention benchmark.
+Runs the app's write/read mix from several threads at once (processing
+workers updating job status, /start and /analyze inserting rows, recruiter
+endpoints listing sessions) and reports throughput, latency percentiles
+and "database is locked" errors per configuration.
+
+    python bench_db.py                                 # SQLite: rollback journal vs WAL
+    python bench_db.py --url postgresql://user:pw@host/db   # plus a Postgres run
+"""
+import os
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select, update, delete
+from database import make_engine, run_migrations, is_sqlite
+from models import Interview, ProcessingJob, AnswerTranscript
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(q * len(values)), len(values) - 1)] * 1000, 1)
+
+class Bench:
+    def __init__(self, engine, run_id: str):
+        self.engine = engine
+        self.run_id = run_id
+        self.latencies = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def _timed(self, name: str, fn):
+        began = time.monotonic()
+        try:
+            fn()
+        except OperationalError as e:
+            with self.lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            return
+        with self.lock:
+            self.latencies.setdefault(name, []).append(time.monotonic() - began)
+
+    # --- Workload (mirrors job_queue / routers) ---
+
+    def start_session(self):
+        with Session(self.engine) as db:
+            db.add(Interview(id=f"{self.run_id}-{uuid.uuid4()}", candidate_name="Bench", candidate_email="bench@example.com"))
+            db.commit()
+
+    def store_transcript(self):
+        with Session(self.engine) as db:
+            db.add(AnswerTranscript(session_id=self.run_id, question_id=1, transcript="word " * 40))
+            db.commit()
+
+    def process_job(self):
+        # enqueue -> conditional claim -> status updates -> finish, like a processing worker
+        with Session(self.engine) as db:
+            job = ProcessingJob(session_id=self.run_id)
+            db.add(job)
+            db.commit()
+            job_id = job.id
+            result = db.exec(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == job_id)
+                .where(ProcessingJob.status == "queued")
+                .values(status="running", locked_by="bench", locked_at=datetime.utcnow())
+            )
+            db.commit()
+            if result.rowcount == 1:
+                for status in ("processing", "done"):
+                    db.exec(update(ProcessingJob).where(ProcessingJob.id == job_id).values(status=status, updated_at=datetime.utcnow()))
+                    db.commit()
+
+    def list_sessions(self):
+        with Session(self.engine) as db:
+            db.exec(select(Interview).order_by(Interview.created_at.desc()).limit(50)).all()
+
+    def run(self, seconds: float, writers: int, workers: int, readers: int) -> dict:
+        stop = time.monotonic() + seconds
+        def loop(ops):
+            i = 0
+            while time.monotonic() < stop:
+                name, fn = ops[i % len(ops)]
+                self._timed(name, fn)
+                i += 1
+        roles = (
+            [[("start", self.start_session), ("transcript", self.store_transcript)]] * writers
+            + [[("job", self.process_job)]] * workers
+            + [[("list", self.list_sessions)]] * readers
+        )
+        threads = [threading.Thread(target=loop, args=(ops,)) for ops in roles]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        every = [v for values in self.latencies.values() for v in values]
+        return {
+            "ops": len(every),
+            "ops_per_s": round(len(every) / seconds, 1),
+            "p50_ms": _percentile(every, 0.5),
+            "p95_ms": _percentile(every, 0.95),
+            "p99_ms": _percentile(every, 0.99),
+            "errors": sum(self.errors.values()),
+            "by_op": {name: {"n": len(v), "p95_ms": _percentile(v, 0.95)} for name, v in sorted(self.latencies.items())},
+        }
+
+    def cleanup(self):
+        with Session(self.engine) as db:
+            db.exec(delete(Interview).where(Interview.id.like(f"{self.run_id}-%")))
+            db.exec(delete(AnswerTranscript).where(AnswerTranscript.session_id == self.run_id))
+            db.exec(delete(ProcessingJob).where(ProcessingJob.session_id == self.run_id))
+            db.commit()
+
+def bench(label: str, url: str, journal_mode: str, args) -> dict:
+    engine = make_engine(url, journal_mode=journal_mode)
+    run_migrations(engine)
+    runner = Bench(engine, f"bench-{uuid.uuid4().hex[:8]}")
+    try:
+        result = runner.run(args.seconds, args.writers, args.workers, args.readers)
+    finally:
+        runner.cleanup()
+        engine.dispose()
+    print(f"{label:<24} {result['ops']:>7} {result['ops_per_s']:>8} {result['p50_ms']!s:>8} {result['p95_ms']!s:>8} {result['p99_ms']!s:>8} {result['errors']:>7}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", default=[], help="extra DATABASE_URL to compare (e.g. Postgres)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4, help="threads inserting sessions/transcripts")
+    parser.add_argument("--workers", type=int, default=2, help="threads running processing-job updates")
+    parser.add_argument("--readers", type=int, default=4, help="threads listing sessions")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.workers} job workers, {args.readers} readers, {args.seconds:.0f}s each")
+    print(f"{'config':<24} {'ops':>7} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Scratch files: never benchmark against the real sessions.db
+        for mode in ("delete", "wal"):
+            bench(f"sqlite ({mode})", f"sqlite:///{os.path.join(tmp, mode + '.db')}", mode, args)
+    for url in args.url:
+        bench(url.split("://")[0] + ("" if not is_sqlite(url) else " (wal)"), url, "wal", args)
+
+if __name__ == "__main__":
+    main()
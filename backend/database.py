@@ -1,14 +1,115 @@
+"""
+Database
+Engine for DATABASE_URL (default: SQLite sessions.db next to the app).
+SQLite connections run in WAL mode with a busy timeout, so the processing
+workers' commits do not block request handlers reading the same file;
+Postgres gets a pre-pinged connection pool. Schema changes are applied by
+run_migrations() (startup, or `python migrate.py`).
+"""
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import event, text, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import SQLModel, create_engine, Session
 
-sqlite_file_name = "sessions.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+# Load Env (main.py imports this module before its own load_dotenv calls)
+env_path = Path(__file__).resolve().parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///sessions.db")
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+# SQLite
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal") # wal | delete (the SQLite default)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")) # wait for the writer lock instead of failing
+# Pool (one connection per worker thread / in-flight request)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def make_engine(url: str = DATABASE_URL, journal_mode: str = SQLITE_JOURNAL_MODE) -> Engine:
+    """Engine with the pool and (SQLite) connection pragmas for `url`."""
+    pool_args = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+
+    if not is_sqlite(url):
+        # Postgres (or another server DB): drop connections the server or a proxy closed
+        return create_engine(url, pool_pre_ping=True, pool_recycle=DB_POOL_RECYCLE_SECONDS, **pool_args)
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **({} if in_memory else pool_args)
+    )
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            # WAL: readers never block the writer and vice versa; one writer at a time
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        if journal_mode.lower() == "wal":
+            cursor.execute("PRAGMA synchronous=NORMAL") # durable at checkpoints; safe with WAL
+        cursor.close()
+
+    return engine
+
+engine = make_engine()
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+# --- Migrations ---
+
+def _hot_path_indexes(conn):
+    # create_all only creates indexes for new tables; these back the queue claim and per-answer lookups
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_processingjob_status_run_after ON processingjob (status, run_after)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_answertranscript_session_question ON answertranscript (session_id, question_id, attempt)"))
+
+# Changes create_all cannot make to existing tables (new tables need no entry).
+# (version, description, step). Steps must be idempotent: two workers may start at once.
+MIGRATIONS = [
+    (1, "Composite indexes for job claims and answer transcripts", _hot_path_indexes),
+]
+
+def run_migrations(target: Engine = None) -> list:
+    """Creates missing tables, then applies pending MIGRATIONS in order; returns the versions applied."""
+    import models # noqa: F401 (registers every table on SQLModel.metadata)
+    from models import SchemaMigration
+    target = target or engine
+    SQLModel.metadata.create_all(target)
+    with target.connect() as conn:
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schemamigration"))}
+
+    done = []
+    for version, description, step in MIGRATIONS:
+        if version in applied:
+            continue
+        with target.begin() as conn:
+            step(conn)
+        try:
+            with Session(target) as db:
+                db.add(SchemaMigration(version=version, description=description))
+                db.commit()
+        except IntegrityError:
+            pass # another worker recorded it first
+        print(f"Migration {version} applied: {description}")
+        done.append(version)
+    return done
+
+def schema_version(target: Engine = None) -> int:
+    target = target or engine
+    if not inspect(target).has_table("schemamigration"):
+        return 0
+    with target.connect() as conn:
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schemamigration")).scalar()
+
+def create_db_and_tables():
+    run_migrations()
@@ -1,10 +1,8 @@
-from sqlmodel import Session, select, create_engine
+from sqlmodel import Session, select
 from models import Interview
+from database import engine # DATABASE_URL, same as the app
 import json
 
-sqlite_url = "sqlite:///./sessions.db"
-engine = create_engine(sqlite_url)
-
 def inspect_latest():
     with Session(engine) as session:
         statement = select(Interview).order_by(Interview.created_at.desc()).limit(1)
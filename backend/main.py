@@ -3,10 +3,15 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from database import create_db_and_tables
+from services.job_queue import start_worker_pool, stop_worker_pool
+from services.providers import start_providers, stop_providers, get_providers
+from services.audio_cache import prebake_question_audio
+import asyncio
+import threading
 from dotenv import load_dotenv
 import os
 # Explicitly import models to map them to SQLModel.metadata
-from models import Interview
+from models import Interview, ProcessingJob
 
 # Load env from parent directory (since .env is in root, and we run from root or backend)
 # We assume we run from root? Or backend? 
@@ -16,14 +21,33 @@ load_dotenv(dotenv_path="../.env") # Try looking in parent if running from backe
 load_dotenv(dotenv_path=".env")
 
 # Routers
-from routers import interview
+from routers import interview, media, heygen
+from services.heygen_sessions import start_session_pool, stop_session_pool
+
+# HeyGen streaming avatar (off for the Voice-Only Pivot); enables the routes and the pre-warmed session pool
+HEYGEN_ENABLED = os.getenv("HEYGEN_ENABLED", "false").lower() in ("1", "true", "yes")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create tables
+    # Startup: Create tables, warm shared provider clients, start processing workers (re-queues orphaned jobs)
     create_db_and_tables()
+    await start_providers()
+    start_worker_pool()
+    if HEYGEN_ENABLED:
+        start_session_pool()
+    # Question prompts are rendered in the background; the first request renders on demand
+    prebake_stop = threading.Event()
+    prebake = asyncio.create_task(asyncio.to_thread(prebake_question_audio, prebake_stop))
     yield
-    # Shutdown
+    # Shutdown (prebake and workers first, they use the provider clients)
+    prebake_stop.set()
+    try:
+        await prebake # at most the clip being rendered
+    except Exception as e:
+        print(f"TTS prebake failed: {e}")
+    stop_worker_pool()
+    await stop_session_pool()
+    await stop_providers()
 
 app = FastAPI(title="National Foods Interview Demo", lifespan=lifespan)
 
@@ -43,7 +67,9 @@ app.add_middleware(
 
 app.include_router(interview.router)
 app.include_router(interview.recruiter_router)
-# app.include_router(heygen.router, prefix="/api") # Disabled for Voice-Only Pivot
+app.include_router(media.router)
+if HEYGEN_ENABLED:
+    app.include_router(heygen.router, prefix="/api") # Disabled by default for Voice-Only Pivot
 
 @app.exception_handler(Exception)
 async def all_exception_handler(request, exc):
@@ -72,3 +98,20 @@ async def all_exception_handler(request, exc):
 @app.get("/")
 def read_root():
     return {"message": "National Foods Interview API is running"}
+
+@app.get("/api/health")
+def health():
+    """Liveness plus provider warmup results and connection pool usage."""
+    return {"status": "ok", "providers": get_providers().stats()}
+
+@app.get("/api/llm-cache/stats")
+def llm_cache_stats():
+    """Hit/miss counters and size of the on-disk LLM response cache."""
+    from services.llm import cache_stats
+    return cache_stats()
+
+@app.get("/api/intent/stats")
+def intent_stats():
+    """How answers were decided (heuristic / local / llm / fallback) and the LLM call rate."""
+    from services.intent_classifier import decision_stats
+    return decision_stats()
@@ -0,0 +1,9 @@
+from database import DATABASE_URL, run_migrations, schema_version
+
+# Apply pending schema migrations to DATABASE_URL (also runs at app startup)
+if __name__ == "__main__":
+    print(f"Database: {DATABASE_URL.split('@')[-1]}") # no credentials
+    print(f"Schema version before: {schema_version()}")
+    applied = run_migrations()
+    print(f"Applied: {applied or 'nothing (up to date)'}")
+    print(f"Schema version now: {schema_version()}")
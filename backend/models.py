@@ -8,7 +8,7 @@ class Interview(SQLModel, table=True):
     candidate_email: str
     
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    status: str = Field(default="started") # started, uploaded, processed, completed, failed
+    status: str = Field(default="started") # started, uploaded, queued, processing, completed, failed
     
     video_url: Optional[str] = None
     transcript_text: Optional[str] = None # Full transcript
@@ -18,3 +18,89 @@ class Interview(SQLModel, table=True):
     scores: Optional[dict] = Field(default=None, sa_type=JSON) 
     
     transcript_segments: Optional[List[dict]] = Field(default=None, sa_type=JSON)
+
+class ProcessingJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(index=True)
+    
+    status: str = Field(default="queued", index=True) # queued, running, done, failed
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    run_after: datetime = Field(default_factory=datetime.utcnow) # Backoff: not claimable before this
+    
+    locked_by: Optional[str] = None # worker id (host:pid:n)
+    locked_at: Optional[datetime] = None # heartbeat; stale => orphaned
+    last_error: Optional[str] = None
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class StageCheckpoint(SQLModel, table=True):
+    # Manifest of content-addressed stage outputs (see services/checkpoints.py)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    stage: str = Field(index=True) # audio, stt, transcript, scores
+    input_key: str = Field(index=True) # hash of everything the output depends on
+    digest: str # sha256 of the stored artifact
+    session_id: Optional[str] = Field(default=None, index=True)
+    size: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AnswerTranscript(SQLModel, table=True):
+    # Live transcript of one answer attempt, captured by /api/interview/analyze
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(index=True)
+    question_id: int
+    attempt: int = Field(default=0) # 0=First, 1=Nudge, 2=Rephrase
+    
+    transcript: str = Field(default="")
+    status: str = Field(default="ok") # ok, silence, error
+    confidence: Optional[float] = None # top STT alternative, if reported
+    
+    # Clip position in the full recording (ms since recorder start, client clock)
+    clip_start_ms: Optional[int] = None
+    clip_end_ms: Optional[int] = None
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AvatarVideo(SQLModel, table=True):
+    # Rendered D-ID clip, keyed by a hash of everything that changes the video (see services/avatar_cache.py)
+    cache_key: str = Field(primary_key=True)
+    label: str = Field(index=True) # intro, q1, nudge, ...
+    status: str = Field(default="pending", index=True) # pending, ready, failed
+    
+    talk_id: Optional[str] = None
+    video_url: Optional[str] = None
+    duration: Optional[float] = None
+    url_expires_at: Optional[datetime] = None # provider result URLs are presigned
+    timings: Optional[dict] = Field(default=None, sa_type=JSON)
+    
+    claimed_by: Optional[str] = None # host:pid:n of the renderer
+    claimed_at: Optional[datetime] = None # stale => renderer died, claimable again
+    last_error: Optional[str] = None
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class MirroredMedia(SQLModel, table=True):
+    # Local copy of provider-hosted media (see services/media_mirror.py)
+    media_key: str = Field(primary_key=True) # "<kind>/<content key>", e.g. avatar/<AvatarVideo.cache_key>
+    kind: str = Field(index=True) # avatar
+    status: str = Field(default="ready", index=True) # ready, failed, evicted
+    
+    source_url: Optional[str] = None
+    source_expires_at: Optional[datetime] = None # after this only our copy is left
+    filename: Optional[str] = None # relative to MEDIA_MIRROR_DIR
+    content_type: str = Field(default="application/octet-stream")
+    size: int = Field(default=0)
+    sha256: Optional[str] = None
+    last_error: Optional[str] = None
+    
+    mirrored_at: Optional[datetime] = None
+    last_access_at: Optional[datetime] = None # LRU clock for eviction
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SchemaMigration(SQLModel, table=True):
+    # Applied schema versions (see database.MIGRATIONS)
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
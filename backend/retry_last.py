@@ -1,4 +1,4 @@
-from sqlmodel import Session, select, create_engine
+from sqlmodel import Session, select
 from models import Interview
 from services.processing import process_interview_background
 import os
@@ -13,9 +13,8 @@ load_dotenv(dotenv_path=env_path)
 conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 print(f"Env Loaded. Conn Str Pre: {conn_str[:5] if conn_str else 'None'}")
 
-# Setup DB
-sqlite_url = "sqlite:///./sessions.db"
-engine = create_engine(sqlite_url)
+# Setup DB (DATABASE_URL, same as the app; imported after .env is loaded)
+from database import engine
 
 def retry_latest():
     with Session(engine) as session:
@@ -1,64 +1,187 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Form, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 from database import get_session
-from models import Interview
-from services.blob_storage import upload_video_to_blob
-from services.processing import process_interview_background
-from services.tts import get_question_audio_stream
+from models import Interview, AnswerTranscript
+from services.blob_storage import open_streaming_video_upload, stage_video_chunk, commit_video_chunks, NoStagedChunks, generate_sas_url
+from services.upload_stream import stream_multipart_file
+from starlette.concurrency import run_in_threadpool
+from services.job_queue import enqueue_processing, latest_job
+from services.audio_cache import question_audio_path, question_envelope, get_audio_cache, clip_key
+from services.lipsync import ENVELOPE_RATE, CHANNELS
+from services.tts import QUESTIONS
+from services.ranged_file import ranged_file_response
 import uuid
+import json
+import itertools
+import asyncio
 
 router = APIRouter(prefix="/api/interview", tags=["interview"])
 recruiter_router = APIRouter(prefix="/api/recruiter", tags=["recruiter"])
 
+# Explicit CORS headers for Web Audio API analysis
+AUDIO_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Expose-Headers": "Content-Length, Content-Type, Content-Range, Accept-Ranges, ETag, X-Envelope-Rate, X-Envelope-Channels",
+}
+
+def _envelope_response(envelope: bytes, etag: str):
+    return Response(content=envelope, media_type="application/octet-stream", headers={
+        **AUDIO_CORS_HEADERS,
+        "Cache-Control": "public, max-age=3600",
+        "ETag": etag,
+        "X-Envelope-Rate": str(ENVELOPE_RATE),
+        "X-Envelope-Channels": str(CHANNELS),
+    })
+
 @router.get("/audio/{key}")
-def get_audio(key: str):
-    """Stream audio for a specific question/prompt."""
+@router.head("/audio/{key}", include_in_schema=False)
+async def get_audio(key: str, request: Request):
+    """Serve the prebaked clip for a specific question/prompt."""
     # Convert key to int if digit, else keep string (intro/outro)
     lookup_key = int(key) if key.isdigit() else key
-    audio_stream = get_question_audio_stream(lookup_key)
+    try:
+        # Rendered once (startup or first request), then served from disk
+        path = await run_in_threadpool(question_audio_path, lookup_key)
+    except Exception as e:
+        print(f"TTS Error for {key}: {e}")
+        raise HTTPException(status_code=502, detail="Audio generation failed")
     
-    if not audio_stream:
+    if not path:
         raise HTTPException(status_code=404, detail="Audio not found")
     
-    # Explicit CORS headers for Web Audio API analysis
-    headers = {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET, OPTIONS",
-        "Access-Control-Allow-Headers": "*",
-        "Access-Control-Expose-Headers": "Content-Length, Content-Type",
-    }
-    return StreamingResponse(audio_stream, media_type="audio/mpeg", headers=headers)
-
-from services.tts import generate_audio_stream
+    # The file name is the content hash, so it doubles as a strong ETag
+    return ranged_file_response(
+        request, path, "audio/mpeg",
+        cache_control="public, max-age=3600",
+        etag=f'"{path.stem}"',
+        headers=AUDIO_CORS_HEADERS,
+    )
+
+@router.get("/audio/{key}/envelope")
+async def get_audio_envelope(key: str):
+    """Lip-sync envelope for a question clip (see services/lipsync.py for the layout)."""
+    lookup_key = int(key) if key.isdigit() else key
+    try:
+        envelope = await run_in_threadpool(question_envelope, lookup_key)
+    except Exception as e:
+        print(f"Envelope Error for {key}: {e}")
+        raise HTTPException(status_code=502, detail="Envelope generation failed")
+    if envelope is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return _envelope_response(envelope, f'"{clip_key(QUESTIONS[lookup_key])}-env"')
+
 from pydantic import BaseModel
+from fastapi.responses import Response
 
 class SynthesizeRequest(BaseModel):
     text: str
 
 @router.post("/synthesize")
 def synthesize(req: SynthesizeRequest):
-    """Generate audio for arbitrary text (Nudges/Rephrases)."""
-    audio_stream = generate_audio_stream(req.text)
-    if not audio_stream:
+    """Generate audio for arbitrary text (Nudges/Rephrases), cached by text and voice."""
+    if not req.text or not req.text.strip():
+        raise HTTPException(status_code=422, detail="Empty text")
+    try:
+        audio, source = get_audio_cache().get_bytes(req.text)
+    except Exception as e:
+        print(f"TTS Error: {e}")
         raise HTTPException(status_code=500, detail="TTS generation failed")
-    return StreamingResponse(audio_stream, media_type="audio/mpeg")
+    return Response(content=audio, media_type="audio/mpeg", headers={
+        "ETag": f'"{clip_key(req.text)}"',
+        "X-TTS-Cache": source,
+    })
+
+MAX_STREAM_TEXT = 1000
+
+@router.get("/synthesize/stream")
+def synthesize_stream(text: str = ""):
+    """
+    Streaming variant of /synthesize for <audio src=...>: bytes are forwarded
+    as the provider produces them (chunked), so playback starts early.
+    """
+    if not text.strip() or len(text) > MAX_STREAM_TEXT:
+        raise HTTPException(status_code=422, detail="Text must be 1-1000 characters")
+    chunks, source = get_audio_cache().stream(text)
+    try:
+        # Wait for the first chunk here so provider errors are a 502, not a truncated 200
+        first = next(chunks, b"")
+    except Exception as e:
+        print(f"TTS Stream Error: {e}")
+        raise HTTPException(status_code=502, detail="TTS generation failed")
+    return StreamingResponse(itertools.chain([first], chunks), media_type="audio/mpeg", headers={
+        **AUDIO_CORS_HEADERS,
+        "Cache-Control": "public, max-age=3600",
+        "X-TTS-Cache": source,
+    })
 
+@router.get("/synthesize/envelope")
+def synthesize_envelope(text: str = ""):
+    """
+    Lip-sync envelope for a /synthesize clip; waits for an in-flight render of
+    the same text but never starts one. 404 if there is no clip (the avatar
+    keeps its generic motion or falls back to analysing the audio).
+    """
+    if not text.strip() or len(text) > MAX_STREAM_TEXT:
+        raise HTTPException(status_code=422, detail="Text must be 1-1000 characters")
+    try:
+        envelope = get_audio_cache().get_envelope(text)
+    except Exception as e:
+        print(f"Envelope Error: {e}")
+        raise HTTPException(status_code=502, detail="Envelope generation failed")
+    if envelope is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return _envelope_response(envelope, f'"{clip_key(text)}-env"')
 
-    return StreamingResponse(audio_stream, media_type="audio/mpeg")
+@router.get("/synthesize/stats")
+def synthesize_stats():
+    """Size, hit rate and evictions of the TTS clip cache."""
+    return get_audio_cache().stats()
 
 from fastapi import Request
 
+def _store_live_transcript(db: Session, fields: dict, result: dict):
+    """Keep the per-answer transcript so final processing need not re-transcribe it."""
+    if not fields.get("session_id") or fields.get("question_id") is None:
+        return
+    try:
+        # Live (WebSocket) and HTTP fallback may both report the same attempt; keep the latest
+        for old in db.exec(
+            select(AnswerTranscript)
+            .where(AnswerTranscript.session_id == fields["session_id"])
+            .where(AnswerTranscript.question_id == fields["question_id"])
+            .where(AnswerTranscript.attempt == fields["attempt"])
+        ).all():
+            db.delete(old)
+        db.add(AnswerTranscript(
+            session_id=fields["session_id"],
+            question_id=fields["question_id"],
+            attempt=fields["attempt"],
+            transcript=result.get("transcript", ""),
+            status=result.get("stt_status", "error"),
+            confidence=result.get("confidence"),
+            clip_start_ms=fields.get("clip_start_ms"),
+            clip_end_ms=fields.get("clip_end_ms"),
+        ))
+        db.commit()
+    except Exception as e:
+        print(f"Failed to store live transcript: {e}")
+
+def _optional_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 @router.post("/analyze")
-async def analyze_response(request: Request):
+async def analyze_response(request: Request, db: Session = Depends(get_session)):
     """
     Analyze the uploaded audio chunk to decide the next orchestration step.
     Uses raw Request parsing to avoid Pydantic 422 Coercion errors.
     """
-    import shutil
-    import tempfile
-    import os
-    from services.analysis import analyze_answer_intent
+    from services.analysis import analyze_answer_audio
     
     # 1. Manual Form Parsing (Fail-Safe)
     try:
@@ -73,6 +196,14 @@ async def analyze_response(request: Request):
         except:
             attempt_int = 0
             
+        live_fields = {
+            "session_id": form.get("session_id"),
+            "question_id": _optional_int(form.get("question_id")),
+            "attempt": attempt_int,
+            "clip_start_ms": _optional_int(form.get("clip_start_ms")),
+            "clip_end_ms": _optional_int(form.get("clip_end_ms")),
+        }
+            
         print(f"Analyzing: File={file.filename if file else 'None'}, Q='{question_text}', Attempt={attempt_int}")
         
         if not file:
@@ -83,37 +214,14 @@ async def analyze_response(request: Request):
         print(f"Form Parse Error: {e}")
         return {"action": "next", "reason": "Form Parse Error", "transcript": ""}
 
-    # Save Temp Audio
-    fd, temp_path = tempfile.mkstemp(suffix=".webm")
-    os.close(fd)
-    
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_size = os.path.getsize(temp_path)
-        print(f"Saved audio file: {file_size} bytes")
-        
-        # Convert WebM to WAV
-        wav_path = temp_path + ".wav"
-        import subprocess
-        result = subprocess.run(
-            ["ffmpeg", "-y", "-i", temp_path, "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", wav_path],
-            capture_output=True, text=True
-        )
+        audio_bytes = await file.read()
+        print(f"Received audio clip: {len(audio_bytes)} bytes")
         
-        if result.returncode != 0:
-            print(f"FFmpeg error: {result.stderr}")
-            # Try to continue anyway, maybe the wav was created
-        
-        if not os.path.exists(wav_path) or os.path.getsize(wav_path) < 100:
-            print("WAV conversion failed or file too small")
-            return {"action": "nudge", "reason": "Audio conversion failed", "transcript": ""}
-        
-        print(f"WAV file created: {os.path.getsize(wav_path)} bytes")
-        
-        result = analyze_answer_intent(wav_path, str(question_text), attempt_int)
+        result = await analyze_answer_audio(audio_bytes, str(question_text), attempt_int, live_fields["session_id"] or "",
+                                            budget_ms=_optional_int(form.get("budget_ms")))
         print(f"Analysis result: {result}")
+        await run_in_threadpool(_store_live_transcript, db, live_fields, result)
         return result
         
     except Exception as e:
@@ -121,10 +229,77 @@ async def analyze_response(request: Request):
         import traceback
         traceback.print_exc()
         return {"action": "next", "reason": f"Error: {str(e)}", "transcript": ""}
+
+@router.websocket("/ws/analyze")
+async def analyze_stream(websocket: WebSocket, db: Session = Depends(get_session)):
+    """
+    Streaming variant of /analyze, one connection per answer attempt:
+    -> {"type": "start", session_id, question_id, question_text, attempt, clip_start_ms}
+    -> binary MediaRecorder chunks (webm/opus) while the candidate speaks
+    -> {"type": "end", clip_end_ms, budget_ms}
+    <- {"type": "partial", transcript} as segments finish, then {"type": "result", ...same as /analyze}
+    """
+    from services.live_analysis import open_live_answer, close_live_answer
+
+    await websocket.accept()
+    live = None
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    try:
+        start = await websocket.receive_json()
+        attempt_int = _optional_int(start.get("attempt")) or 0
+        live_fields = {
+            "session_id": start.get("session_id"),
+            "question_id": _optional_int(start.get("question_id")),
+            "attempt": attempt_int,
+            "clip_start_ms": _optional_int(start.get("clip_start_ms")),
+            "clip_end_ms": None,
+        }
+        print(f"Live analyzing: Session={live_fields['session_id']}, Q={live_fields['question_id']}, Attempt={attempt_int}")
+
+        live = await open_live_answer(
+            live_fields["session_id"] or "", live_fields["question_id"], str(start.get("question_text", "")), attempt_int,
+            on_partial=lambda transcript: send({"type": "partial", "transcript": transcript})
+        )
+        await send({"type": "ready"})
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                await live.feed(message["bytes"])
+            elif message.get("text"):
+                data = json.loads(message["text"])
+                if data.get("type") == "end":
+                    live_fields["clip_end_ms"] = _optional_int(data.get("clip_end_ms"))
+                    budget_ms = _optional_int(data.get("budget_ms"))
+                    break
+
+        result = await live.finish(budget_ms)
+        print(f"Analysis result: {result}")
+        await run_in_threadpool(_store_live_transcript, db, live_fields, result)
+        await send({"type": "result", **result})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        print("Live analysis: client disconnected")
+    except Exception as e:
+        print(f"Live Analysis Error: {e}")
+        import traceback
+        traceback.print_exc()
+        try:
+            await send({"type": "result", "action": "next", "reason": f"Error: {str(e)}", "transcript": ""})
+            await websocket.close()
+        except Exception:
+            pass
     finally:
-        # Cleanup
-        if os.path.exists(temp_path): os.remove(temp_path)
-        if os.path.exists(temp_path + ".wav"): os.remove(temp_path + ".wav")
+        if live is not None:
+            await close_live_answer(live)
 
 @router.post("/start")
 def start_interview(data: dict, db: Session = Depends(get_session)):
@@ -139,36 +314,106 @@ def start_interview(data: dict, db: Session = Depends(get_session)):
     db.commit()
     return {"sessionId": session_id}
 
-@router.post("/{session_id}/complete")
+@router.put("/{session_id}/chunks/{seq}")
+async def append_chunk(session_id: str, seq: int, request: Request, db: Session = Depends(get_session)):
+    """
+    Store one MediaRecorder chunk as it is recorded.
+    Chunks are staged as blob blocks keyed by `seq`, so retries are idempotent.
+    """
+    interview = db.get(Interview, session_id)
+    if not interview:
+        raise HTTPException(status_code=404, detail="Interview not found")
+    if interview.status != "started":
+        raise HTTPException(status_code=409, detail=f"Interview already {interview.status}")
+    if seq < 0:
+        raise HTTPException(status_code=422, detail="Invalid sequence number")
+
+    data = await request.body()
+    if not data:
+        raise HTTPException(status_code=422, detail="Empty chunk")
+
+    await run_in_threadpool(stage_video_chunk, session_id, seq, data)
+    return {"seq": seq, "bytes": len(data)}
+
+async def _upload_full_video(session_id: str, request: Request):
+    """Legacy path: the whole recording arrives as a multipart upload."""
+    upload = await run_in_threadpool(open_streaming_video_upload, session_id)
+    try:
+        # Multipart body goes straight into staged blocks (bounded memory)
+        found = await stream_multipart_file(request, "file", upload.write)
+        if not found:
+            upload.abort()
+            raise HTTPException(status_code=422, detail="No file uploaded")
+        
+        upload_stats = await run_in_threadpool(upload.close)
+    except Exception:
+        upload.abort()
+        raise
+    return upload.blob_client.url, upload_stats
+
+async def _commit_streamed_chunks(session_id: str, request: Request):
+    """Chunk path: everything is already staged, only the block list is committed."""
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    expected = body.get("chunks") if isinstance(body, dict) else None
+    if expected is not None and (not isinstance(expected, int) or isinstance(expected, bool) or expected < 0):
+        raise HTTPException(status_code=422, detail="chunks must be a non-negative integer")
+    if expected == 0:
+        # The recorder produced nothing
+        raise HTTPException(status_code=409, detail="No video chunks received")
+
+    try:
+        result = await run_in_threadpool(commit_video_chunks, session_id, expected)
+    except NoStagedChunks:
+        raise HTTPException(status_code=409, detail="No video chunks received")
+    if not result["committed"]:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Missing chunks", "missing": result["missing"]}
+        )
+    return result["url"], result
+
+# Interview statuses after a successful /complete
+ALREADY_COMPLETED_STATUSES = ("uploaded", "queued", "processing", "completed")
+
 @router.post("/{session_id}/complete")
 async def complete_interview(
     session_id: str, 
-    background_tasks: BackgroundTasks,
     request: Request,
     db: Session = Depends(get_session)
 ):
-    """Upload video and trigger processing (Robust parsing)."""
+    """Finalize the video (streamed chunks or a full upload) and trigger processing."""
     interview = db.get(Interview, session_id)
     if not interview:
         raise HTTPException(status_code=404, detail="Interview not found")
+
+    # Retried or duplicate /complete: the video is in and processing was queued
+    if interview.status in ALREADY_COMPLETED_STATUSES:
+        job = latest_job(session_id, db)
+        if job is None and interview.status == "uploaded":
+            job_id = enqueue_processing(session_id, db) # crashed between upload and enqueue
+        else:
+            job_id = job.id if job else None
+        return {"status": interview.status, "video_url": interview.video_url, "upload": None, "job_id": job_id}
         
     print(f"Uploading video for {session_id}...")
     
     try:
-        form = await request.form()
-        file = form.get("file")
-        if not file:
-             raise HTTPException(status_code=422, detail="No file uploaded")
-             
-        content = await file.read()
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            video_url, upload_stats = await _upload_full_video(session_id, request)
+        else:
+            video_url, upload_stats = await _commit_streamed_chunks(session_id, request)
+        print(f"[{session_id}] Upload stats: {upload_stats}")
         
-        # Upload to Azure
-        video_url = upload_video_to_blob(content, session_id)
         interview.video_url = video_url
         interview.status = "uploaded"
         db.add(interview)
         db.commit()
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         err_msg = traceback.format_exc()
@@ -177,20 +422,16 @@ async def complete_interview(
             f.write(f"[{session_id}] {err_msg}\n")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
         
-    # Trigger Background Processing
-    background_tasks.add_task(process_interview_background, session_id, db)
+    # Queue durable processing (picked up by the worker pool)
+    job_id = enqueue_processing(session_id, db)
     
-    return {"status": "processing", "video_url": video_url}
+    return {"status": "processing", "video_url": video_url, "upload": upload_stats, "job_id": job_id}
 
 @recruiter_router.get("/interviews")
 def list_interviews(db: Session = Depends(get_session)):
     interviews = db.exec(select(Interview)).all()
     return interviews
 
-from services.blob_storage import upload_video_to_blob, generate_sas_url
-
-# ...
-
 @recruiter_router.get("/interviews/{session_id}")
 def get_interview(session_id: str, db: Session = Depends(get_session)):
     interview = db.get(Interview, session_id)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from starlette.concurrency import run_in_threadpool
+from services.media_mirror import local_file, mirror_ready_avatars, stats as mirror_stats
+from services.audio_cache import get_audio_cache
+from services.ranged_file import ranged_file_response
+import re
+
+router = APIRouter(prefix="/api/media", tags=["media"])
+
+_CONTENT_KEY = re.compile(r"^[0-9a-f]{64}$")
+
+@router.get("/avatar/{key}")
+@router.head("/avatar/{key}", include_in_schema=False)
+async def get_avatar_video(key: str, request: Request):
+    """Mirrored D-ID video, served from our storage with Range support."""
+    if not _CONTENT_KEY.match(key):
+        raise HTTPException(status_code=404, detail="Video not found")
+    found = await run_in_threadpool(local_file, "avatar", key)
+    if not found:
+        raise HTTPException(status_code=404, detail="Video not found")
+    path, row = found
+    # Named by content key: the bytes for a URL do not change, so clients may keep them
+    return ranged_file_response(
+        request, path, row.content_type,
+        cache_control="public, max-age=31536000, immutable",
+        etag=f'"{row.sha256}"' if row.sha256 else None,
+    )
+
+@router.get("/mirror/stats")
+def media_mirror_stats():
+    """Admin: size and freshness of mirrored provider media and of the TTS clip cache."""
+    return {"mirror": mirror_stats(), "tts": get_audio_cache().stats()}
+
+@router.post("/mirror/sync")
+def media_mirror_sync(background_tasks: BackgroundTasks):
+    """Admin: mirror every ready avatar video that has no local copy yet."""
+    background_tasks.add_task(mirror_ready_avatars)
+    return {"status": "started"}
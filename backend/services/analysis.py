@@ -1,7 +1,13 @@
 import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import speech_recognition as sr
-import tempfile
-from openai import AzureOpenAI
+from services.media import SAMPLE_RATE, SAMPLE_WIDTH, pcm_seconds
+from services.decoder import decode_pcm_async
+from services.vad import trim_silence
+from services.llm import achat_json
+from services.intent_classifier import classify, record_decision
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -14,54 +20,42 @@ AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "").split("/openai")[0]
 AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "nflinterviewOpenAI")
 AOAI_VERSION = "2024-02-15-preview"
+INTENT_PROMPT_VERSION = "intent-v1" # bump when the prompt changes (LLM cache key)
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en-PK")
+STT_TIMEOUT = float(os.getenv("ANALYZE_STT_TIMEOUT", "6")) # seconds
 
-recognizer = sr.Recognizer()
+# Request deadlines: the client sends its budget, each stage gets a share of what is left
+DEFAULT_BUDGET_MS = int(os.getenv("ANALYZE_DEFAULT_BUDGET_MS", "8000")) # frontend aborts at 8s
+DEADLINE_MARGIN_MS = int(os.getenv("ANALYZE_DEADLINE_MARGIN_MS", "300")) # the response still has to travel
+STAGE_SHARES = {"decode": 0.2, "stt": 0.7, "llm": 1.0}
+MIN_LLM_MS = 300 # less than this left: do not even start the LLM call
+DEADLINE_SPEECH_SECONDS = 4.0 # no transcript in time: this much speech counts as an answer
 
-def analyze_answer_intent(audio_file_path: str, question_text: str, attempt: int):
-    """
-    Transcribes audio and determines if the answer is sufficient, 
-    needs a nudge, or implies a lack of knowledge/understanding.
-    """
-    
-    # 1. Transcribe
-    transcript = ""
-    try:
-        with sr.AudioFile(audio_file_path) as source:
-            # Record the data
-            audio_data = recognizer.record(source)
-            # Use Google Speech Recognition (free, good enough for short chunks)
-            # Use 'en-US' or 'en-PK' based on preference.
-            transcript = recognizer.recognize_google(audio_data)
-            print(f"Transcript: {transcript}")
-    except sr.UnknownValueError:
-        transcript = ""
-        print("Transcript: (Unintelligible/Silence)")
-    except Exception as e:
-        print(f"STT Error: {e}")
-        return {"action": "next", "reason": "STT Failed", "transcript": ""}
+# Bounded pools: a burst of candidates queues here instead of on the event loop
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("ANALYZE_CPU_WORKERS", "2")), thread_name_prefix="analyze-cpu")
+STT_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("ANALYZE_STT_WORKERS", "8")), thread_name_prefix="analyze-stt")
 
-    # 2. Heuristics (Fast Pass)
-    word_count = len(transcript.split())
-    
-    # Very short silence/noise
-    if word_count < 2:
-        if attempt < 2:
-            return {"action": "nudge", "reason": "Silence or Noise", "transcript": transcript}
-        else:
-            return {"action": "next", "reason": "Max Attempts (Silence)", "transcript": transcript}
 
-    # 3. LLM Intent Analysis
-    try:
-        if not AOAI_KEY or not AOAI_ENDPOINT:
-            raise Exception("Azure OpenAI Not Configured")
+def _best_alternative(response):
+    """(transcript, confidence) from a recognize_google(show_all=True) response."""
+    if not isinstance(response, dict) or not response.get("alternative"):
+        return "", None # Unintelligible/Silence
+    best = response["alternative"][0]
+    return best.get("transcript", ""), best.get("confidence")
 
-        client = AzureOpenAI(
-            azure_endpoint=AOAI_ENDPOINT,
-            api_key=AOAI_KEY,
-            api_version=AOAI_VERSION
-        )
+def transcribe_answer(speech: bytes, sample_rate: int = SAMPLE_RATE, sample_width: int = SAMPLE_WIDTH,
+                      timeout: float = STT_TIMEOUT):
+    """Blocking Google STT call for one answer clip -> (transcript, confidence)."""
+    # One Recognizer per call; its timeout state is not thread safe
+    recognizer = sr.Recognizer()
+    # The socket timeout is what frees this thread if the deadline passes
+    recognizer.operation_timeout = max(0.5, min(timeout, STT_TIMEOUT))
+    audio_data = sr.AudioData(speech, sample_rate, sample_width)
+    # show_all exposes the confidence, used to decide re-transcription later
+    return _best_alternative(recognizer.recognize_google(audio_data, language=STT_LANGUAGE, show_all=True))
 
-        system_prompt = f"""
+def _intent_messages(question_text: str, attempt: int, transcript: str) -> list:
+    system_prompt = f"""
         You are an interview conductor optimization engine.
         Analyze the candidate's response to the question: "{question_text}"
         Current Attempt: {attempt} (0=First, 1=Nudge, 2=Rephrase)
@@ -80,24 +74,176 @@ def analyze_answer_intent(audio_file_path: str, question_text: str, attempt: int
         
         Return JSON: {{ "action": "next" | "nudge" | "rephrase", "reason": "..." }}
         """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": transcript}
+    ]
 
-        response = client.chat.completions.create(
-            model=AOAI_DEPLOYMENT,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": transcript}
-            ],
-            response_format={ "type": "json_object" }
-        )
-        
-        import json
-        result = json.loads(response.choices[0].message.content)
+class StageTimer:
+    """Collects per-stage latency (ms) for the response's `timings` field."""
+
+    def __init__(self):
+        self.began = time.monotonic()
+        self.timings = {}
+
+    def mark(self, stage: str, since: float) -> float:
+        now = time.monotonic()
+        self.timings[f"{stage}_ms"] = int((now - since) * 1000)
+        return now
+
+    def done(self) -> dict:
+        self.timings["total_ms"] = int((time.monotonic() - self.began) * 1000)
+        return self.timings
+
+class Deadline:
+    """Client time budget for one request, minus a margin for the response."""
+
+    def __init__(self, budget_ms: int = None):
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else DEFAULT_BUDGET_MS
+        self.expires_at = time.monotonic() + max(self.budget_ms - DEADLINE_MARGIN_MS, 0) / 1000
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def budget_for(self, stage: str) -> float:
+        """Seconds this stage may use; later stages keep the rest."""
+        return self.remaining() * STAGE_SHARES[stage]
+
+def deadline_fallback(transcript: str, stt: dict, attempt: int, speech_seconds: float, stage: str) -> dict:
+    """Best decision without the stage that ran out of time."""
+    record_decision("deadline")
+    word_count = len(transcript.split())
+    if transcript:
+        long_enough = word_count >= 5
+    else:
+        long_enough = (speech_seconds or 0) >= DEADLINE_SPEECH_SECONDS
+    action = "next" if long_enough or attempt >= 2 else "nudge"
+    print(f"Deadline reached during {stage} -> {action}")
+    return {"action": action, "reason": f"Deadline ({stage})", "transcript": transcript,
+            "decided_by": "deadline", "deadline_stage": stage, **stt}
+
+async def analyze_answer_audio(audio_bytes: bytes, question_text: str, attempt: int, session_id: str = "",
+                               budget_ms: int = None) -> dict:
+    """
+    Transcribes an answer clip and determines if the answer is sufficient,
+    needs a nudge, or implies a lack of knowledge/understanding.
+    Every blocking step runs on a subprocess or a bounded pool, never on the event loop,
+    and each one is cancelled once its share of the client's budget is used up.
+    """
+    loop = asyncio.get_running_loop()
+    timer = StageTimer()
+    deadline = Deadline(budget_ms)
+
+    def finish(result: dict) -> dict:
+        result["timings"] = timer.done()
+        result["budget_ms"] = deadline.budget_ms
+        print(f"[{session_id}] Analyze timings: {result['timings']}")
+        return result
+
+    # 1. Decode (webm/opus -> 16 kHz mono PCM, in memory)
+    t = time.monotonic()
+    try:
+        pcm = await asyncio.wait_for(decode_pcm_async(audio_bytes, session_id), deadline.budget_for("decode"))
+    except asyncio.TimeoutError:
+        timer.mark("decode", t)
+        return finish(deadline_fallback("", {"stt_status": "error", "confidence": None}, attempt, None, "decode"))
+    t = timer.mark("decode", t)
+    if len(pcm) < 100:
+        print("Audio conversion failed or clip too small")
+        record_decision("heuristic")
+        return finish({"action": "nudge", "reason": "Audio conversion failed", "transcript": "", "decided_by": "heuristic"})
+
+    # 2. Transcribe (leading/trailing silence trimmed; pure silence never hits STT)
+    transcript = ""
+    stt = {"stt_status": "silence", "confidence": None}
+    speech = b""
+    try:
+        speech = await loop.run_in_executor(CPU_EXECUTOR, trim_silence, pcm, SAMPLE_RATE)
+        t = timer.mark("vad", t)
+        print(f"VAD trim: {len(pcm)} -> {len(speech)} bytes")
+        if speech:
+            stt_budget = deadline.budget_for("stt")
+            transcript, stt["confidence"] = await asyncio.wait_for(
+                loop.run_in_executor(STT_EXECUTOR, transcribe_answer, speech, SAMPLE_RATE, SAMPLE_WIDTH, stt_budget),
+                stt_budget
+            )
+            t = timer.mark("stt", t)
+            stt["stt_status"] = "ok" if transcript else "silence"
+            print(f"Transcript: {transcript} (confidence={stt['confidence']})")
+        else:
+            print("Transcript: (Silence, STT skipped)")
+    except asyncio.TimeoutError:
+        # Queued STT work is dropped; a running call ends at its socket timeout
+        timer.mark("stt", t)
+        return finish(deadline_fallback("", {"stt_status": "error", "confidence": None}, attempt,
+                                        pcm_seconds(len(speech)), "stt"))
+    except Exception as e:
+        print(f"STT Error: {e}")
+        record_decision("heuristic")
+        return finish({"action": "next", "reason": "STT Failed", "transcript": "", "stt_status": "error", "confidence": None, "decided_by": "heuristic"})
+
+    # 3. Intent
+    return finish(await decide_intent(transcript, stt, question_text, attempt, timer, pcm_seconds(len(speech)), deadline))
+
+async def decide_intent(transcript: str, stt: dict, question_text: str, attempt: int, timer: StageTimer = None,
+                        speech_seconds: float = None, deadline: Deadline = None) -> dict:
+    """
+    Heuristics, then the local classifier, then the LLM for ambiguous answers
+    (word-count fallback if it fails or the deadline is near). `decided_by`
+    records which one answered.
+    """
+    result = await _decide_intent(transcript, stt, question_text, attempt, timer, speech_seconds, deadline)
+    if result["decided_by"] != "deadline": # counted by deadline_fallback
+        record_decision(result["decided_by"])
+    return result
+
+async def _decide_intent(transcript, stt, question_text, attempt, timer, speech_seconds, deadline) -> dict:
+    # Local classifier (clear-cut phrases and lengths, no network)
+    t = time.monotonic()
+    local = classify(transcript, speech_seconds) if transcript.strip() else None
+    if timer:
+        t = timer.mark("classify", t)
+
+    # Heuristics (Fast Pass)
+    word_count = len(transcript.split())
+    
+    # Very short silence/noise (unless it was an explicit "skip" / "pardon?")
+    if word_count < 2 and not (local and local["action"] != "nudge"):
+        if attempt < 2:
+            return {"action": "nudge", "reason": "Silence or Noise", "transcript": transcript, "decided_by": "heuristic", **stt}
+        else:
+            return {"action": "next", "reason": "Max Attempts (Silence)", "transcript": transcript, "decided_by": "heuristic", **stt}
+
+    if local:
+        return {**local, "transcript": transcript, "decided_by": "local", **stt}
+
+    # LLM Intent Analysis
+    llm_budget = deadline.budget_for("llm") if deadline else None
+    if llm_budget is not None and llm_budget * 1000 < MIN_LLM_MS:
+        return deadline_fallback(transcript, stt, attempt, speech_seconds, "llm")
+    try:
+        if not AOAI_KEY or not AOAI_ENDPOINT:
+            raise Exception("Azure OpenAI Not Configured")
+
+        # Cancelling the call closes its connection instead of waiting on a slow provider
+        result = await asyncio.wait_for(achat_json(
+            _intent_messages(question_text, attempt, transcript),
+            INTENT_PROMPT_VERSION,
+            deployment=AOAI_DEPLOYMENT
+        ), llm_budget)
         result["transcript"] = transcript
+        result["decided_by"] = "llm"
+        result.update(stt)
         return result
 
+    except asyncio.TimeoutError:
+        return deadline_fallback(transcript, stt, attempt, speech_seconds, "llm")
     except Exception as e:
         print(f"LLM Analysis Failed: {e}")
         # Fallback to Word Count logic
         if word_count < 5 and attempt < 2:
-             return {"action": "nudge", "reason": "Too Short (Fallback)", "transcript": transcript}
-        return {"action": "next", "reason": "Fallback Default", "transcript": transcript}
+             return {"action": "nudge", "reason": "Too Short (Fallback)", "transcript": transcript, "decided_by": "fallback", **stt}
+        return {"action": "next", "reason": "Fallback Default", "transcript": transcript, "decided_by": "fallback", **stt}
+    finally:
+        if timer:
+            timer.mark("llm", t)
@@ -0,0 +1,86 @@
+"""
+Live Answer Transcripts
+Builds the final transcript from the per-answer transcripts captured by
+/api/interview/analyze and works out which questions still need the
+full recording re-transcribed (missing, failed or low-confidence answers).
+"""
+import os
+from typing import List
+from sqlmodel import Session, select
+from models import AnswerTranscript
+
+LIVE_MIN_CONFIDENCE = float(os.getenv("LIVE_TRANSCRIPT_MIN_CONFIDENCE", "0.6"))
+WINDOW_PADDING_SECONDS = 1.0 # client clock vs. recording drift
+
+def _window(records: List[AnswerTranscript]):
+    starts = [r.clip_start_ms for r in records if r.clip_start_ms is not None]
+    ends = [r.clip_end_ms for r in records if r.clip_end_ms is not None]
+    if not starts or not ends:
+        return None, None
+    return min(starts) / 1000, max(ends) / 1000
+
+def plan_answer_transcripts(db: Session, session_id: str, question_ids: List[int]) -> dict:
+    """
+    Returns {"answers": {qid: segment}, "gaps": [{"question_id", "start", "end"}], "live_records": n}.
+    Gap windows are in seconds of the recording (None = open-ended/unknown).
+    """
+    records = db.exec(
+        select(AnswerTranscript)
+        .where(AnswerTranscript.session_id == session_id)
+        .order_by(AnswerTranscript.question_id, AnswerTranscript.attempt, AnswerTranscript.created_at)
+    ).all()
+
+    by_question = {qid: [] for qid in question_ids}
+    for r in records:
+        by_question.setdefault(r.question_id, []).append(r)
+
+    answers = {}
+    windows = {}
+    for qid in question_ids:
+        attempts = by_question[qid]
+        windows[qid] = _window(attempts)
+        if not attempts:
+            continue
+        if any(r.status == "error" for r in attempts):
+            continue
+        if any(r.confidence is not None and r.confidence < LIVE_MIN_CONFIDENCE for r in attempts if r.status == "ok"):
+            continue
+
+        start, end = windows[qid]
+        answers[qid] = {
+            "question_id": qid,
+            "source": "live",
+            "text": " ".join(r.transcript for r in attempts if r.transcript) or "[...]",
+            "confidence": min((r.confidence for r in attempts if r.confidence is not None), default=None),
+            "attempts": len(attempts),
+            "start": start,
+            "end": end,
+        }
+
+    gaps = []
+    for i, qid in enumerate(question_ids):
+        if qid in answers:
+            continue
+        start, end = windows[qid]
+        if start is None:
+            # No clip for this question (e.g. manual skip): span the neighbours' clips
+            prev_ends = [windows[q][1] for q in question_ids[:i] if windows[q][1] is not None]
+            next_starts = [windows[q][0] for q in question_ids[i + 1:] if windows[q][0] is not None]
+            start = prev_ends[-1] if prev_ends else 0.0
+            end = next_starts[0] if next_starts else None
+        gaps.append({
+            "question_id": qid,
+            "start": max(0.0, start - WINDOW_PADDING_SECONDS),
+            "end": end + WINDOW_PADDING_SECONDS if end is not None else None,
+        })
+
+    return {"answers": answers, "gaps": gaps, "live_records": len(records)}
+
+def overlap(start: float, end: float, window: dict) -> float:
+    """Seconds of [start, end] inside a gap window."""
+    w_end = window["end"] if window["end"] is not None else float("inf")
+    return max(0.0, min(end, w_end) - max(start, window["start"]))
+
+def format_transcript(segments: List[dict]) -> str:
+    """One line per question, in question order."""
+    return "\n".join(f"Q{seg['question_id']}: {seg['text']}" for seg in sorted(segments, key=lambda s: s["question_id"]))
@@ -0,0 +1,398 @@
+"""
+TTS Audio Cache
+Rendered clips on local disk, named by a hash of everything that changes
+the audio (normalized text, voice, model, output format), with a small
+in-memory LRU in front. The fixed question prompts are prebaked at startup
+and pinned; dynamic phrases (/synthesize) are evicted least recently used.
+Concurrent misses for the same clip share one TTS call (single flight).
+Each clip can have a lip-sync envelope (services/lipsync.py) stored next
+to it as <key>.env and evicted with it.
+"""
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Optional
+from services.tts import QUESTIONS, VOICE_ID, MODEL_ID, OUTPUT_FORMAT, generate_audio_stream, stream_audio
+from services.lipsync import envelope_for_clip
+
+TTS_CACHE_DIR = Path(os.getenv(
+    "TTS_CACHE_DIR",
+    str(Path(__file__).resolve().parent.parent / "tts_cache")
+))
+MEMORY_MAX_BYTES = int(os.getenv("TTS_MEMORY_CACHE_BYTES", str(8 * 1024 * 1024)))
+DISK_MAX_BYTES = int(os.getenv("TTS_DISK_CACHE_BYTES", str(256 * 1024 * 1024)))
+STREAM_CHUNK_SIZE = 16 * 1024
+STREAM_TIMING_WINDOW = 200 # recent streamed renders kept for percentiles
+ENVELOPE_SUFFIX = ".env"
+
+def normalize_text(text: str) -> str:
+    """Spelling variants that sound the same share a clip."""
+    text = text.replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    return re.sub(r"\s+", " ", text).strip()
+
+def clip_key(text: str, voice_id: str = VOICE_ID, model_id: str = MODEL_ID, output_format: str = OUTPUT_FORMAT) -> str:
+    return hashlib.sha256("\0".join([normalize_text(text), voice_id, model_id, output_format]).encode()).hexdigest()
+
+def clip_path(key: str, output_format: str = OUTPUT_FORMAT) -> Path:
+    extension = output_format.split("_")[0] # mp3_44100_128 -> mp3
+    return TTS_CACHE_DIR / f"{key}.{extension}"
+
+class AudioCache:
+    """Memory LRU over a size-bounded disk cache of rendered clips."""
+
+    def __init__(self, memory_max_bytes: int = MEMORY_MAX_BYTES, disk_max_bytes: int = DISK_MAX_BYTES):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict() # key -> bytes, most recent last
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._flights = {} # key -> Lock held by the thread rendering it
+        self._pinned = set()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0,
+                         "memory_evictions": 0, "disk_evictions": 0, "renders": 0, "render_ms": 0,
+                         "streams": 0, "streams_aborted": 0, "envelopes": 0}
+        self._stream_timings = deque(maxlen=STREAM_TIMING_WINDOW) # (ttfb_ms, total_ms) per streamed render
+
+    def pin(self, key: str):
+        """Never evict this clip from disk (question prompts)."""
+        with self._lock:
+            self._pinned.add(key)
+
+    def get_path(self, text: str) -> Path:
+        """Path of the rendered clip, calling TTS only on a miss."""
+        key = clip_key(text)
+        path = clip_path(key)
+        if path.exists():
+            self._count("disk_hits")
+            self._touch(path)
+            return path
+        self._render(key, text)
+        return path
+
+    def get_bytes(self, text: str):
+        """(audio bytes, source) with source in memory | disk | tts."""
+        key = clip_key(text)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return data, "memory"
+
+        path = clip_path(key)
+        source = "disk"
+        if path.exists():
+            self._count("disk_hits")
+            self._touch(path)
+        else:
+            source = "tts" if self._render(key, text) else "coalesced"
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            # Evicted between the check and the read (another thread's render)
+            self._render(key, text)
+            data = path.read_bytes()
+        self._remember(key, data)
+        return data, source
+
+    def get_envelope(self, text: str, render: bool = False) -> Optional[bytes]:
+        """
+        Lip-sync envelope of the clip, computed on first request and kept beside it.
+        A missing clip is only waited for if a render (e.g. /synthesize/stream) is
+        already in flight; None if there is no clip and `render` is False.
+        """
+        key = clip_key(text)
+        path = clip_path(key)
+        if not path.exists():
+            with self._lock:
+                flight = self._flights.get(key)
+            if flight is not None:
+                with flight:
+                    pass # wait for the leader; it may also have aborted
+            if render and not path.exists():
+                self._render(key, text)
+        envelope_path = path.with_suffix(ENVELOPE_SUFFIX)
+        try:
+            return envelope_path.read_bytes()
+        except FileNotFoundError:
+            pass
+        try:
+            clip = path.read_bytes()
+        except FileNotFoundError:
+            return None # never rendered, aborted stream, or evicted
+        envelope = envelope_for_clip(clip)
+        fd, tmp = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(envelope)
+        os.replace(tmp, envelope_path)
+        self._count("envelopes")
+        return envelope
+
+    def stream(self, text: str):
+        """
+        (chunk iterator, source). Cached clips are read from disk; a miss is
+        forwarded from the provider chunk by chunk while it is written to the
+        cache, so playback starts before the clip is fully generated.
+        """
+        key = clip_key(text)
+        if clip_path(key).exists():
+            self._count("disk_hits")
+            self._touch(clip_path(key))
+            return self._iter_clip(key, text), "disk"
+        return self._stream_render(key, text), "tts"
+
+    def _iter_clip(self, key: str, text: str):
+        try:
+            f = open(clip_path(key), "rb")
+        except FileNotFoundError:
+            # Evicted after the existence check
+            self._render(key, text)
+            f = open(clip_path(key), "rb")
+        with f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _stream_render(self, key: str, text: str):
+        # Runs lazily, once the response starts, so nothing is held if it never does
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Lock()
+                flight.acquire()
+                self.counters["misses"] += 1
+                self.counters["streams"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            # Someone is already rendering it: wait, then send the finished file
+            with flight:
+                pass
+            yield from self._iter_clip(key, text)
+            return
+
+        began = time.monotonic()
+        ttfb_ms = None
+        size = 0
+        tmp = None
+        try:
+            TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                for chunk in stream_audio(normalize_text(text)):
+                    if not chunk:
+                        continue
+                    if ttfb_ms is None:
+                        ttfb_ms = int((time.monotonic() - began) * 1000)
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            os.replace(tmp, clip_path(key))
+            tmp = None
+            total_ms = int((time.monotonic() - began) * 1000)
+            with self._lock:
+                self.counters["renders"] += 1
+                self.counters["render_ms"] += total_ms
+                self._stream_timings.append((ttfb_ms or total_ms, total_ms))
+            print(f"TTS stream: {key[:12]} first byte {ttfb_ms}ms, total {total_ms}ms ({size} bytes)")
+            self._evict_disk(keep=key)
+        except GeneratorExit:
+            # Client went away mid-clip; the partial file is not cached
+            self._count("streams_aborted")
+            print(f"TTS stream: {key[:12]} aborted after {size} bytes")
+            raise
+        finally:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            with self._lock:
+                del self._flights[key]
+            flight.release()
+
+    def _render(self, key: str, text: str) -> bool:
+        """Renders the clip unless another thread already is. True if this call did the TTS."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Lock()
+                flight.acquire()
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            # Wait for the leader, then use its file (or render ourselves if it failed)
+            with flight:
+                pass
+            if clip_path(key).exists():
+                return False
+            return self._render(key, text)
+
+        try:
+            began = time.monotonic()
+            TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in generate_audio_stream(normalize_text(text)):
+                        f.write(chunk)
+                os.replace(tmp, clip_path(key)) # atomic; readers never see a partial clip
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            elapsed_ms = int((time.monotonic() - began) * 1000)
+            with self._lock:
+                self.counters["renders"] += 1
+                self.counters["render_ms"] += elapsed_ms
+            print(f"TTS cache: rendered {key[:12]} in {elapsed_ms}ms ({clip_path(key).stat().st_size} bytes)")
+            self._evict_disk(keep=key)
+            return True
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.release()
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_max_bytes // 4:
+            return # one big clip should not flush everything else
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self.counters["memory_evictions"] += 1
+
+    def _touch(self, path: Path):
+        # mtime is the disk LRU clock
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _disk_entries(self):
+        entries = []
+        for path in TTS_CACHE_DIR.glob("*.*"):
+            if path.suffix in (".part", ENVELOPE_SUFFIX):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict_disk(self, keep: str = None):
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.disk_max_bytes:
+            return
+        with self._lock:
+            pinned = set(self._pinned)
+        # Oldest first until 10% under the limit
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            if path.stem in pinned or path.stem == keep or len(path.stem) != 64:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            try:
+                path.with_suffix(ENVELOPE_SUFFIX).unlink()
+            except OSError:
+                pass
+            total -= size
+            self._count("disk_evictions")
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict:
+        entries = self._disk_entries() if TTS_CACHE_DIR.exists() else []
+        with self._lock:
+            counters = dict(self.counters)
+            memory = {"entries": len(self._memory), "bytes": self._memory_bytes, "max_bytes": self.memory_max_bytes}
+            pinned = len(self._pinned)
+            timings = list(self._stream_timings)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"] + counters["coalesced"]
+        hits = lookups - counters["misses"] # coalesced requests did not call TTS either
+        return {
+            "memory": memory,
+            "disk": {"entries": len(entries), "bytes": sum(size for _, size, _ in entries),
+                     "max_bytes": self.disk_max_bytes, "pinned": pinned},
+            **counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "avg_render_ms": counters["render_ms"] // counters["renders"] if counters["renders"] else None,
+            "stream_timings": {
+                "samples": len(timings),
+                "ttfb_ms_p50": _percentile([t[0] for t in timings], 0.5),
+                "ttfb_ms_p95": _percentile([t[0] for t in timings], 0.95),
+                "total_ms_p50": _percentile([t[1] for t in timings], 0.5),
+                "total_ms_p95": _percentile([t[1] for t in timings], 0.95),
+            },
+        }
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_audio_cache() -> AudioCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache()
+    return _cache
+
+def question_audio_path(key) -> Optional[Path]:
+    """Cached clip for a question key (1, 2, 3, 'intro', 'outro'), or None if unknown."""
+    text = QUESTIONS.get(key)
+    if not text:
+        return None
+    cache = get_audio_cache()
+    cache.pin(clip_key(text))
+    return cache.get_path(text)
+
+def question_envelope(key) -> Optional[bytes]:
+    """Lip-sync envelope for a question key, or None if unknown."""
+    text = QUESTIONS.get(key)
+    if not text:
+        return None
+    cache = get_audio_cache()
+    cache.pin(clip_key(text))
+    return cache.get_envelope(text, render=True)
+
+def prebake_question_audio(stop: threading.Event = None):
+    """
+    Renders every question prompt (and its envelope) that is not cached yet (run at startup).
+    Setting `stop` ends it after the clip being rendered.
+    """
+    for key in QUESTIONS:
+        if stop is not None and stop.is_set():
+            return
+        try:
+            question_audio_path(key)
+            question_envelope(key)
+        except Exception as e:
+            print(f"TTS prebake failed for {key}: {e}")
@@ -0,0 +1,182 @@
+"""
+Avatar Video Cache
+Rendered D-ID clips in sessions.db (AvatarVideo), keyed by a hash of the
+text, expression, presenter and voice, so changing any of them renders a
+new clip instead of serving a stale one.
+
+Rendering is claimed with a conditional UPDATE (as in job_queue.py): one
+worker, in any process, renders a clip while the others wait for its row.
+A claim whose renderer stopped updating it goes stale and can be taken
+over. Provider result URLs are presigned, so entries expire with them,
+unless the video was copied into the media mirror (services/media_mirror.py).
+"""
+import os
+import socket
+import itertools
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import false
+from sqlmodel import Session, select, update, delete, or_, and_
+from database import engine
+from models import AvatarVideo
+from services.checkpoints import hash_key
+from services.tts import VOICE_ID, MODEL_ID, OUTPUT_FORMAT
+from services.media_mirror import is_mirrored
+
+# Config
+CLAIM_TTL_SECONDS = int(os.getenv("AVATAR_CLAIM_TTL_SECONDS", "180")) # longer than a render
+DEFAULT_URL_TTL_HOURS = float(os.getenv("DID_RESULT_URL_TTL_HOURS", "24"))
+EXPIRY_MARGIN = timedelta(minutes=30) # never hand out a URL about to expire
+
+_owner_ids = itertools.count(1)
+
+def new_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{next(_owner_ids)}"
+
+def avatar_cache_key(text: str, expression: str, presenter_url: str) -> str:
+    """Everything that changes the rendered video."""
+    return hash_key("avatar-v1", text.strip(), expression, presenter_url, VOICE_ID, MODEL_ID, OUTPUT_FORMAT)
+
+def url_expiry(url: str) -> datetime:
+    """Expiry of a presigned (S3 / CloudFront style) URL, or the default TTL."""
+    query = parse_qs(urlparse(url or "").query)
+    try:
+        if "Expires" in query:
+            return datetime.utcfromtimestamp(int(query["Expires"][0]))
+        if "X-Amz-Date" in query and "X-Amz-Expires" in query:
+            signed = datetime.strptime(query["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ")
+            return signed + timedelta(seconds=int(query["X-Amz-Expires"][0]))
+    except (ValueError, OverflowError):
+        pass
+    return datetime.utcnow() + timedelta(hours=DEFAULT_URL_TTL_HOURS)
+
+def mirror_url(cache_key: str) -> str:
+    return f"/api/media/avatar/{cache_key}"
+
+def _as_result(row: AvatarVideo, mirrored: bool) -> dict:
+    result = {"video_url": row.video_url, "duration": row.duration, "talk_id": row.talk_id, "timings": row.timings}
+    if mirrored:
+        result["mirror_url"] = mirror_url(row.cache_key)
+    return result
+
+def _usable(row: AvatarVideo) -> Optional[dict]:
+    """Result for a ready row whose provider URL is still good or that we have a copy of."""
+    if not row or row.status != "ready":
+        return None
+    mirrored = is_mirrored("avatar", row.cache_key)
+    if mirrored or row.url_expires_at > datetime.utcnow() + EXPIRY_MARGIN:
+        return _as_result(row, mirrored)
+    return None
+
+def lookup(cache_key: str) -> Optional[dict]:
+    """The cached clip if it is ready and still playable."""
+    with Session(engine) as db:
+        return _usable(db.get(AvatarVideo, cache_key))
+
+def claim(cache_key: str, label: str, owner: str) -> bool:
+    """
+    True if this owner should render the clip: the row did not exist, or it
+    failed, expired, or its renderer stopped heartbeating.
+    """
+    now = datetime.utcnow()
+    # An expired provider URL only matters if we have no copy of the video
+    expired_ready = and_(AvatarVideo.status == "ready", AvatarVideo.url_expires_at <= now + EXPIRY_MARGIN)
+    if is_mirrored("avatar", cache_key):
+        expired_ready = false()
+    with Session(engine) as db:
+        try:
+            db.add(AvatarVideo(cache_key=cache_key, label=label, status="pending", claimed_by=owner, claimed_at=now))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+
+        # Conditional update: only one worker (or process) can win the row
+        stale_before = now - timedelta(seconds=CLAIM_TTL_SECONDS)
+        result = db.exec(
+            update(AvatarVideo)
+            .where(AvatarVideo.cache_key == cache_key)
+            .where(or_(
+                AvatarVideo.status == "failed",
+                expired_ready,
+                and_(AvatarVideo.status == "pending", AvatarVideo.claimed_at < stale_before),
+            ))
+            .values(status="pending", label=label, claimed_by=owner, claimed_at=now, updated_at=now)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+def heartbeat(cache_key: str, owner: str):
+    """Keeps a long render's claim from going stale."""
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        db.exec(
+            update(AvatarVideo)
+            .where(AvatarVideo.cache_key == cache_key)
+            .where(AvatarVideo.claimed_by == owner)
+            .values(claimed_at=now, updated_at=now)
+        )
+        db.commit()
+
+def complete(cache_key: str, owner: str, result: dict) -> bool:
+    """Stores a finished render; False if the claim was taken over meanwhile."""
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        updated = db.exec(
+            update(AvatarVideo)
+            .where(AvatarVideo.cache_key == cache_key)
+            .where(AvatarVideo.claimed_by == owner)
+            .values(
+                status="ready",
+                talk_id=result.get("talk_id"),
+                video_url=result.get("video_url"),
+                duration=result.get("duration"),
+                url_expires_at=url_expiry(result.get("video_url")),
+                timings=result.get("timings"),
+                claimed_by=None,
+                claimed_at=None,
+                last_error=None,
+                updated_at=now,
+            )
+        )
+        db.commit()
+        return updated.rowcount == 1
+
+def fail(cache_key: str, owner: str, error: str):
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        db.exec(
+            update(AvatarVideo)
+            .where(AvatarVideo.cache_key == cache_key)
+            .where(AvatarVideo.claimed_by == owner)
+            .values(status="failed", claimed_by=None, claimed_at=None, last_error=str(error)[-4000:], updated_at=now)
+        )
+        db.commit()
+
+def status(cache_key: str) -> Optional[str]:
+    with Session(engine) as db:
+        row = db.get(AvatarVideo, cache_key)
+        return row.status if row else None
+
+def latest_for_label(label: str) -> Optional[dict]:
+    """Most recent playable clip for a label such as "q1"."""
+    with Session(engine) as db:
+        rows = db.exec(
+            select(AvatarVideo)
+            .where(AvatarVideo.label == label)
+            .where(AvatarVideo.status == "ready")
+            .order_by(AvatarVideo.updated_at.desc())
+        ).all()
+        for row in rows:
+            result = _usable(row)
+            if result:
+                return result
+    return None
+
+def clear() -> int:
+    with Session(engine) as db:
+        result = db.exec(delete(AvatarVideo))
+        db.commit()
+        return result.rowcount
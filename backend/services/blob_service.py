@@ -1,4 +1,5 @@
 from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
+from services.providers import get_providers
 import os
 from datetime import datetime, timedelta
 
@@ -8,7 +9,7 @@ ACCOUNT_KEY = os.getenv("AZURE_BLOB_KEY")
 ACCOUNT_NAME = "nflsalesinterviewdemo" # Extracted from connection string or env, better to parse or separate env
 
 def get_blob_service_client():
-    return BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    return get_providers().blob
 
 def upload_video(file_content: bytes, session_id: str, question_id: int, extension: str = "webm") -> str:
     """Uploads video bytes to Azure Blob and returns the blob name."""
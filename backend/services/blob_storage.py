@@ -1,42 +1,225 @@
 import os
+import time
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
+from services.providers import get_providers
 
 CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 CONTAINER_NAME = os.getenv("AZURE_BLOB_CONTAINER", "interviews")
 
-def upload_video_to_blob(file_content: bytes, session_id: str) -> str:
-    """Uploads video bytes to Azure Blob and returns the secure URL/Path."""
+# Streaming upload tuning (block size in bytes, parallel stage_block calls)
+UPLOAD_BLOCK_SIZE = int(os.getenv("BLOB_UPLOAD_BLOCK_SIZE", str(4 * 1024 * 1024)))
+UPLOAD_CONCURRENCY = int(os.getenv("BLOB_UPLOAD_CONCURRENCY", "4"))
+
+def make_block_id(kind: str, index: int) -> str:
+    """Block IDs must be base64 and the same length for every block of a blob."""
+    return base64.b64encode(f"{kind[:5]:<5}-{index:010d}".encode()).decode()
+
+def parse_block_id(block_id: str):
+    """Inverse of make_block_id -> (kind, index), or (None, None) for foreign IDs."""
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(CONTAINER_NAME)
-        
-        # Create container if not exists
+        kind, index = base64.b64decode(block_id).decode().split("-", 1)
+        return kind.strip(), int(index)
+    except Exception:
+        return None, None
+
+_container_ready = False
+
+def get_video_blob_client(session_id: str):
+    """Blob client for the full interview recording, creating the container if needed."""
+    global _container_ready
+    blob_service_client = get_providers().blob
+    container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+    # Chunk ingestion calls this once per second per candidate; check the container once
+    if not _container_ready:
         if not container_client.exists():
             container_client.create_container()
-            
-        blob_name = f"{session_id}/full_interview.webm"
-        blob_client = container_client.get_blob_client(blob_name)
-        
-        # Increase timeout to 1 hour (3600s) and reduce concurrency for stability
-        blob_client.upload_blob(
-            file_content, 
-            overwrite=True, 
-            timeout=3600, 
-            max_concurrency=1,
-            connection_timeout=3600
-        )
-        
-        return blob_client.url
-    except Exception as e:
-        print(f"Azure Upload Error: {e}")
-        raise e
+        _container_ready = True
+    return container_client.get_blob_client(f"{session_id}/full_interview.webm")
+
+def stage_video_chunk(session_id: str, seq: int, data: bytes) -> str:
+    """
+    Stages one recorder chunk as an uncommitted block of the interview video.
+    The block ID is derived from the sequence number, so re-sending a chunk
+    simply replaces the same block (idempotent).
+    """
+    block_id = make_block_id("chunk", seq)
+    blob_client = get_video_blob_client(session_id)
+    blob_client.stage_block(block_id, data, length=len(data), timeout=120)
+    return block_id
+
+class NoStagedChunks(ValueError):
+    pass
+
+def commit_video_chunks(session_id: str, expected_chunks: int = None) -> dict:
+    """
+    Commits all staged recorder chunks in sequence order.
+    Nothing is committed while sequence numbers are missing.
+    Safe to call again: already committed chunks are kept in the new list,
+    and a video that was already committed (e.g. by a full upload) is returned as is.
+    Raises NoStagedChunks if there is neither a video nor any staged chunk.
+    """
+    blob_client = get_video_blob_client(session_id)
+    try:
+        committed, uncommitted = blob_client.get_block_list("all")
+    except ResourceNotFoundError:
+        committed, uncommitted = [], [] # nothing staged or uploaded yet
+
+    # Latest staged copy of a chunk wins over a previously committed one
+    chunks = {}
+    sizes = {}
+    for block in list(committed) + list(uncommitted):
+        kind, seq = parse_block_id(block.id)
+        if kind == "chunk":
+            chunks[seq] = block.id
+            sizes[seq] = block.size
+
+    if not chunks:
+        if committed:
+            return {"url": blob_client.url, "chunks": 0, "bytes": sum(b.size for b in committed),
+                    "missing": [], "committed": True, "already_committed": True}
+        raise NoStagedChunks(f"No staged chunks for {session_id}")
+
+    last_seq = max(chunks)
+    if expected_chunks:
+        last_seq = max(last_seq, expected_chunks - 1)
+    missing = [seq for seq in range(last_seq + 1) if seq not in chunks]
+
+    result = {
+        "url": blob_client.url,
+        "chunks": len(chunks),
+        "bytes": sum(sizes.values()),
+        "missing": missing,
+        "committed": False,
+    }
+    # A gap would corrupt the webm; let the client re-send before committing
+    if missing:
+        return result
+
+    ordered = [chunks[seq] for seq in sorted(chunks)]
+    blob_client.commit_block_list(ordered, content_settings=ContentSettings(content_type="video/webm"))
+    result["committed"] = True
+    return result
+
+class StreamingBlobUpload:
+    """
+    Stages an incoming byte stream into blob blocks with bounded memory.
+    At most `max_concurrency` blocks are in flight; write() blocks the caller
+    until a slot frees up, so memory stays around (max_concurrency + 1) * block_size.
+    """
+
+    def __init__(self, blob_client, block_size: int = UPLOAD_BLOCK_SIZE,
+                 max_concurrency: int = UPLOAD_CONCURRENCY, content_type: str = "video/webm"):
+        self.blob_client = blob_client
+        self.block_size = block_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.content_type = content_type
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._futures = []
+        self._in_flight_bytes = 0
+
+        self.bytes_received = 0
+        self.peak_buffer_bytes = 0
+        self._started = time.monotonic()
+
+    def write(self, data: bytes):
+        """Buffer data and stage every full block."""
+        if not data:
+            return
+        self._buffer.extend(data)
+        self.bytes_received += len(data)
+        self._track_peak()
+
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._stage(block)
+
+    def close(self) -> dict:
+        """Flush the tail, wait for staged blocks and commit the block list."""
+        try:
+            if self._buffer:
+                block = bytes(self._buffer)
+                self._buffer.clear()
+                self._stage(block)
+            for future in self._futures:
+                future.result()
+
+            self.blob_client.commit_block_list(
+                self._block_ids,
+                content_settings=ContentSettings(content_type=self.content_type)
+            )
+        finally:
+            self._executor.shutdown(wait=True)
+        return self.stats()
+
+    def abort(self):
+        """Stop uploading; uncommitted blocks are garbage collected by Azure."""
+        self._buffer.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        return {
+            "bytes": self.bytes_received,
+            "blocks": len(self._block_ids),
+            "seconds": round(elapsed, 3),
+            "bytes_per_sec": int(self.bytes_received / elapsed),
+            "peak_buffer_bytes": self.peak_buffer_bytes,
+            "block_size": self.block_size,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def _stage(self, block: bytes):
+        # Backpressure: wait for a free upload slot before taking more memory
+        self._slots.acquire()
+        self._raise_if_failed()
+
+        block_id = make_block_id("video", len(self._block_ids))
+        self._block_ids.append(block_id)
+        with self._lock:
+            self._in_flight_bytes += len(block)
+        self._track_peak()
+        self._futures.append(self._executor.submit(self._upload_block, block_id, block))
+
+    def _upload_block(self, block_id: str, block: bytes):
+        try:
+            self.blob_client.stage_block(block_id, block, length=len(block), timeout=600)
+        finally:
+            with self._lock:
+                self._in_flight_bytes -= len(block)
+            self._slots.release()
+
+    def _raise_if_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception():
+                self._slots.release()
+                raise future.exception()
+
+    def _track_peak(self):
+        with self._lock:
+            current = len(self._buffer) + self._in_flight_bytes
+            if current > self.peak_buffer_bytes:
+                self.peak_buffer_bytes = current
+
+def open_streaming_video_upload(session_id: str) -> StreamingBlobUpload:
+    """Starts a block-staged upload of the full interview video."""
+    return StreamingBlobUpload(get_video_blob_client(session_id))
 
 def generate_sas_url(blob_url: str) -> str:
     """Generates a read-only SAS URL for the blob."""
     if not blob_url: return None
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+        blob_service_client = get_providers().blob
         blob_name = blob_url.split(f"{CONTAINER_NAME}/")[-1]
         
         sas_token = generate_blob_sas(
@@ -58,7 +241,7 @@ def upload_audio_to_blob(audio_bytes: bytes, filename: str) -> str:
     Used for D-ID avatar video generation.
     """
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+        blob_service_client = get_providers().blob
         container_client = blob_service_client.get_container_client(CONTAINER_NAME)
         
         # Create container if not exists
@@ -0,0 +1,180 @@
+"""
+Stage Checkpoints
+Content-addressed artifact store (files named by their sha256) plus a DB
+manifest mapping (stage, input_key) -> artifact digest. A stage output is
+reusable only if its inputs hash to the same key and the artifact on disk
+still matches its digest (hashed once per process; afterwards an unchanged
+size and mtime is enough). Once the store grows past CHECKPOINT_MAX_BYTES the
+oldest artifacts (and their manifest rows) are deleted, except those of
+sessions with a queued or running job; a stage whose checkpoint was evicted
+simply runs again.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional
+from sqlmodel import Session, select, delete, func
+from models import StageCheckpoint, ProcessingJob
+from services.job_queue import ACTIVE_STATUSES
+
+CHECKPOINT_DIR = Path(os.getenv(
+    "PROCESSING_CHECKPOINT_DIR",
+    str(Path(__file__).resolve().parent.parent / "checkpoints")
+))
+# Decoded interview audio is ~38 MB per 20 minutes; this keeps a few dozen interviews
+CHECKPOINT_MAX_BYTES = int(os.getenv("PROCESSING_CHECKPOINT_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# digest -> (size, mtime_ns) of the file when its content was last hashed
+_verified = {}
+
+def _mark_verified(digest: str):
+    st = artifact_path(digest).stat()
+    _verified[digest] = (st.st_size, st.st_mtime_ns)
+
+def hash_key(*parts) -> str:
+    """Stable key for a stage's inputs."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode()
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+def artifact_path(digest: str) -> Path:
+    return CHECKPOINT_DIR / digest[:2] / digest
+
+class ArtifactWriter:
+    """Streams bytes to a temp file while hashing; commit() moves it into place."""
+
+    def __init__(self):
+        CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=CHECKPOINT_DIR, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = artifact_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self._tmp, path) # atomic; identical content just overwrites
+        _mark_verified(digest) # hashed while writing
+        return digest
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+def put_bytes(data: bytes) -> str:
+    writer = ArtifactWriter()
+    writer.write(data)
+    return writer.commit()
+
+def put_json(obj) -> str:
+    return put_bytes(json.dumps(obj, sort_keys=True).encode())
+
+def is_valid(digest: str) -> bool:
+    """Artifact exists and its content still hashes to the digest."""
+    path = artifact_path(digest)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return False
+    if _verified.get(digest) == (st.st_size, st.st_mtime_ns):
+        return True
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    if h.hexdigest() != digest:
+        return False
+    _verified[digest] = (st.st_size, st.st_mtime_ns)
+    return True
+
+def get_json(digest: str):
+    return json.loads(artifact_path(digest).read_bytes())
+
+def iter_artifact(digest: str, frame_bytes: int):
+    with open(artifact_path(digest), "rb") as f:
+        for frame in iter(lambda: f.read(frame_bytes), b""):
+            yield frame
+
+def lookup(db: Session, stage: str, input_key: str) -> Optional[str]:
+    """Digest of a valid checkpoint for these inputs, or None (stage must run)."""
+    record = db.exec(
+        select(StageCheckpoint)
+        .where(StageCheckpoint.stage == stage)
+        .where(StageCheckpoint.input_key == input_key)
+        .order_by(StageCheckpoint.created_at.desc())
+    ).first()
+    if record and is_valid(record.digest):
+        return record.digest
+    return None
+
+def record(db: Session, stage: str, input_key: str, digest: str, session_id: str = None):
+    existing = db.exec(
+        select(StageCheckpoint)
+        .where(StageCheckpoint.stage == stage)
+        .where(StageCheckpoint.input_key == input_key)
+    ).first()
+    if existing:
+        existing.digest = digest
+        existing.session_id = session_id
+        existing.size = artifact_path(digest).stat().st_size
+        db.add(existing)
+    else:
+        db.add(StageCheckpoint(
+            stage=stage, input_key=input_key, digest=digest, session_id=session_id,
+            size=artifact_path(digest).stat().st_size
+        ))
+    db.commit()
+    evict(db, keep=digest)
+
+def evict(db: Session, keep: str = None) -> int:
+    """
+    Deletes the oldest artifacts until 10% under CHECKPOINT_MAX_BYTES; returns how many.
+    Artifacts of sessions with a queued or running job (and `keep`) are never deleted.
+    """
+    # Content-addressed: several manifest rows may share one file
+    artifacts = db.exec(
+        select(StageCheckpoint.digest, func.max(StageCheckpoint.size), func.max(StageCheckpoint.created_at))
+        .group_by(StageCheckpoint.digest)
+        .order_by(func.max(StageCheckpoint.created_at))
+    ).all()
+    total = sum(size for _, size, _ in artifacts)
+    if total <= CHECKPOINT_MAX_BYTES:
+        return 0
+    target = CHECKPOINT_MAX_BYTES * 0.9
+    active_sessions = select(ProcessingJob.session_id).where(ProcessingJob.status.in_(ACTIVE_STATUSES))
+    protected = set(db.exec(
+        select(StageCheckpoint.digest).where(StageCheckpoint.session_id.in_(active_sessions))
+    ).all())
+    if keep:
+        protected.add(keep)
+    evicted = 0
+    for digest, size, _ in artifacts:
+        if total <= target:
+            break
+        if digest in protected:
+            continue
+        try:
+            artifact_path(digest).unlink()
+        except OSError:
+            pass
+        _verified.pop(digest, None)
+        db.exec(delete(StageCheckpoint).where(StageCheckpoint.digest == digest))
+        total -= size
+        evicted += 1
+    db.commit()
+    if evicted:
+        print(f"Checkpoints: evicted {evicted} artifacts ({total / 1024 / 1024:.0f} MB kept)")
+    return evicted
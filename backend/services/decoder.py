@@ -0,0 +1,220 @@
+"""
+Audio Decoder Service
+Turns webm/opus (or any container ffmpeg understands) into 16 kHz mono
+s16le PCM in memory. Uses PyAV (libav in-process, no fork per request)
+when it is installed, otherwise pipes through an ffmpeg subprocess.
+"""
+import io
+import os
+import queue
+import asyncio
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+from services.media import (
+    SAMPLE_RATE, FRAME_BYTES, MediaStreamError, pcm_seconds,
+    _pcm_command, decode_audio_async, stream_blob_pcm
+)
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# auto | pyav | ffmpeg
+DECODER_BACKEND = os.getenv("AUDIO_DECODER", "auto")
+DECODE_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("AUDIO_DECODE_WORKERS", "2")), thread_name_prefix="decode")
+
+def use_pyav() -> bool:
+    if DECODER_BACKEND == "ffmpeg":
+        return False
+    if DECODER_BACKEND == "pyav" and av is None:
+        raise RuntimeError("AUDIO_DECODER=pyav but PyAV is not installed")
+    return av is not None
+
+def backend_name() -> str:
+    return "pyav" if use_pyav() else "ffmpeg"
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view over an iterator of byte chunks (e.g. a blob download)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.consumed = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.consumed += n
+        return n
+
+def _pyav_pcm(source) -> Iterator[bytes]:
+    """Decoded, resampled PCM blocks (variable size) from a file-like source."""
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    produced = 0
+    try:
+        with av.open(source, mode="r") as container:
+            if not container.streams.audio:
+                raise MediaStreamError("No audio stream")
+            stream = container.streams.audio[0]
+            try:
+                for frame in container.decode(stream):
+                    for out in resampler.resample(frame):
+                        block = out.to_ndarray().tobytes()
+                        produced += len(block)
+                        yield block
+            except av.error.FFmpegError as e:
+                # MediaRecorder webm often ends "prematurely"; keep what was decoded
+                if not produced:
+                    raise
+                print(f"Decoder warning after {pcm_seconds(produced):.1f}s: {e}")
+            for out in resampler.resample(None):
+                yield out.to_ndarray().tobytes()
+    except av.error.FFmpegError as e:
+        raise MediaStreamError(f"Decode failed: {e}") from e
+
+def _ffmpeg_pcm(data: bytes) -> bytes:
+    result = subprocess.run(_pcm_command(), input=data, capture_output=True)
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr.decode(errors='replace')[-500:]}")
+        # Try to continue anyway, partial clips usually still decode
+    return result.stdout
+
+def decode_pcm(data: bytes) -> bytes:
+    """Whole clip -> PCM (blocking). Returns b"" if nothing could be decoded."""
+    if not use_pyav():
+        return _ffmpeg_pcm(data)
+    try:
+        return b"".join(_pyav_pcm(io.BytesIO(data)))
+    except MediaStreamError as e:
+        print(f"Decode Error: {e}")
+        return b""
+
+async def decode_pcm_async(data: bytes, session_id: str = "") -> bytes:
+    """Whole clip -> PCM without blocking the event loop."""
+    if not use_pyav():
+        return await decode_audio_async(data, session_id)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DECODE_EXECUTOR, decode_pcm, data)
+
+def _reframe(blocks: Iterable[bytes], frame_bytes: int) -> Iterator[bytes]:
+    pending = bytearray()
+    for block in blocks:
+        pending.extend(block)
+        while len(pending) >= frame_bytes:
+            yield bytes(pending[:frame_bytes])
+            del pending[:frame_bytes]
+    if pending:
+        yield bytes(pending)
+
+def stream_pcm(blob_client, frame_bytes: int = FRAME_BYTES, session_id: str = "") -> Iterator[bytes]:
+    """
+    Same contract as media.stream_blob_pcm: fixed-size PCM frames while the
+    blob is still downloading; raises MediaStreamError on failure.
+    """
+    if not use_pyav():
+        yield from stream_blob_pcm(blob_client, frame_bytes, session_id)
+        return
+
+    try:
+        reader = _ChunkReader(blob_client.download_blob().chunks())
+    except Exception as e:
+        raise MediaStreamError(f"Blob download failed: {e}") from e
+    produced = 0
+    try:
+        for frame in _reframe(_pyav_pcm(reader), frame_bytes):
+            produced += len(frame)
+            yield frame
+    except MediaStreamError:
+        raise
+    except Exception as e:
+        raise MediaStreamError(f"Blob download failed: {e}") from e
+    print(f"[{session_id}] Decoded {reader.consumed} bytes -> {pcm_seconds(produced):.1f}s PCM (pyav)")
+
+class StreamingDecoder:
+    """
+    Incremental decode of a live MediaRecorder stream: feed() container bytes
+    as they arrive and read PCM blocks from `pcm` (None marks the end).
+    PyAV decodes on its own thread; the ffmpeg fallback is an asyncio subprocess.
+    """
+
+    def __init__(self, session_id: str = ""):
+        self.session_id = session_id
+        self.pcm = asyncio.Queue()
+        self._loop = None
+        self._inbox = None
+        self._proc = None
+        self._reader = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if use_pyav():
+            self._inbox = queue.Queue()
+            threading.Thread(target=self._run_pyav, daemon=True, name=f"live-decode-{self.session_id}").start()
+        else:
+            self._proc = await asyncio.create_subprocess_exec(
+                *_pcm_command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            self._reader = asyncio.ensure_future(self._read_ffmpeg())
+
+    def _emit(self, block):
+        try:
+            self._loop.call_soon_threadsafe(self.pcm.put_nowait, block)
+        except RuntimeError:
+            pass # event loop already closed
+
+    def _run_pyav(self):
+        try:
+            for block in _pyav_pcm(_ChunkReader(iter(self._inbox.get, None))):
+                self._emit(block)
+        except Exception as e:
+            print(f"[{self.session_id}] Live decode error: {e}")
+        finally:
+            self._emit(None)
+
+    async def _read_ffmpeg(self):
+        try:
+            while True:
+                block = await self._proc.stdout.read(FRAME_BYTES)
+                if not block:
+                    break
+                await self.pcm.put(block)
+        finally:
+            await self.pcm.put(None)
+
+    async def feed(self, data: bytes):
+        if self._inbox is not None:
+            self._inbox.put(data)
+            return
+        try:
+            self._proc.stdin.write(data)
+            await self._proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # ffmpeg gave up; the reader sees EOF
+
+    async def close(self):
+        """End of input. PCM keeps arriving until the decoder has drained."""
+        if self._inbox is not None:
+            self._inbox.put(None)
+        elif self._proc is not None and not self._proc.stdin.is_closing():
+            self._proc.stdin.close()
+
+    async def abort(self):
+        await self.close()
+        if self._proc is not None and self._proc.returncode is None:
+            self._proc.kill()
+            await self._proc.wait()
@@ -1,15 +1,22 @@
 """
 D-ID Avatar Service
 Generates lip-synced video avatars using D-ID's Talks API with ElevenLabs audio.
+Missing clips are rendered concurrently (bounded by DID_CONCURRENCY) over the
+shared pooled HTTP client, polling on a schedule derived from clip length.
+Finished clips live in the shared avatar cache (services/avatar_cache.py).
 """
 import os
 import time
-import json
+import asyncio
 import httpx
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from pathlib import Path
-from services.tts import generate_audio_bytes
+from services.tts import QUESTIONS
+from services.audio_cache import get_audio_cache
 from services.blob_storage import upload_audio_to_blob
+from services.providers import get_providers
+from services import avatar_cache, media_mirror
 
 # Load Env
 env_path = Path(__file__).resolve().parent.parent.parent / '.env'
@@ -19,38 +26,17 @@ load_dotenv(dotenv_path=env_path)
 DID_API_KEY = os.getenv("DID_API_KEY", "")
 DID_PRESENTER_URL = os.getenv("DID_PRESENTER_URL", "https://create-images-results.d-id.com/DefaultPresetImage/Matt_m/model.png")
 DID_BASE_URL = "https://api.d-id.com"
+DID_CONCURRENCY = int(os.getenv("DID_CONCURRENCY", "8")) # talks rendering at once (7 keys: one wave)
+# D-ID renders in roughly RENDER_FACTOR x audio length plus a fixed queue/setup cost
+RENDER_FACTOR = float(os.getenv("DID_RENDER_FACTOR", "1.5"))
+RENDER_OVERHEAD_SECONDS = float(os.getenv("DID_RENDER_OVERHEAD_SECONDS", "5"))
+POLL_MIN_SECONDS = 0.5
+POLL_MAX_SECONDS = 5.0
+MP3_BYTES_PER_SECOND = 128000 / 8 # OUTPUT_FORMAT is mp3_44100_128
 
-# Persistent cache file
-CACHE_FILE = Path(__file__).resolve().parent.parent / "avatar_cache.json"
-
-# In-memory cache (loaded from file on startup)
-video_cache = {}
-
-def load_cache():
-    """Load video cache from JSON file."""
-    global video_cache
-    if CACHE_FILE.exists():
-        try:
-            with open(CACHE_FILE, "r") as f:
-                video_cache = json.load(f)
-            print(f"Loaded {len(video_cache)} cached avatar videos from {CACHE_FILE}")
-        except Exception as e:
-            print(f"Failed to load cache: {e}")
-            video_cache = {}
-    else:
-        video_cache = {}
-
-def save_cache():
-    """Save video cache to JSON file."""
-    try:
-        with open(CACHE_FILE, "w") as f:
-            json.dump(video_cache, f, indent=2)
-        print(f"Saved {len(video_cache)} avatar videos to cache")
-    except Exception as e:
-        print(f"Failed to save cache: {e}")
-
-# Load cache on module import
-load_cache()
+# Waiting for another worker's render of the same clip
+CLAIM_POLL_SECONDS = 1.0
+CLAIM_WAIT_SECONDS = 180
 
 def get_auth_header():
     """Get D-ID auth header (Basic Auth with API key)."""
@@ -59,7 +45,31 @@ def get_auth_header():
         "Content-Type": "application/json"
     }
 
-async def create_talk(audio_url: str, expression: str = "neutral") -> dict:
+@asynccontextmanager
+async def _http_client(client: httpx.AsyncClient = None):
+    """The given client, the app's shared pool, or (scripts) a short-lived one."""
+    shared = client or get_providers().async_http_for_running_loop()
+    if shared is not None:
+        yield shared
+        return
+    async with httpx.AsyncClient(timeout=30) as own:
+        yield own
+
+def expected_render_seconds(audio_seconds: float) -> float:
+    return RENDER_OVERHEAD_SECONDS + RENDER_FACTOR * audio_seconds
+
+def poll_delays(expected_seconds: float):
+    """
+    Sleep before each status poll: nothing is worth asking until most of the
+    expected render time has passed, then back off from a short interval.
+    """
+    yield max(POLL_MIN_SECONDS, expected_seconds * 0.7)
+    delay = POLL_MIN_SECONDS
+    while True:
+        yield delay
+        delay = min(delay * 1.5, POLL_MAX_SECONDS)
+
+async def create_talk(audio_url: str, expression: str = "neutral", client: httpx.AsyncClient = None) -> dict:
     """
     Create a D-ID talk video from audio URL.
     Returns the talk ID and status.
@@ -82,11 +92,12 @@ async def create_talk(audio_url: str, expression: str = "neutral") -> dict:
             "expressions": [{"expression": expression, "start_frame": 0}]
         }
     
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.post(
+    async with _http_client(client) as http:
+        response = await http.post(
             f"{DID_BASE_URL}/talks",
             headers=get_auth_header(),
-            json=payload
+            json=payload,
+            timeout=30
         )
         
         if response.status_code not in [200, 201]:
@@ -95,71 +106,126 @@ async def create_talk(audio_url: str, expression: str = "neutral") -> dict:
         
         return response.json()
 
-async def get_talk_status(talk_id: str) -> dict:
+async def get_talk_status(talk_id: str, client: httpx.AsyncClient = None) -> dict:
     """Poll D-ID for talk status."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.get(
+    async with _http_client(client) as http:
+        response = await http.get(
             f"{DID_BASE_URL}/talks/{talk_id}",
-            headers=get_auth_header()
+            headers=get_auth_header(),
+            timeout=30
         )
         return response.json()
 
-async def wait_for_talk(talk_id: str, max_wait: int = 120) -> dict:
+async def wait_for_talk(talk_id: str, max_wait: int = 120, expected_seconds: float = None,
+                        client: httpx.AsyncClient = None) -> dict:
     """
     Poll until talk is done or failed.
-    Returns the final talk object with result_url.
+    Returns the final talk object with result_url (plus "polls").
     """
     start_time = time.time()
+    delays = poll_delays(expected_seconds if expected_seconds is not None else RENDER_OVERHEAD_SECONDS)
+    polls = 0
     
     while time.time() - start_time < max_wait:
-        result = await get_talk_status(talk_id)
+        # Wait before polling (the first wait covers most of the expected render time)
+        await asyncio.sleep(min(next(delays), max(0.0, max_wait - (time.time() - start_time))))
+        result = await get_talk_status(talk_id, client)
+        polls += 1
         status = result.get("status", "unknown")
         
         print(f"Talk {talk_id}: {status}")
         
         if status == "done":
+            result["polls"] = polls
             return result
         elif status in ["error", "rejected"]:
             return {"error": result.get("error", "Unknown error")}
-        
-        # Wait before polling again
-        await asyncio_sleep(2)
     
     return {"error": "Timeout waiting for video"}
 
-async def asyncio_sleep(seconds: float):
-    """Async sleep helper."""
-    import asyncio
-    await asyncio.sleep(seconds)
-
-async def generate_avatar_video(text: str, cache_key: str = None, expression: str = "neutral") -> dict:
+async def generate_avatar_video(text: str, cache_key: str = None, expression: str = "neutral",
+                                client: httpx.AsyncClient = None) -> dict:
     """
     Full pipeline: Text -> ElevenLabs Audio -> Azure Blob -> D-ID Video
     
     Args:
         text: The text to speak
-        cache_key: Optional key for caching (e.g., "intro", "q1", "nudge")
+        cache_key: Optional label for the cached clip (e.g., "intro", "q1", "nudge")
         expression: Facial expression ("neutral", "happy", "serious")
     
     Returns:
-        {"video_url": "...", "duration": ...} or {"error": "..."}
+        {"video_url": "...", "duration": ..., "timings": {...}} or {"error": "..."}
     """
-    # Check cache first (includes persisted cache)
-    if cache_key and cache_key in video_cache:
-        print(f"Cache hit for {cache_key}")
-        return video_cache[cache_key]
+    label = cache_key or "adhoc"
+    key = avatar_cache.avatar_cache_key(text, expression, DID_PRESENTER_URL)
+    owner = avatar_cache.new_owner_id()
+    give_up_at = time.monotonic() + CLAIM_WAIT_SECONDS
+    
+    # Cached, or claim the render; otherwise another worker is rendering it: wait for its row
+    while True:
+        cached = await asyncio.to_thread(avatar_cache.lookup, key)
+        if cached:
+            print(f"Cache hit for {label}")
+            return cached
+        if await asyncio.to_thread(avatar_cache.claim, key, label, owner):
+            break
+        if time.monotonic() > give_up_at:
+            return {"error": f"Timed out waiting for another worker to render {label}"}
+        await asyncio.sleep(CLAIM_POLL_SECONDS)
+    
+    heartbeat = asyncio.ensure_future(_heartbeat(key, owner))
+    try:
+        result = await _render_avatar_video(text, key, expression, client)
+    except BaseException as e:
+        # Cancelled: release the claim so another worker can take it
+        await asyncio.to_thread(avatar_cache.fail, key, owner, repr(e))
+        raise
+    finally:
+        heartbeat.cancel()
+    
+    if "error" in result:
+        await asyncio.to_thread(avatar_cache.fail, key, owner, result["error"])
+        return result
+    if not await asyncio.to_thread(avatar_cache.complete, key, owner, result):
+        print(f"Avatar {label}: claim was taken over; result not cached")
+        return result
+    
+    # Keep our own copy: the provider URL expires
+    if await asyncio.to_thread(media_mirror.mirror, "avatar", key, result["video_url"], "video/mp4",
+                               avatar_cache.url_expiry(result["video_url"])):
+        result["mirror_url"] = avatar_cache.mirror_url(key)
+    return result
+
+async def _heartbeat(key: str, owner: str):
+    while True:
+        await asyncio.sleep(avatar_cache.CLAIM_TTL_SECONDS / 3)
+        try:
+            await asyncio.to_thread(avatar_cache.heartbeat, key, owner)
+        except Exception as e:
+            print(f"Avatar claim heartbeat failed: {e}")
+
+async def _render_avatar_video(text: str, key: str, expression: str, client: httpx.AsyncClient = None) -> dict:
+    timings = {}
+    began = t = time.monotonic()
+    def lap(name):
+        nonlocal t
+        now = time.monotonic()
+        timings[name] = int((now - t) * 1000)
+        t = now
     
     try:
-        # 1. Generate audio via ElevenLabs
+        # 1. Generate audio via ElevenLabs (shared TTS cache)
         print(f"Generating audio for: {text[:50]}...")
-        audio_bytes = generate_audio_bytes(text)
+        audio_bytes, _ = await asyncio.to_thread(get_audio_cache().get_bytes, text)
+        lap("tts_ms")
         
         if not audio_bytes:
             return {"error": "TTS generation failed"}
         
         # 2. Upload audio to Azure Blob (get public URL)
         print("Uploading audio to Azure...")
-        audio_url = upload_audio_to_blob(audio_bytes, f"avatar_{cache_key or 'temp'}.mp3")
+        audio_url = await asyncio.to_thread(upload_audio_to_blob, audio_bytes, f"avatar_{key[:16]}.mp3")
+        lap("upload_ms")
         
         if not audio_url:
             return {"error": "Audio upload failed"}
@@ -168,7 +234,8 @@ async def generate_avatar_video(text: str, cache_key: str = None, expression: st
         
         # 3. Create D-ID talk
         print("Creating D-ID talk...")
-        talk_result = await create_talk(audio_url, expression)
+        talk_result = await create_talk(audio_url, expression, client)
+        lap("create_ms")
         
         if "error" in talk_result:
             return talk_result
@@ -178,26 +245,27 @@ async def generate_avatar_video(text: str, cache_key: str = None, expression: st
             return {"error": "No talk ID returned"}
         
         # 4. Wait for video to be ready
-        print(f"Waiting for video {talk_id}...")
-        final_result = await wait_for_talk(talk_id)
+        audio_seconds = len(audio_bytes) / MP3_BYTES_PER_SECOND
+        expected = expected_render_seconds(audio_seconds)
+        print(f"Waiting for video {talk_id} (~{expected:.0f}s for {audio_seconds:.1f}s of audio)...")
+        final_result = await wait_for_talk(talk_id, expected_seconds=expected, client=client)
+        lap("render_ms")
         
         if "error" in final_result:
             return final_result
         
         video_url = final_result.get("result_url")
         duration = final_result.get("duration", 0)
+        timings["polls"] = final_result.get("polls")
+        timings["total_ms"] = int((time.monotonic() - began) * 1000)
         
         result = {
             "video_url": video_url,
             "duration": duration,
-            "talk_id": talk_id
+            "talk_id": talk_id,
+            "timings": timings
         }
         
-        # Cache the result (in-memory + persist to file)
-        if cache_key:
-            video_cache[cache_key] = result
-            save_cache()  # Persist to JSON file
-        
         return result
         
     except Exception as e:
@@ -210,35 +278,17 @@ async def pre_generate_interview_videos() -> dict:
     """
     Pre-generate all interview videos for a session.
     Returns a dict mapping keys to video URLs.
-    Skips generation for already-cached videos.
+    Skips generation for already-cached videos; renders the rest concurrently.
     """
-    from services.tts import QUESTION_SCRIPTS
-    
     videos = {}
     keys_to_generate = ["intro", "q1", "q2", "q3", "outro", "nudge", "rephrase"]
     
-    # Check what's already cached
-    cached = [k for k in keys_to_generate if k in video_cache]
-    if cached:
-        print(f"Already cached: {cached}")
-        for k in cached:
-            videos[k] = video_cache[k]
-    
-    # Generate missing videos
-    missing = [k for k in keys_to_generate if k not in video_cache]
-    
-    if not missing:
-        print("All videos already cached!")
-        return videos
-    
-    print(f"Generating missing videos: {missing}")
-    
     texts = {
-        "intro": QUESTION_SCRIPTS.get("intro", "Welcome to National Foods. Let's begin your interview."),
-        "q1": QUESTION_SCRIPTS.get(1, "Question 1"),
-        "q2": QUESTION_SCRIPTS.get(2, "Question 2"),
-        "q3": QUESTION_SCRIPTS.get(3, "Question 3"),
-        "outro": QUESTION_SCRIPTS.get("outro", "Thank you for your time. We'll be in touch soon."),
+        "intro": QUESTIONS.get("intro", "Welcome to National Foods. Let's begin your interview."),
+        "q1": QUESTIONS.get(1, "Question 1"),
+        "q2": QUESTIONS.get(2, "Question 2"),
+        "q3": QUESTIONS.get(3, "Question 3"),
+        "outro": QUESTIONS.get("outro", "Thank you for your time. We'll be in touch soon."),
         "nudge": "Could you elaborate a bit more on that? I'd love to hear more details.",
         "rephrase": "Let me rephrase that for you."
     }
@@ -253,26 +303,55 @@ async def pre_generate_interview_videos() -> dict:
         "rephrase": "neutral"
     }
     
+    # Check what's already cached (by content, so edited texts are re-rendered)
+    for k in keys_to_generate:
+        cached = avatar_cache.lookup(avatar_cache.avatar_cache_key(texts[k], expressions[k], DID_PRESENTER_URL))
+        if cached:
+            videos[k] = cached
+    if videos:
+        print(f"Already cached: {list(videos)}")
+    
+    # Generate missing videos
+    missing = [k for k in keys_to_generate if k not in videos]
+    
+    if not missing:
+        print("All videos already cached!")
+        return videos
+    
+    print(f"Generating missing videos: {missing}")
+    
+    semaphore = asyncio.Semaphore(DID_CONCURRENCY)
+    began = time.monotonic()
+    
+    async with _http_client() as client:
+        async def render(key):
+            async with semaphore:
+                print(f"Pre-generating: {key}")
+                return await generate_avatar_video(
+                    texts[key],
+                    cache_key=key,
+                    expression=expressions.get(key, "neutral"),
+                    client=client
+                )
+        
+        results = await asyncio.gather(*(render(key) for key in missing), return_exceptions=True)
+    
+    for key, result in zip(missing, results):
+        videos[key] = {"error": str(result)} if isinstance(result, BaseException) else result
+    
+    # Per-clip report; wall time should track the slowest clip, not the sum
     for key in missing:
-        print(f"Pre-generating: {key}")
-        result = await generate_avatar_video(
-            texts[key],
-            cache_key=key,
-            expression=expressions.get(key, "neutral")
-        )
-        videos[key] = result
+        timings = videos[key].get("timings")
+        print(f"  {key}: {timings if timings else videos[key].get('error')}")
+    print(f"Pre-generated {len(missing)} videos in {time.monotonic() - began:.1f}s (concurrency {DID_CONCURRENCY})")
     
     return videos
 
 def get_cached_video(key: str) -> dict:
     """Get a cached video URL by key."""
-    return video_cache.get(key, {"error": "Video not cached"})
+    return avatar_cache.latest_for_label(key) or {"error": "Video not cached"}
 
 def clear_cache():
-    """Clear the video cache (both memory and file)."""
-    global video_cache
-    video_cache = {}
-    if CACHE_FILE.exists():
-        CACHE_FILE.unlink()
-    print("Cache cleared")
-
+    """Clear the video cache (all workers share it)."""
+    removed = avatar_cache.clear()
+    print(f"Cache cleared ({removed} videos)")
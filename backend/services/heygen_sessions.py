@@ -0,0 +1,206 @@
+"""
+HeyGen Session Pool
+Keeps a few HeyGen streaming sessions created ahead of time so a candidate
+gets one immediately instead of waiting for provider setup. A background
+task refills the pool and stops sessions that sat unused for too long.
+All calls go through the shared pooled AsyncClient (services/providers.py).
+
+Every pooled session is a billed session, and unused ones must be replaced
+every MAX_IDLE_SECONDS. The pool is therefore only kept full for
+WARM_SECONDS after startup or the last hand-out: a busy period costs up to
+POOL_SIZE * WARM_SECONDS / MAX_IDLE_SECONDS extra sessions (30 with the
+defaults), a quiet server none. The first candidate after a quiet period
+waits for a session created on the spot.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+from services.providers import get_providers
+
+# Config
+HEYGEN_API_KEY = os.getenv("HEYGEN_API_KEY")
+HEYGEN_AVATAR_ID = os.getenv("HEYGEN_AVATAR_ID") # e.g. "Anna_public_3_20240108"
+HEYGEN_VOICE_ID = os.getenv("HEYGEN_VOICE_ID", "cjVigY5qzO86Huf0OWal")
+HEYGEN_BASE_URL = "https://api.heygen.com/v1"
+POOL_SIZE = int(os.getenv("HEYGEN_POOL_SIZE", "2"))
+# Unstarted sessions are closed by HeyGen after a while; hand out only fresh ones
+MAX_IDLE_SECONDS = float(os.getenv("HEYGEN_POOL_MAX_IDLE_SECONDS", "60"))
+# Keep the pool full only this long after the last hand-out (0: never refill)
+WARM_SECONDS = float(os.getenv("HEYGEN_POOL_WARM_SECONDS", "900"))
+REFILL_RETRY_SECONDS = 5.0
+REQUEST_TIMEOUT = 30.0
+
+class HeyGenError(Exception):
+    pass
+
+def _headers() -> dict:
+    return {"X-Api-Key": HEYGEN_API_KEY or "", "Content-Type": "application/json"}
+
+async def _post(path: str, payload: dict = None) -> dict:
+    client = get_providers().async_http
+    if client is None:
+        raise HeyGenError("Provider clients not started")
+    response = await client.post(f"{HEYGEN_BASE_URL}/{path}", headers=_headers(), json=payload, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        raise HeyGenError(f"{path} failed: {response.status_code} - {response.text[:500]}")
+    return response.json().get("data") or {}
+
+async def create_token() -> dict:
+    """Temporary access token for the HeyGen Streaming SDK."""
+    return await _post("streaming.create_token")
+
+async def create_session() -> dict:
+    """New streaming session: { session_id, access_token, url, ice_servers, ... }."""
+    return await _post("streaming.new", {
+        "quality": "medium",
+        "avatar_name": HEYGEN_AVATAR_ID,
+        "voice": {"voice_id": HEYGEN_VOICE_ID},
+    })
+
+async def speak(session_id: str, text: str):
+    await _post("streaming.task", {"session_id": session_id, "text": text, "task_type": "repeat"})
+
+async def stop_session(session_id: str):
+    await _post("streaming.stop", {"session_id": session_id})
+
+class HeyGenSessionPool:
+    """Pre-created sessions, refilled in the background on the app's event loop."""
+
+    def __init__(self, size: int = POOL_SIZE, max_idle_seconds: float = MAX_IDLE_SECONDS, warm_seconds: float = WARM_SECONDS):
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.warm_seconds = warm_seconds
+        self._last_demand = time.monotonic() # startup counts as demand
+        self._idle = deque() # (created_at monotonic, session data), oldest first
+        self._creating = 0
+        self._wake = asyncio.Event()
+        self._task = None
+        self.counters = {"created": 0, "handed_out": 0, "pool_hits": 0, "pool_misses": 0, "expired": 0, "errors": 0}
+        self.create_ms = deque(maxlen=50)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Pooled sessions were never given out; release them at the provider
+        idle, self._idle = list(self._idle), deque()
+        await asyncio.gather(*(stop_session(data["session_id"]) for _, data in idle), return_exceptions=True)
+
+    async def acquire(self) -> dict:
+        """A ready session; created on the spot only when the pool is empty."""
+        self._expire()
+        self._last_demand = time.monotonic()
+        self._wake.set() # refill what we are about to take
+        if self._idle:
+            created_at, data = self._idle.popleft()
+            self.counters["pool_hits"] += 1
+            self.counters["handed_out"] += 1
+            print(f"HeyGen: handed out pooled session {data.get('session_id')} ({time.monotonic() - created_at:.0f}s old)")
+            return data
+        self.counters["pool_misses"] += 1
+        data = await self._create()
+        self.counters["handed_out"] += 1
+        return data
+
+    async def _create(self) -> dict:
+        began = time.monotonic()
+        self._creating += 1
+        try:
+            data = await create_session()
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self._creating -= 1
+        self.counters["created"] += 1
+        self.create_ms.append(int((time.monotonic() - began) * 1000))
+        return data
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][0] > self.max_idle_seconds:
+            _, data = self._idle.popleft()
+            self.counters["expired"] += 1
+            asyncio.ensure_future(self._stop_quietly(data["session_id"]))
+
+    async def _stop_quietly(self, session_id: str):
+        try:
+            await stop_session(session_id)
+        except Exception as e:
+            print(f"HeyGen: failed to stop idle session {session_id}: {e}")
+
+    async def _fill_one(self):
+        try:
+            data = await self._create()
+            self._idle.append((time.monotonic(), data))
+        except Exception as e:
+            print(f"HeyGen: pool refill failed: {e}")
+            await asyncio.sleep(REFILL_RETRY_SECONDS)
+
+    def _warm_remaining(self) -> float:
+        return self.warm_seconds - (time.monotonic() - self._last_demand)
+
+    async def _run(self):
+        while True:
+            self._expire()
+            warm = self._warm_remaining() > 0
+            missing = self.size - len(self._idle) - self._creating
+            if warm and missing > 0:
+                await asyncio.gather(*(self._fill_one() for _ in range(missing)))
+                continue
+            # Sleep until a session is taken, the oldest one is due to expire or
+            # the warm window ends; once cold, expired sessions are not replaced
+            deadlines = []
+            if self._idle:
+                deadlines.append(self.max_idle_seconds - (time.monotonic() - self._idle[0][0]))
+            if warm:
+                deadlines.append(self._warm_remaining())
+            timeout = max(0.1, min(deadlines)) if deadlines else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        timings = sorted(self.create_ms)
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "creating": self._creating,
+            "oldest_idle_seconds": round(now - self._idle[0][0], 1) if self._idle else None,
+            "warm": self._warm_remaining() > 0,
+            "seconds_since_demand": round(now - self._last_demand, 1),
+            "create_ms_p50": timings[len(timings) // 2] if timings else None,
+            **self.counters,
+        }
+
+_pool: Optional[HeyGenSessionPool] = None
+
+def get_session_pool() -> Optional[HeyGenSessionPool]:
+    return _pool
+
+def start_session_pool() -> Optional[HeyGenSessionPool]:
+    """Lifespan startup (after start_providers)."""
+    global _pool
+    if not HEYGEN_API_KEY or POOL_SIZE <= 0:
+        print("HeyGen session pool disabled (no HEYGEN_API_KEY or HEYGEN_POOL_SIZE=0)")
+        return None
+    _pool = HeyGenSessionPool()
+    _pool.start()
+    return _pool
+
+async def stop_session_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.stop()
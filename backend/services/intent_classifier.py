@@ -0,0 +1,100 @@
+"""
+Local Intent Classifier
+Deterministic first pass over an answer transcript: phrase matching plus
+length and speaking-rate features. Clear-cut answers ("skip", "repeat
+that", a long detailed answer) are decided here; anything below the
+confidence threshold is escalated to the LLM.
+"""
+import os
+import re
+import threading
+from typing import Optional
+
+LOCAL_MIN_CONFIDENCE = float(os.getenv("INTENT_LOCAL_MIN_CONFIDENCE", "0.85"))
+LONG_ANSWER_WORDS = int(os.getenv("INTENT_LONG_ANSWER_WORDS", "40"))
+SHORT_ANSWER_WORDS = 4
+# Plausible conversational speech; outside this the transcript is suspect
+MIN_WORDS_PER_SECOND = 1.0
+MAX_WORDS_PER_SECOND = 4.5
+
+REPHRASE_PHRASES = [
+    "rephrase", "repeat that", "repeat the question", "say that again", "say it again",
+    "what do you mean", "what does that mean", "i don't understand", "i didn't understand",
+    "didn't get that", "didn't get the question", "not sure what you mean", "can you explain the question",
+    "come again", "pardon",
+]
+DONT_KNOW_PHRASES = ["i don't know", "no idea", "not sure"]
+SKIP_PHRASES = ["skip", "pass", "next question", "move on", "next please", "next"]
+
+# Spoken and typed variants -> the contraction used in the phrase lists
+_CONTRACTIONS = [
+    (re.compile(r"\bdo\s+not\b|\bdont\b"), "don't"),
+    (re.compile(r"\bdid\s+not\b|\bdidnt\b"), "didn't"),
+    (re.compile(r"\bdoes\s+not\b|\bdoesnt\b"), "doesn't"),
+    (re.compile(r"\bcan\s*not\b|\bcant\b"), "can't"),
+]
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    for pattern, contraction in _CONTRACTIONS:
+        text = pattern.sub(contraction, text)
+    return re.sub(r"[^a-z' ]+", " ", text).strip()
+
+def _pattern(phrases) -> re.Pattern:
+    return re.compile(r"\b(" + "|".join(re.escape(p) for p in phrases) + r")\b")
+
+_REPHRASE = _pattern(REPHRASE_PHRASES)
+_DONT_KNOW = _pattern(DONT_KNOW_PHRASES)
+_SKIP = _pattern(SKIP_PHRASES)
+
+def classify(transcript: str, speech_seconds: float = None) -> Optional[dict]:
+    """
+    {"action", "reason", "confidence"} for clear-cut answers, or None when
+    the answer is ambiguous (confidence below the threshold).
+    """
+    text = _normalize(transcript)
+    words = text.split()
+    word_count = len(words)
+    rate = word_count / speech_seconds if speech_seconds else None
+
+    candidates = []
+    if word_count <= 10 and _REPHRASE.search(text):
+        candidates.append(("rephrase", "Asked for clarification", 0.95))
+    if word_count <= 6 and _DONT_KNOW.search(text):
+        candidates.append(("rephrase", "Does not know (short)", 0.9))
+    if word_count <= SHORT_ANSWER_WORDS and _SKIP.search(text):
+        candidates.append(("next", "Asked to skip", 0.95))
+    if not candidates and word_count <= SHORT_ANSWER_WORDS:
+        candidates.append(("nudge", "Too Short", 0.85))
+    if word_count >= LONG_ANSWER_WORDS:
+        confidence = 0.9
+        if rate is not None and not MIN_WORDS_PER_SECOND <= rate <= MAX_WORDS_PER_SECOND:
+            confidence = 0.6 # words do not match the audio length; let the LLM look
+        candidates.append(("next", "Detailed Answer", confidence))
+
+    if len({action for action, _, _ in candidates}) != 1:
+        return None # nothing matched, or the signals disagree
+    action, reason, confidence = max(candidates, key=lambda c: c[2])
+    if confidence < LOCAL_MIN_CONFIDENCE:
+        return None
+    return {"action": action, "reason": reason, "confidence_local": confidence}
+
+# decided_by -> count, for the LLM call rate avoided
+_counts = {}
+_counts_lock = threading.Lock()
+
+def record_decision(decided_by: str):
+    with _counts_lock:
+        _counts[decided_by] = _counts.get(decided_by, 0) + 1
+
+def decision_stats() -> dict:
+    with _counts_lock:
+        counts = dict(_counts)
+    total = sum(counts.values())
+    llm_calls = counts.get("llm", 0) + counts.get("fallback", 0) # fallback = LLM attempted and failed
+    return {
+        "decisions": total,
+        "by": counts,
+        "llm_call_rate": round(llm_calls / total, 3) if total else None,
+        "llm_calls_avoided": total - llm_calls,
+    }
@@ -0,0 +1,267 @@
+"""
+Durable Processing Queue
+Interview processing jobs are persisted in sessions.db and executed by a
+bounded pool of worker threads, each with its own DB session.
+Failed jobs are retried with exponential backoff; jobs whose worker died
+(stale heartbeat) are re-queued at startup and by a periodic sweep.
+"""
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlmodel import Session, select, update
+from database import engine
+from models import Interview, ProcessingJob
+
+# Config
+WORKER_COUNT = int(os.getenv("PROCESSING_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("PROCESSING_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("PROCESSING_RETRY_BASE_SECONDS", "15"))
+POLL_SECONDS = float(os.getenv("PROCESSING_POLL_SECONDS", "2"))
+HEARTBEAT_SECONDS = 30
+ORPHAN_AFTER_SECONDS = HEARTBEAT_SECONDS * 3
+
+ACTIVE_STATUSES = ("queued", "running")
+
+def enqueue_processing(session_id: str, db: Session = None) -> int:
+    """
+    Queues processing for a session and returns the job id.
+    Idempotent: an existing queued/running job for the session is reused.
+    """
+    if db is None:
+        with Session(engine) as own_db:
+            return enqueue_processing(session_id, own_db)
+
+    existing = db.exec(
+        select(ProcessingJob)
+        .where(ProcessingJob.session_id == session_id)
+        .where(ProcessingJob.status.in_(ACTIVE_STATUSES))
+    ).first()
+    if existing:
+        return existing.id
+
+    job = ProcessingJob(session_id=session_id, max_attempts=MAX_ATTEMPTS)
+    db.add(job)
+
+    interview = db.get(Interview, session_id)
+    if interview:
+        interview.status = "queued"
+        db.add(interview)
+
+    db.commit()
+    db.refresh(job)
+    print(f"[{session_id}] Processing job {job.id} queued")
+    if _pool:
+        _pool.wake()
+    return job.id
+
+def latest_job(session_id: str, db: Session) -> Optional[ProcessingJob]:
+    """Most recent processing job for a session, in any status."""
+    return db.exec(
+        select(ProcessingJob)
+        .where(ProcessingJob.session_id == session_id)
+        .order_by(ProcessingJob.id.desc())
+    ).first()
+
+def claim_next_job(worker_id: str) -> Optional[ProcessingJob]:
+    """Atomically moves the oldest due job to 'running' for this worker."""
+    with Session(engine) as db:
+        now = datetime.utcnow()
+        candidates = db.exec(
+            select(ProcessingJob.id)
+            .where(ProcessingJob.status == "queued")
+            .where(ProcessingJob.run_after <= now)
+            .order_by(ProcessingJob.run_after)
+            .limit(5)
+        ).all()
+
+        for job_id in candidates:
+            # Conditional update: only one worker (or process) can win the row
+            result = db.exec(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == job_id)
+                .where(ProcessingJob.status == "queued")
+                .values(
+                    status="running",
+                    locked_by=worker_id,
+                    locked_at=now,
+                    attempts=ProcessingJob.attempts + 1,
+                    updated_at=now,
+                )
+            )
+            db.commit()
+            if result.rowcount == 1:
+                return db.get(ProcessingJob, job_id)
+    return None
+
+def finish_job(job_id: int, error: str = None):
+    """Marks a job done, or schedules a retry with backoff / fails it for good."""
+    with Session(engine) as db:
+        job = db.get(ProcessingJob, job_id)
+        if not job:
+            return
+        now = datetime.utcnow()
+        job.locked_by = None
+        job.locked_at = None
+        job.updated_at = now
+
+        if error is None:
+            job.status = "done"
+            job.last_error = None
+        elif job.attempts < job.max_attempts:
+            delay = RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+            job.status = "queued"
+            job.run_after = now + timedelta(seconds=delay)
+            job.last_error = error[-4000:]
+
+            interview = db.get(Interview, job.session_id)
+            if interview:
+                interview.status = "queued"
+                db.add(interview)
+            print(f"[{job.session_id}] Job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s")
+        else:
+            job.status = "failed"
+            job.last_error = error[-4000:]
+            print(f"[{job.session_id}] Job {job.id} failed after {job.attempts} attempts")
+
+        db.add(job)
+        db.commit()
+
+def requeue_orphaned_jobs() -> int:
+    """
+    Re-queues jobs whose worker stopped heartbeating, and sessions left in
+    'uploaded'/'queued'/'processing' without any active job (e.g. pre-queue rows).
+    """
+    with Session(engine) as db:
+        stale_before = datetime.utcnow() - timedelta(seconds=ORPHAN_AFTER_SECONDS)
+        result = db.exec(
+            update(ProcessingJob)
+            .where(ProcessingJob.status == "running")
+            .where(ProcessingJob.locked_at < stale_before)
+            .values(status="queued", locked_by=None, locked_at=None, updated_at=datetime.utcnow())
+        )
+        requeued = result.rowcount
+        db.commit()
+
+        stuck = db.exec(
+            select(Interview)
+            .where(Interview.status.in_(("uploaded", "queued", "processing")))
+            .where(Interview.video_url != None)
+        ).all()
+        for interview in stuck:
+            active = db.exec(
+                select(ProcessingJob.id)
+                .where(ProcessingJob.session_id == interview.id)
+                .where(ProcessingJob.status.in_(ACTIVE_STATUSES))
+            ).first()
+            if not active:
+                enqueue_processing(interview.id, db)
+                requeued += 1
+
+    if requeued:
+        print(f"Re-queued {requeued} orphaned processing jobs")
+    return requeued
+
+class ProcessingWorkerPool:
+    """Fixed number of worker threads; concurrency is bounded by the pool size."""
+
+    def __init__(self, size: int = WORKER_COUNT):
+        self.size = max(1, size)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+        self._active = {}  # worker_id -> job_id
+        self._lock = threading.Lock()
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        requeue_orphaned_jobs()
+        for n in range(self.size):
+            t = threading.Thread(target=self._run, args=(f"{self._prefix}:{n}",), daemon=True, name=f"processing-worker-{n}")
+            t.start()
+            self._threads.append(t)
+        hb = threading.Thread(target=self._heartbeat, daemon=True, name="processing-heartbeat")
+        hb.start()
+        self._threads.append(hb)
+        print(f"Processing worker pool started ({self.size} workers)")
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                job = claim_next_job(worker_id)
+            except Exception as e:
+                print(f"[{worker_id}] Claim failed: {e}")
+                job = None
+
+            if not job:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                self._active[worker_id] = job.id
+            try:
+                self._execute(job)
+            finally:
+                with self._lock:
+                    self._active.pop(worker_id, None)
+
+    def _execute(self, job: ProcessingJob):
+        from services.processing import process_interview_background
+
+        print(f"[{job.session_id}] Job {job.id} started (attempt {job.attempts}/{job.max_attempts})")
+        try:
+            # Each job gets its own DB session, never a request-scoped one
+            with Session(engine) as db:
+                process_interview_background(job.session_id, db)
+        except Exception:
+            finish_job(job.id, error=traceback.format_exc())
+        else:
+            finish_job(job.id)
+
+    def _heartbeat(self):
+        sweeps = 0
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            with self._lock:
+                job_ids = list(self._active.values())
+            try:
+                if job_ids:
+                    with Session(engine) as db:
+                        db.exec(
+                            update(ProcessingJob)
+                            .where(ProcessingJob.id.in_(job_ids))
+                            .values(locked_at=datetime.utcnow())
+                        )
+                        db.commit()
+                # Pick up jobs from dead workers in other processes, too
+                sweeps += 1
+                if sweeps % 4 == 0:
+                    requeue_orphaned_jobs()
+            except Exception as e:
+                print(f"Processing heartbeat failed: {e}")
+
+_pool: Optional[ProcessingWorkerPool] = None
+
+def start_worker_pool() -> ProcessingWorkerPool:
+    global _pool
+    if _pool is None:
+        _pool = ProcessingWorkerPool()
+        _pool.start()
+    return _pool
+
+def stop_worker_pool():
+    global _pool
+    if _pool:
+        _pool.stop()
+        _pool = None
@@ -0,0 +1,51 @@
+"""
+Lip-Sync Envelopes
+Per-frame mouth animation data for a TTS clip, computed once on the server
+in a single vectorized NumPy pass so the browser does not need to run a
+real-time FFT. Each frame is CHANNELS bytes:
+
+    level  overall loudness, relative to the clip's own peak
+    low    share of energy below 500 Hz   (O / U shapes)
+    mid    share of energy 500-2000 Hz    (A)
+    high   share of energy above 2000 Hz  (E / I / S)
+
+The bands match the ones the avatar used to derive from its AnalyserNode.
+"""
+import os
+import numpy as np
+from services.media import SAMPLE_RATE
+from services.decoder import decode_pcm
+
+ENVELOPE_RATE = int(os.getenv("LIPSYNC_ENVELOPE_RATE", "60")) # frames per second
+CHANNELS = 4
+LEVEL_RANGE_DB = 40.0 # quieter than peak - 40 dB is a closed mouth
+BANDS_HZ = [(0, 500), (500, 2000), (2000, SAMPLE_RATE // 2)]
+
+def compute_envelope(pcm: bytes, sample_rate: int = SAMPLE_RATE, rate: int = ENVELOPE_RATE) -> bytes:
+    """uint8 frames (level, low, mid, high), `rate` per second of 16-bit mono PCM."""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    n_frames = int(len(samples) * rate // sample_rate)
+    if n_frames == 0:
+        return b""
+
+    # One window per output frame, hop = sample_rate / rate (not always an integer)
+    window = int(np.ceil(sample_rate / rate))
+    starts = np.round(np.arange(n_frames) * sample_rate / rate).astype(np.int64)
+    padded = np.pad(samples, (0, window))
+    frames = padded[starts[:, None] + np.arange(window)[None, :]] * np.hanning(window)
+
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    freqs = np.fft.rfftfreq(window, 1.0 / sample_rate)
+    total = power.sum(axis=1) + 1e-12
+    bands = np.stack([power[:, (freqs >= lo) & (freqs < hi)].sum(axis=1) for lo, hi in BANDS_HZ], axis=1) / total[:, None]
+
+    rms_db = 20 * np.log10(np.sqrt(np.mean(frames * frames, axis=1)) + 1e-9)
+    peak_db = np.percentile(rms_db, 95)
+    level = np.clip((rms_db - peak_db + LEVEL_RANGE_DB) / LEVEL_RANGE_DB, 0.0, 1.0)
+
+    envelope = np.concatenate([level[:, None], bands], axis=1)
+    return np.round(envelope * 255).astype(np.uint8).tobytes()
+
+def envelope_for_clip(audio: bytes) -> bytes:
+    """Envelope of an encoded (MP3) clip."""
+    return compute_envelope(decode_pcm(audio))
@@ -0,0 +1,169 @@
+"""
+Live Answer Analysis
+Backs the /api/interview/ws/analyze WebSocket. Audio is decoded while the
+candidate is still talking, cut at pauses, and each piece is transcribed
+as soon as it closes. When the answer ends only the tail segment and the
+intent decision are left to do.
+"""
+import os
+import time
+import asyncio
+from typing import Dict, Tuple
+from services.media import SAMPLE_RATE, pcm_seconds
+from services.decoder import StreamingDecoder
+from services.vad import VadChunker
+from services.analysis import (
+    CPU_EXECUTOR, STT_EXECUTOR, StageTimer, Deadline, transcribe_answer, decide_intent, deadline_fallback
+)
+from services.intent_classifier import record_decision
+
+# Shorter than the batch chunks: the tail is what the candidate waits for
+LIVE_MIN_CHUNK_SECONDS = float(os.getenv("LIVE_MIN_CHUNK_SECONDS", "3"))
+LIVE_MAX_CHUNK_SECONDS = float(os.getenv("LIVE_MAX_CHUNK_SECONDS", "12"))
+
+class LiveAnswer:
+    """Rolling transcript for one answer attempt of one question."""
+
+    def __init__(self, session_id: str, question_id, question_text: str, attempt: int, on_partial=None):
+        self.session_id = session_id
+        self.question_id = question_id
+        self.question_text = question_text
+        self.attempt = attempt
+        self.on_partial = on_partial # async callback(transcript)
+        self.decoder = StreamingDecoder(session_id)
+        self.chunker = VadChunker(SAMPLE_RATE, LIVE_MIN_CHUNK_SECONDS, LIVE_MAX_CHUNK_SECONDS)
+        self.segments = [] # transcription tasks, in audio order
+        self._transcribed = {} # index -> finished segment
+        self.bytes_in = 0
+        self.pcm_bytes = 0
+        self._pump = None
+        self.finished = False
+
+    async def start(self):
+        await self.decoder.start()
+        self._pump = asyncio.ensure_future(self._run_pump())
+
+    async def feed(self, data: bytes):
+        self.bytes_in += len(data)
+        await self.decoder.feed(data)
+
+    async def _run_pump(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            block = await self.decoder.pcm.get()
+            if block is None:
+                break
+            self.pcm_bytes += len(block)
+            for chunk in await loop.run_in_executor(CPU_EXECUTOR, self.chunker.feed, block):
+                self._submit(chunk)
+        for chunk in await loop.run_in_executor(CPU_EXECUTOR, self.chunker.flush):
+            self._submit(chunk)
+
+    def _submit(self, chunk: Tuple[float, float, bytes]):
+        start, end, pcm = chunk
+        self.segments.append(asyncio.ensure_future(self._transcribe(len(self.segments), start, end, pcm)))
+
+    async def _transcribe(self, index: int, start: float, end: float, pcm: bytes) -> dict:
+        loop = asyncio.get_running_loop()
+        segment = {"index": index, "start": start, "end": end, "status": "error", "text": "", "confidence": None}
+        try:
+            segment["text"], segment["confidence"] = await loop.run_in_executor(STT_EXECUTOR, transcribe_answer, pcm)
+            segment["status"] = "ok" if segment["text"] else "silence"
+        except Exception as e:
+            segment["error"] = str(e)
+            print(f"[{self.session_id}] Live STT segment {index} Error: {e}")
+        self._transcribed[index] = segment
+
+        if self.on_partial and not self.finished:
+            try:
+                await self.on_partial(self.rolling_transcript())
+            except Exception:
+                pass # client went away; finish() still has the segments
+        return segment
+
+    def rolling_transcript(self) -> str:
+        """Text of the segments transcribed so far, in order."""
+        return " ".join(self._transcribed[i]["text"] for i in sorted(self._transcribed) if self._transcribed[i]["text"])
+
+    async def _drain(self):
+        await self._pump
+        await asyncio.gather(*self.segments)
+
+    async def finish(self, budget_ms: int = None) -> dict:
+        """
+        Ends the stream, waits for the tail segment and decides the next action.
+        If the tail does not make its share of the budget, decides on what was
+        transcribed so far and cancels the rest.
+        """
+        timer = StageTimer()
+        deadline = Deadline(budget_ms)
+        t = time.monotonic()
+        await self.decoder.close()
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._drain(), deadline.budget_for("stt"))
+        except asyncio.TimeoutError:
+            timed_out = True
+            print(f"[{self.session_id}] Live tail missed its deadline; using {len(self._transcribed)}/{len(self.segments)} segments")
+            await self.abort()
+        t = timer.mark("tail", t)
+        self.finished = True
+        segments = [self._transcribed[i] for i in sorted(self._transcribed)]
+
+        transcript = " ".join(seg["text"] for seg in segments if seg["text"])
+        if timed_out and not transcript:
+            result = deadline_fallback("", {"stt_status": "error", "confidence": None}, self.attempt,
+                                       pcm_seconds(self.pcm_bytes), "stt")
+        elif self.pcm_bytes < 100:
+            print(f"[{self.session_id}] Live audio decode failed or stream too small")
+            result = {"action": "nudge", "reason": "Audio conversion failed", "transcript": "", "decided_by": "heuristic"}
+            record_decision("heuristic")
+        elif segments and all(seg["status"] == "error" for seg in segments):
+            result = {"action": "next", "reason": "STT Failed", "transcript": "", "stt_status": "error", "confidence": None, "decided_by": "heuristic"}
+            record_decision("heuristic")
+        else:
+            confidences = [seg["confidence"] for seg in segments if seg["confidence"] is not None]
+            incomplete = timed_out or any(seg["status"] == "error" for seg in segments)
+            stt = {
+                # Partial failures are re-transcribed from the full recording later
+                "stt_status": "error" if incomplete else ("ok" if transcript else "silence"),
+                "confidence": min(confidences) if confidences else None,
+            }
+            print(f"[{self.session_id}] Live transcript: {transcript} (confidence={stt['confidence']})")
+            speech_seconds = sum(seg["end"] - seg["start"] for seg in segments)
+            result = await decide_intent(transcript, stt, self.question_text, self.attempt, timer, speech_seconds, deadline)
+
+        result["segments"] = len(segments)
+        result["speech_seconds"] = round(pcm_seconds(self.pcm_bytes), 2)
+        result["budget_ms"] = deadline.budget_ms
+        result["timings"] = timer.done()
+        print(f"[{self.session_id}] Live analyze timings: {result['timings']}")
+        return result
+
+    async def abort(self):
+        self.finished = True
+        await self.decoder.abort()
+        if self._pump is not None:
+            self._pump.cancel()
+        for task in self.segments:
+            task.cancel()
+
+# Active streams, one per (session_id, question_id)
+_live_answers: Dict[tuple, LiveAnswer] = {}
+
+async def open_live_answer(session_id: str, question_id, question_text: str, attempt: int, on_partial=None) -> LiveAnswer:
+    """Starts a stream; a reconnect for the same question replaces the old one."""
+    key = (session_id, question_id)
+    previous = _live_answers.pop(key, None)
+    if previous is not None:
+        await previous.abort()
+    live = LiveAnswer(session_id, question_id, question_text, attempt, on_partial)
+    await live.start()
+    _live_answers[key] = live
+    return live
+
+async def close_live_answer(live: LiveAnswer):
+    if _live_answers.get((live.session_id, live.question_id)) is live:
+        del _live_answers[(live.session_id, live.question_id)]
+    if not live.finished:
+        await live.abort()
@@ -0,0 +1,188 @@
+"""
+LLM Call Layer
+All Azure OpenAI JSON completions go through here. Responses are cached
+on disk (SQLite) keyed by deployment, prompt template version and a hash
+of the request, with size-bounded LRU eviction and hit/miss counters.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from pathlib import Path
+from openai import AsyncAzureOpenAI
+from services.providers import get_providers
+from dotenv import load_dotenv
+
+# Load Env
+env_path = Path(__file__).resolve().parent.parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Config
+AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "").split("/openai")[0]
+AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "nflinterviewOpenAI")
+AOAI_VERSION = "2024-02-15-preview"
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(Path(__file__).resolve().parent.parent / "llm_cache.db"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+class LLMCache:
+    """SQLite-backed response cache with LRU eviction by total size."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                deployment TEXT NOT NULL,
+                template_version TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(deployment: str, template_version: str, request: dict) -> str:
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{deployment}\0{template_version}\0{payload}".encode()).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, deployment: str, template_version: str, response: str):
+        now = time.time()
+        size = len(response.encode())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, deployment, template_version, response, size, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, deployment, template_version, response, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are 10% under the limit
+        target = self.max_bytes * 0.9
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> LLMCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+    return _cache
+
+def _request(messages: list, temperature) -> dict:
+    request = {"messages": messages, "response_format": "json_object"}
+    if temperature is not None:
+        request["temperature"] = temperature
+    return request
+
+def chat_json(messages: list, template_version: str, temperature: float = None,
+              deployment: str = AOAI_DEPLOYMENT) -> dict:
+    """Cached JSON chat completion (sync)."""
+    key = LLMCache.make_key(deployment, template_version, _request(messages, temperature))
+    if CACHE_ENABLED:
+        cached = get_cache().get(key)
+        if cached is not None:
+            return json.loads(cached)
+
+    client = get_providers().openai
+    kwargs = {"temperature": temperature} if temperature is not None else {}
+    response = client.chat.completions.create(
+        model=deployment,
+        messages=messages,
+        response_format={ "type": "json_object" },
+        **kwargs
+    )
+    content = response.choices[0].message.content
+    result = json.loads(content) # Only valid JSON gets cached
+    if CACHE_ENABLED:
+        get_cache().put(key, deployment, template_version, content)
+    return result
+
+async def achat_json(messages: list, template_version: str, temperature: float = None,
+                     deployment: str = AOAI_DEPLOYMENT, client: AsyncAzureOpenAI = None) -> dict:
+    """Cached JSON chat completion (async). Cache I/O runs off the event loop."""
+    key = LLMCache.make_key(deployment, template_version, _request(messages, temperature))
+    if CACHE_ENABLED:
+        cached = await asyncio.to_thread(get_cache().get, key)
+        if cached is not None:
+            return json.loads(cached)
+
+    if client is None:
+        client = get_providers().async_openai_for_running_loop()
+    own_client = client is None
+    if own_client:
+        # Not on the app's event loop (e.g. asyncio.run in a worker thread)
+        client = AsyncAzureOpenAI(azure_endpoint=AOAI_ENDPOINT, api_key=AOAI_KEY, api_version=AOAI_VERSION)
+    try:
+        kwargs = {"temperature": temperature} if temperature is not None else {}
+        response = await client.chat.completions.create(
+            model=deployment,
+            messages=messages,
+            response_format={ "type": "json_object" },
+            **kwargs
+        )
+    finally:
+        if own_client:
+            await client.close()
+    content = response.choices[0].message.content
+    result = json.loads(content)
+    if CACHE_ENABLED:
+        await asyncio.to_thread(get_cache().put, key, deployment, template_version, content)
+    return result
+
+def cache_stats() -> dict:
+    return get_cache().stats() if CACHE_ENABLED else {"enabled": False}
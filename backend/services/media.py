@@ -0,0 +1,116 @@
+"""
+Streaming Media Stage
+Pipes a blob download through ffmpeg and yields 16 kHz mono PCM in
+fixed-size frames, without temp files or a full copy in memory.
+"""
+import asyncio
+import subprocess
+import threading
+from typing import Iterator
+import imageio_ffmpeg
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2 # s16le
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH # 1 second of PCM per frame
+
+class MediaStreamError(Exception):
+    """Download or decode failure; the whole stage has to be retried."""
+
+def pcm_seconds(num_bytes: int) -> float:
+    return num_bytes / (SAMPLE_RATE * SAMPLE_WIDTH)
+
+def _pcm_command() -> list:
+    return [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLE_RATE),
+        "-ac", "1",
+        "pipe:1",
+    ]
+
+def stream_blob_pcm(blob_client, frame_bytes: int = FRAME_BYTES, session_id: str = "") -> Iterator[bytes]:
+    """
+    Yields PCM frames of `frame_bytes` (last one may be shorter) while the
+    blob is still downloading. Raises if ffmpeg fails before producing audio.
+    """
+    proc = subprocess.Popen(_pcm_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    state = {"downloaded": 0, "error": None}
+    stderr_tail = bytearray()
+
+    def feed():
+        # Download chunks go straight into ffmpeg's stdin
+        try:
+            for chunk in blob_client.download_blob().chunks():
+                proc.stdin.write(chunk)
+                state["downloaded"] += len(chunk)
+        except BrokenPipeError:
+            pass # ffmpeg exited; reported via returncode
+        except Exception as e:
+            state["error"] = e
+        finally:
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+
+    def drain_stderr():
+        for line in proc.stderr:
+            stderr_tail.extend(line)
+            del stderr_tail[:-4000]
+
+    feeder = threading.Thread(target=feed, daemon=True, name=f"blob-feed-{session_id}")
+    drainer = threading.Thread(target=drain_stderr, daemon=True)
+    feeder.start()
+    drainer.start()
+
+    produced = 0
+    try:
+        while True:
+            frame = proc.stdout.read(frame_bytes)
+            if not frame:
+                break
+            produced += len(frame)
+            yield frame
+
+        proc.wait()
+        feeder.join()
+        drainer.join(timeout=5)
+
+        if state["error"]:
+            raise MediaStreamError(f"Blob download failed: {state['error']}") from state["error"]
+        print(f"[{session_id}] Streamed {state['downloaded']} bytes -> {pcm_seconds(produced):.1f}s PCM")
+        if proc.returncode != 0:
+            # MediaRecorder webm often ends "prematurely"; keep what was decoded
+            if produced > FRAME_BYTES:
+                print(f"[{session_id}] Warning: FFMPEG returned {proc.returncode} but audio was decoded. Proceeding.")
+            else:
+                raise MediaStreamError(f"FFMPEG Failed: {bytes(stderr_tail).decode(errors='replace')}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+async def decode_audio_async(data: bytes, session_id: str = "") -> bytes:
+    """
+    Decodes a small in-memory clip (webm/opus, mp3, ...) to PCM with an
+    asyncio subprocess: no temp files and no blocking of the event loop.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *_pcm_command(),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        pcm, stderr = await proc.communicate(data)
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        print(f"[{session_id}] FFmpeg error: {stderr.decode(errors='replace')[-500:]}")
+        # Try to continue anyway, partial clips usually still decode
+    return pcm
@@ -0,0 +1,198 @@
+"""
+Media Mirror
+Local copies of media that providers host on expiring CDN URLs (D-ID
+result videos). Each file is downloaded once, named by its content key,
+and served from our API (routers/media.py) with Range / ETag and a long
+cache lifetime, so playback no longer depends on the provider URL.
+MirroredMedia rows in sessions.db account for size and freshness; the
+least recently served files are evicted past MEDIA_MIRROR_MAX_BYTES.
+"""
+import os
+import hashlib
+import tempfile
+import mimetypes
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+from sqlmodel import Session, select, update, func
+from database import engine
+from models import MirroredMedia, AvatarVideo
+from services.providers import get_providers
+
+# Config
+MEDIA_MIRROR_DIR = Path(os.getenv(
+    "MEDIA_MIRROR_DIR",
+    str(Path(__file__).resolve().parent.parent / "media_mirror")
+))
+MAX_BYTES = int(os.getenv("MEDIA_MIRROR_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+MAX_FILE_BYTES = int(os.getenv("MEDIA_MIRROR_MAX_FILE_BYTES", str(200 * 1024 * 1024)))
+DOWNLOAD_TIMEOUT = float(os.getenv("MEDIA_MIRROR_TIMEOUT", "60"))
+CHUNK_SIZE = 256 * 1024
+ACCESS_RESOLUTION = timedelta(minutes=1) # coarser LRU clock, fewer writes
+
+def media_key(kind: str, key: str) -> str:
+    return f"{kind}/{key}"
+
+def mirror_path(filename: str) -> Path:
+    return MEDIA_MIRROR_DIR / filename
+
+def is_mirrored(kind: str, key: str) -> bool:
+    with Session(engine) as db:
+        row = db.get(MirroredMedia, media_key(kind, key))
+        return bool(row and row.status == "ready")
+
+def _save(row_key: str, **fields):
+    with Session(engine) as db:
+        row = db.get(MirroredMedia, row_key) or MirroredMedia(media_key=row_key, kind=row_key.split("/")[0])
+        for name, value in fields.items():
+            setattr(row, name, value)
+        db.add(row)
+        db.commit()
+
+def _download(url: str, path: Path) -> Tuple[int, str]:
+    """Streams url to path atomically; (size, sha256)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with get_providers().http.stream("GET", url, timeout=DOWNLOAD_TIMEOUT, follow_redirects=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_FILE_BYTES:
+                        raise ValueError(f"Larger than {MAX_FILE_BYTES} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return size, digest.hexdigest()
+
+def mirror(kind: str, key: str, source_url: str, content_type: str = "video/mp4",
+           source_expires_at: datetime = None) -> Optional[Path]:
+    """Downloads source_url into the mirror unless it is already there. Local path, or None on failure."""
+    row_key = media_key(kind, key)
+    with Session(engine) as db:
+        row = db.get(MirroredMedia, row_key)
+        if row and row.status == "ready" and row.filename and mirror_path(row.filename).exists():
+            return mirror_path(row.filename)
+
+    filename = f"{kind}/{key}{mimetypes.guess_extension(content_type) or ''}"
+    try:
+        size, sha256 = _download(source_url, mirror_path(filename))
+    except Exception as e:
+        print(f"Mirror failed for {row_key}: {e}")
+        _save(row_key, status="failed", source_url=source_url, source_expires_at=source_expires_at,
+              last_error=str(e)[-4000:])
+        return None
+
+    now = datetime.utcnow()
+    _save(row_key, status="ready", source_url=source_url, source_expires_at=source_expires_at,
+          filename=filename, content_type=content_type, size=size, sha256=sha256,
+          last_error=None, mirrored_at=now, last_access_at=now)
+    print(f"Mirrored {row_key} ({size} bytes)")
+    evict()
+    return mirror_path(filename)
+
+def local_file(kind: str, key: str) -> Optional[Tuple[Path, MirroredMedia]]:
+    """
+    (path, row) for a mirrored file. A copy missing on this host (another
+    worker machine mirrored it) is fetched again while the source URL lives.
+    """
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        row = db.get(MirroredMedia, media_key(kind, key))
+        if not row or row.status != "ready":
+            return None
+        if not row.last_access_at or row.last_access_at < now - ACCESS_RESOLUTION:
+            db.exec(update(MirroredMedia).where(MirroredMedia.media_key == row.media_key).values(last_access_at=now))
+            db.commit()
+            db.refresh(row)
+        db.expunge(row)
+
+    path = mirror_path(row.filename)
+    if path.exists():
+        return path, row
+    if row.source_url and (row.source_expires_at is None or row.source_expires_at > now):
+        path = mirror(kind, key, row.source_url, row.content_type, row.source_expires_at)
+        if path:
+            with Session(engine) as db:
+                return path, db.get(MirroredMedia, media_key(kind, key))
+    return None
+
+def evict() -> int:
+    """Removes least recently served files until 10% under MAX_BYTES."""
+    with Session(engine) as db:
+        total = db.exec(select(func.coalesce(func.sum(MirroredMedia.size), 0)).where(MirroredMedia.status == "ready")).one()
+        if total <= MAX_BYTES:
+            return 0
+        target = MAX_BYTES * 0.9
+        evicted = 0
+        rows = db.exec(
+            select(MirroredMedia)
+            .where(MirroredMedia.status == "ready")
+            .order_by(MirroredMedia.last_access_at)
+        ).all()
+        for row in rows:
+            if total <= target:
+                break
+            try:
+                mirror_path(row.filename).unlink()
+            except OSError:
+                pass
+            row.status = "evicted"
+            db.add(row)
+            total -= row.size
+            evicted += 1
+        db.commit()
+    print(f"Media mirror: evicted {evicted} files")
+    return evicted
+
+def mirror_ready_avatars() -> int:
+    """Mirrors every ready avatar video that has no local copy yet (backfill)."""
+    from services.avatar_cache import url_expiry
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        mirrored = set(db.exec(select(MirroredMedia.media_key).where(MirroredMedia.status == "ready")).all())
+        pending = [
+            (row.cache_key, row.video_url)
+            for row in db.exec(select(AvatarVideo).where(AvatarVideo.status == "ready")).all()
+            if row.video_url and media_key("avatar", row.cache_key) not in mirrored
+            and (row.url_expires_at is None or row.url_expires_at > now)
+        ]
+    count = 0
+    for cache_key, url in pending:
+        if mirror("avatar", cache_key, url, "video/mp4", url_expiry(url)):
+            count += 1
+    return count
+
+def stats() -> dict:
+    """Size and freshness of the mirror, per kind."""
+    now = datetime.utcnow()
+    kinds = {}
+    with Session(engine) as db:
+        for row in db.exec(select(MirroredMedia)).all():
+            entry = kinds.setdefault(row.kind, {
+                "ready": 0, "failed": 0, "evicted": 0, "bytes": 0,
+                "source_expired": 0, "source_expiring_24h": 0, "oldest_mirrored_at": None,
+            })
+            entry[row.status] = entry.get(row.status, 0) + 1
+            if row.status != "ready":
+                continue
+            entry["bytes"] += row.size
+            if row.source_expires_at and row.source_expires_at <= now:
+                entry["source_expired"] += 1 # only our copy is left
+            elif row.source_expires_at and row.source_expires_at <= now + timedelta(hours=24):
+                entry["source_expiring_24h"] += 1
+            if row.mirrored_at and (entry["oldest_mirrored_at"] is None or row.mirrored_at.isoformat() < entry["oldest_mirrored_at"]):
+                entry["oldest_mirrored_at"] = row.mirrored_at.isoformat()
+    return {
+        "dir": str(MEDIA_MIRROR_DIR),
+        "max_bytes": MAX_BYTES,
+        "bytes": sum(entry["bytes"] for entry in kinds.values()),
+        "kinds": kinds,
+    }
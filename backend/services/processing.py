@@ -1,22 +1,25 @@
 import os
-import tempfile
 import json
 import time
+import asyncio
 from models import Interview
-from services.blob_storage import BlobServiceClient
-import speech_recognition as sr
-from moviepy import VideoFileClip
-from openai import AzureOpenAI
+from services.providers import get_providers
+from services.transcription import transcribe_chunks, join_segments, STT_LANGUAGE
+from services.media import FRAME_BYTES
+from services.decoder import stream_pcm
+from services.vad import vad_chunks
+from services import checkpoints
+from services.answer_transcripts import plan_answer_transcripts, format_transcript, overlap
+from services.tts import QUESTIONS
+from services import scoring_service
+from services.llm import chat_json
 from dotenv import load_dotenv
 from pathlib import Path
-import subprocess
-import imageio_ffmpeg
 
 env_path = Path(__file__).resolve().parent.parent.parent / '.env' # services -> backend -> root
 load_dotenv(dotenv_path=env_path)
 
 # Config (Lazy load or load after dotenv)
-AZURE_CONN_STR = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 CONTAINER_NAME = os.getenv("AZURE_BLOB_CONTAINER", "interviews")
 
 AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "").split("/openai")[0] # Strip suffix
@@ -24,123 +27,12 @@ AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "nflinterviewOpenAI")
 AOAI_VERSION = "2024-02-15-preview" # Fallback to standard version
 
-def process_interview_background(session_id: str, db_session):
-    print(f"[{session_id}] Processing Started (Real Flow)...")
-    
-    interview = db_session.get(Interview, session_id)
-    if not interview or not interview.video_url:
-        print("Interview not found or no video.")
-        return
-
-    # Update Status
-    interview.status = "processing"
-    db_session.add(interview)
-    db_session.commit()
-
-    temp_video_path = None
-    temp_audio_path = None
-
-    try:
-        # 1. Download Video from Azure Blob
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONN_STR)
-        blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=f"{session_id}/full_interview.webm")
-        
-        fd, temp_video_path = tempfile.mkstemp(suffix=".webm")
-        os.close(fd)
-        
-        with open(temp_video_path, "wb") as my_blob:
-            download_stream = blob_client.download_blob()
-            data = download_stream.readall()
-            my_blob.write(data)
-            
-        file_size = os.path.getsize(temp_video_path)
-        print(f"[{session_id}] Video downloaded: {temp_video_path} ({file_size} bytes)")
-        
-        if file_size < 1000:
-            raise ValueError(f"Downloaded video is too small ({file_size} bytes). Upload likely failed.")
-
-        # 2. Extract Audio (Direct FFMPEG for robustness)
-        temp_audio_path = temp_video_path.replace(".webm", ".wav")
-        try:
-            ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-            print(f"[{session_id}] Using FFMPEG at: {ffmpeg_exe}")
-            
-            # -y (overwrite), -i (input), -vn (no video), -acodec pcm_s16le (wav), -ar 16000 (16khz for STT)
-            command = [
-                ffmpeg_exe, "-y", 
-                "-i", temp_video_path,
-                "-vn", 
-                "-acodec", "pcm_s16le", 
-                "-ar", "16000", 
-                "-ac", "1", 
-                temp_audio_path
-            ]
-            
-            # Run, capturing output (or ignoring stderr if we want to be blind, but capturing is better for log)
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=False) # text=False for bytes
-            
-            if result.returncode != 0:
-                print(f"FFMPEG Error details: {result.stderr}")
-                # Analyze stderr? Even if "premature", it might have created the file.
-                if os.path.exists(temp_audio_path) and os.path.getsize(temp_audio_path) > 1000:
-                    print(f"[{session_id}] Warning: FFMPEG returned error but file exists. Proceeding.")
-                else:
-                    raise Exception(f"FFMPEG Failed: {result.stderr}")
-            else:
-                print(f"[{session_id}] Audio extracted to {temp_audio_path}")
-            
-        except Exception as e:
-            print(f"[{session_id}] Audio Extraction Error: {e}")
-            raise e
-
-        # 3. Transcribe (Chunked Google Web Speech for Long Audio)
-        recognizer = sr.Recognizer()
-        full_transcript_parts = []
-        
-        try:
-            with sr.AudioFile(temp_audio_path) as source:
-                # Log duration if possible (approximate from file size or just proceed)
-                print(f"[{session_id}] Audio File Ready. Starting chunked transcription...")
-                
-                chunk_duration = 30 # seconds
-                while True:
-                    audio_data = recognizer.record(source, duration=chunk_duration)
-                    if not audio_data.frame_data:
-                        break
-                        
-                    try:
-                        # Recognizing chunk... Use 'en-PK' for accent support (fallback to en-IN/en-US if needed)
-                        # NOTE: "en-PK" or "en-IN" often handles South Asian accents much better than default.
-                        text = recognizer.recognize_google(audio_data, language="en-PK")
-                        print(f"[{session_id}] Chunk: {text[:20]}...")
-                        full_transcript_parts.append(text)
-                    except sr.UnknownValueError:
-                        # Silence or unintelligible
-                        full_transcript_parts.append("[...]") 
-                    except sr.RequestError as e:
-                        print(f"[{session_id}] STT Chunk Error: {e}")
-                        
-            full_transcript = " ".join(full_transcript_parts)
-            print(f"[{session_id}] Full Transcript Length: {len(full_transcript)}")
-            
-        except Exception as e:
-             print(f"[{session_id}] Transcription Failed: {e}")
-             full_transcript = "(Transcription Failed)"
+# Bump when the chunking/transcription or scoring logic changes, so
+# checkpoints produced by the old logic are not reused
+TRANSCRIPT_STAGE_VERSION = "vad-v1"
+SCORING_PROMPT_VERSION = "monolithic-v1"
 
-        interview.transcript_text = full_transcript
-        
-        # 4. Score with Azure OpenAI
-        if not full_transcript or len(full_transcript) < 5:
-             # Skip scoring data if empty
-             pass
-        else:
-             client = AzureOpenAI(
-                 azure_endpoint=AOAI_ENDPOINT,
-                 api_key=AOAI_KEY,
-                 api_version=AOAI_VERSION
-             )
-             
-             system_prompt = """
+SCORING_SYSTEM_PROMPT = """
              You are an expert HR Interviewer. Analyze the following interview transcript.
              The interview consisted of 3 questions:
              1. Sales experience.
@@ -164,19 +56,213 @@ def process_interview_background(session_id: str, db_session):
              }
              Do not include markdown formatting. Just the JSON.
              """
-             
-             response = client.chat.completions.create(
-                 model=AOAI_DEPLOYMENT,
-                 messages=[
-                     {"role": "system", "content": system_prompt},
-                     {"role": "user", "content": f"Transcript:\n{full_transcript}"}
-                 ],
-                 response_format={ "type": "json_object" }
-             )
-             
-             result_json_str = response.choices[0].message.content
-             scores = json.loads(result_json_str)
-             interview.scores = scores
+
+def _audio_frames(session_id: str, blob_client, etag: str, db_session):
+    """
+    Stage 1: 16 kHz mono PCM frames. Reuses the stored PCM for this blob
+    version if present; otherwise streams blob -> decoder and stores it on the way.
+    """
+    digest = checkpoints.lookup(db_session, "audio", etag)
+    if digest:
+        print(f"[{session_id}] Audio checkpoint hit ({digest[:12]}), skipping download")
+        yield from checkpoints.iter_artifact(digest, FRAME_BYTES)
+        return
+
+    writer = checkpoints.ArtifactWriter()
+    try:
+        for frame in stream_pcm(blob_client, session_id=session_id):
+            writer.write(frame)
+            yield frame
+    except BaseException:
+        writer.discard()
+        raise
+    digest = writer.commit()
+    checkpoints.record(db_session, "audio", etag, digest, session_id)
+
+def _transcribe_stage(session_id: str, blob_client, etag: str, db_session, windows: list = None) -> dict:
+    """
+    Stages 2+3: per-chunk transcripts (cached by chunk audio hash) and the
+    full transcript (cached by the audio checkpoint it was built from).
+    With `windows`, only speech overlapping those time ranges is transcribed.
+    """
+    windows_key = json.dumps(windows, sort_keys=True)
+    audio_digest = checkpoints.lookup(db_session, "audio", etag)
+    if audio_digest:
+        transcript_key = checkpoints.hash_key(audio_digest, TRANSCRIPT_STAGE_VERSION, windows_key)
+        digest = checkpoints.lookup(db_session, "transcript", transcript_key)
+        if digest:
+            print(f"[{session_id}] Transcript checkpoint hit ({digest[:12]})")
+            return checkpoints.get_json(digest)
+
+    def cached_chunk(audio_sha: str):
+        digest = checkpoints.lookup(db_session, "stt", checkpoints.hash_key(audio_sha, STT_LANGUAGE))
+        return checkpoints.get_json(digest) if digest else None
+
+    # VAD chunks cut at pauses, silence dropped, parallel STT in order
+    print(f"[{session_id}] Starting streaming chunked transcription...")
+    frames = _audio_frames(session_id, blob_client, etag, db_session)
+    chunks = vad_chunks(frames)
+    if windows:
+        chunks = (c for c in chunks if any(overlap(c[0], c[1], w) > 0 for w in windows))
+    segments = transcribe_chunks(chunks, session_id, cached=cached_chunk)
+
+    for seg in segments:
+        if seg["status"] != "error" and not seg.get("cached"):
+            digest = checkpoints.put_json({k: seg[k] for k in ("status", "text", "audio_sha")})
+            checkpoints.record(db_session, "stt", checkpoints.hash_key(seg["audio_sha"], STT_LANGUAGE), digest, session_id)
+
+    if segments and all(seg["status"] == "error" for seg in segments):
+        # Fails the job; the retry resumes from the stored audio
+        raise Exception(f"All {len(segments)} STT chunks failed")
+
+    result = {"text": join_segments(segments), "segments": segments}
+
+    # Only a complete transcript becomes a checkpoint; failed chunks are redone next run
+    if not any(seg["status"] == "error" for seg in segments):
+        audio_digest = checkpoints.lookup(db_session, "audio", etag)
+        if audio_digest:
+            transcript_key = checkpoints.hash_key(audio_digest, TRANSCRIPT_STAGE_VERSION, windows_key)
+            checkpoints.record(db_session, "transcript", transcript_key, checkpoints.put_json(result), session_id)
+    return result
+
+def _fill_gaps(gaps: list, chunk_segments: list) -> list:
+    """Assigns re-transcribed chunks to the gap (question) they overlap most."""
+    filled = {gap["question_id"]: [] for gap in gaps}
+    for seg in chunk_segments:
+        best = max(gaps, key=lambda gap: overlap(seg["start"], seg["end"], gap))
+        if overlap(seg["start"], seg["end"], best) > 0:
+            filled[best["question_id"]].append(seg)
+
+    return [{
+        "question_id": gap["question_id"],
+        "source": "reprocessed",
+        "text": join_segments(filled[gap["question_id"]]) or "[...]",
+        "start": gap["start"],
+        "end": gap["end"],
+        "chunks": filled[gap["question_id"]],
+    } for gap in gaps]
+
+def _open_video_blob(session_id: str):
+    """Blob client + properties (etag identifies the exact upload)."""
+    blob_client = get_providers().blob.get_blob_client(container=CONTAINER_NAME, blob=f"{session_id}/full_interview.webm")
+    
+    props = blob_client.get_blob_properties()
+    print(f"[{session_id}] Video in blob storage ({props.size} bytes)")
+    
+    if props.size < 1000:
+        raise ValueError(f"Uploaded video is too small ({props.size} bytes). Upload likely failed.")
+    return blob_client, props
+
+def _score_stage(session_id: str, full_transcript: str, db_session) -> dict:
+    """Stage 4: LLM scores, cached by transcript content and prompt version."""
+    scores_key = checkpoints.hash_key(full_transcript, SCORING_PROMPT_VERSION, AOAI_DEPLOYMENT)
+    digest = checkpoints.lookup(db_session, "scores", scores_key)
+    if digest:
+        print(f"[{session_id}] Scores checkpoint hit ({digest[:12]})")
+        return checkpoints.get_json(digest)
+
+    scores = chat_json(
+        [
+            {"role": "system", "content": SCORING_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Transcript:\n{full_transcript}"}
+        ],
+        SCORING_PROMPT_VERSION,
+        deployment=AOAI_DEPLOYMENT
+    )
+    checkpoints.record(db_session, "scores", scores_key, checkpoints.put_json(scores), session_id)
+    return scores
+
+def _score_per_question_stage(session_id: str, segments: list, db_session) -> dict:
+    """
+    Stage 4 (per question): each answer is scored by its own small prompt,
+    concurrently, and checkpointed individually; a retry only re-scores
+    the questions that failed.
+    """
+    per_question = {}
+    pending = {}
+    keys = {}
+    for seg in sorted(segments, key=lambda s: s["question_id"]):
+        key = f"q{seg['question_id']}"
+        question = QUESTIONS[seg["question_id"]]
+        if seg["text"] in ("", "[...]"):
+            # Nothing to judge; no LLM call needed
+            per_question[key] = {"score": 1, "reasoning": "No answer given.", "recommendation": "No"}
+            continue
+
+        keys[key] = checkpoints.hash_key(question, seg["text"], scoring_service.PROMPT_VERSION, scoring_service.DEPLOYMENT_NAME)
+        digest = checkpoints.lookup(db_session, "question_score", keys[key])
+        if digest:
+            per_question[key] = checkpoints.get_json(digest)
+        else:
+            pending[key] = (question, seg["text"])
+
+    if pending:
+        print(f"[{session_id}] Scoring {len(pending)} answers concurrently ({len(per_question)} reused)")
+        results = asyncio.run(scoring_service.score_answers(pending))
+        failed = {k: r for k, r in results.items() if isinstance(r, BaseException)}
+        for key, result in results.items():
+            if key not in failed:
+                per_question[key] = result
+                checkpoints.record(db_session, "question_score", keys[key], checkpoints.put_json(result), session_id)
+        if failed:
+            raise Exception(f"Scoring failed for {sorted(failed)}: {next(iter(failed.values()))}")
+
+    return scoring_service.aggregate_scores(dict(sorted(per_question.items())))
+
+def process_interview_background(session_id: str, db_session):
+    """
+    Full pipeline for one interview. Runs on a job-queue worker with its own
+    DB session; raises on failure so the queue can retry with backoff.
+    Every stage is checkpointed, so a rerun resumes from the first stage
+    whose output is missing or invalid.
+    """
+    print(f"[{session_id}] Processing Started (Real Flow)...")
+    
+    interview = db_session.get(Interview, session_id)
+    if not interview or not interview.video_url:
+        print("Interview not found or no video.")
+        return
+
+    # Update Status
+    interview.status = "processing"
+    db_session.add(interview)
+    db_session.commit()
+
+    try:
+        # 1. Live transcripts from /analyze; only gaps need the recording
+        question_ids = [k for k in QUESTIONS if isinstance(k, int)]
+        plan = plan_answer_transcripts(db_session, session_id, question_ids)
+        
+        if plan["live_records"] and not plan["gaps"]:
+            print(f"[{session_id}] All answers transcribed live; skipping download and STT")
+            segments = list(plan["answers"].values())
+            full_transcript = format_transcript(segments)
+        elif plan["live_records"]:
+            print(f"[{session_id}] Re-transcribing {len(plan['gaps'])} answers: {[g['question_id'] for g in plan['gaps']]}")
+            blob_client, props = _open_video_blob(session_id)
+            retranscribed = _transcribe_stage(session_id, blob_client, props.etag, db_session, windows=plan["gaps"])
+            segments = list(plan["answers"].values()) + _fill_gaps(plan["gaps"], retranscribed["segments"])
+            full_transcript = format_transcript(segments)
+        else:
+            # 2-3. No live data: Stream Audio + Transcribe everything (resumable)
+            blob_client, props = _open_video_blob(session_id)
+            transcript = _transcribe_stage(session_id, blob_client, props.etag, db_session)
+            segments = transcript["segments"]
+            full_transcript = transcript["text"]
+        
+        interview.transcript_segments = segments
+        interview.transcript_text = full_transcript
+        print(f"[{session_id}] Full Transcript Length: {len(full_transcript)}")
+        
+        # 4. Score with Azure OpenAI (per question when boundaries are known)
+        if not full_transcript or len(full_transcript) < 5:
+             # Skip scoring data if empty
+             pass
+        elif segments and all("question_id" in seg for seg in segments):
+             interview.scores = _score_per_question_stage(session_id, segments, db_session)
+             print(f"[{session_id}] Scoring Complete.")
+        else:
+             interview.scores = _score_stage(session_id, full_transcript, db_session)
              print(f"[{session_id}] Scoring Complete.")
 
         interview.status = "completed"
@@ -195,9 +281,5 @@ def process_interview_background(session_id: str, db_session):
         interview.status = "failed"
         db_session.add(interview)
         db_session.commit()
-    finally:
-        # Cleanup
-        if temp_video_path and os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            os.remove(temp_audio_path)
+        # Let the job queue decide whether to retry
+        raise
@@ -0,0 +1,221 @@
+"""
+Provider Registry
+Long-lived, connection-pooled clients for Azure OpenAI, Azure Blob Storage
+and ElevenLabs. Created once in the FastAPI lifespan (main.py), warmed up
+at startup and shared by every service. Scripts that never run the app
+get a registry lazily on first use.
+"""
+import os
+import time
+import asyncio
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from pathlib import Path
+from dotenv import load_dotenv
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient
+from elevenlabs.client import ElevenLabs
+
+# Load Env
+env_path = Path(__file__).resolve().parent.parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Config
+AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "").split("/openai")[0]
+AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AOAI_VERSION = "2024-02-15-preview"
+BLOB_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+BLOB_CONTAINER = os.getenv("AZURE_BLOB_CONTAINER", "interviews")
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+
+HTTP_POOL_SIZE = int(os.getenv("PROVIDER_HTTP_POOL_SIZE", "20")) # connections per client
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("PROVIDER_KEEPALIVE_SECONDS", "120"))
+BLOB_POOL_SIZE = int(os.getenv("BLOB_POOL_SIZE", "16"))
+WARMUP_TIMEOUT = float(os.getenv("PROVIDER_WARMUP_TIMEOUT", "10"))
+
+def openai_configured() -> bool:
+    return bool(AOAI_KEY and AOAI_ENDPOINT)
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+    )
+
+def _httpx_pool_stats(client) -> dict:
+    # httpcore does not expose pool counters publicly; best effort
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    return {
+        "max_connections": HTTP_POOL_SIZE,
+        "open": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+    }
+
+def _requests_pool_stats(session: requests.Session) -> dict:
+    pools = session.get_adapter("https://").poolmanager.pools
+    pools = [pools[key] for key in pools.keys()]
+    return {
+        "max_connections": BLOB_POOL_SIZE,
+        "hosts": len(pools),
+        "opened": sum(p.num_connections for p in pools),
+        "idle": sum(p.pool.qsize() - list(p.pool.queue).count(None) for p in pools if p.pool is not None),
+    }
+
+class ProviderRegistry:
+    """One set of pooled clients per process."""
+
+    def __init__(self):
+        self.created_at = time.time()
+        self.loop = None # event loop the async clients belong to
+        self.warmup = {}
+
+        # Azure OpenAI (sync for worker threads, async for request handlers)
+        self.http = httpx.Client(limits=_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+        self._openai = AzureOpenAI(
+            azure_endpoint=AOAI_ENDPOINT, api_key=AOAI_KEY, api_version=AOAI_VERSION, http_client=self.http
+        ) if openai_configured() else None
+        self.async_http = None
+        self.async_openai = None
+
+        # Blob Storage (azure-core runs on requests; size its pool explicitly)
+        self.blob_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=BLOB_POOL_SIZE)
+        self.blob_session.mount("https://", adapter)
+        self.blob_session.mount("http://", adapter)
+        self._blob = BlobServiceClient.from_connection_string(
+            BLOB_CONNECTION_STRING, transport=RequestsTransport(session=self.blob_session, session_owner=False)
+        ) if BLOB_CONNECTION_STRING else None
+
+        # ElevenLabs (shares the sync httpx pool)
+        self.elevenlabs = ElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=self.http)
+
+    def bind_loop(self):
+        """Creates the async clients on the running (app) event loop."""
+        self.loop = asyncio.get_running_loop()
+        self.async_http = httpx.AsyncClient(limits=_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+        if openai_configured():
+            self.async_openai = AsyncAzureOpenAI(
+                azure_endpoint=AOAI_ENDPOINT, api_key=AOAI_KEY, api_version=AOAI_VERSION, http_client=self.async_http
+            )
+
+    def async_openai_for_running_loop(self):
+        """Shared async client, or None when called from another loop (e.g. asyncio.run in a worker)."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        return self.async_openai if running is self.loop else None
+
+    def async_http_for_running_loop(self):
+        """Shared pooled AsyncClient, or None when called from another loop."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        return self.async_http if running is self.loop else None
+
+    @property
+    def openai(self) -> AzureOpenAI:
+        if self._openai is None:
+            raise Exception("Azure OpenAI Not Configured")
+        return self._openai
+
+    @property
+    def blob(self) -> BlobServiceClient:
+        if self._blob is None:
+            raise ValueError("AZURE_STORAGE_CONNECTION_STRING not set")
+        return self._blob
+
+    def container(self):
+        return self.blob.get_container_client(BLOB_CONTAINER)
+
+    # --- Warmup ---
+
+    def _timed(self, name: str, fn):
+        began = time.monotonic()
+        try:
+            fn()
+            self.warmup[name] = {"ok": True, "ms": int((time.monotonic() - began) * 1000)}
+        except Exception as e:
+            self.warmup[name] = {"ok": False, "ms": int((time.monotonic() - began) * 1000), "error": str(e)[:200]}
+
+    def _warm_blob(self):
+        container = self.container()
+        if not container.exists():
+            container.create_container()
+
+    def _warm_openai(self):
+        self.openai.models.list()
+
+    def _warm_elevenlabs(self):
+        self.http.get("https://api.elevenlabs.io/v1/models", headers={"xi-api-key": ELEVENLABS_API_KEY or ""})
+
+    async def _warm_async_openai(self):
+        began = time.monotonic()
+        try:
+            if self.async_openai is None:
+                raise Exception("Azure OpenAI Not Configured")
+            await self.async_openai.models.list()
+            self.warmup["openai_async"] = {"ok": True, "ms": int((time.monotonic() - began) * 1000)}
+        except Exception as e:
+            self.warmup["openai_async"] = {"ok": False, "ms": int((time.monotonic() - began) * 1000), "error": str(e)[:200]}
+
+    async def warm_up(self):
+        """Opens TLS connections to every provider in parallel. Failures are logged, not fatal."""
+        tasks = [
+            asyncio.to_thread(self._timed, "blob", self._warm_blob),
+            asyncio.to_thread(self._timed, "openai", self._warm_openai),
+            asyncio.to_thread(self._timed, "elevenlabs", self._warm_elevenlabs),
+            self._warm_async_openai(),
+        ]
+        try:
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Provider warmup timed out after {WARMUP_TIMEOUT}s")
+        print(f"Provider warmup: {self.warmup}")
+
+    def stats(self) -> dict:
+        return {
+            "uptime_seconds": int(time.time() - self.created_at),
+            "warmup": self.warmup,
+            "pools": {
+                "http": _httpx_pool_stats(self.http),
+                "http_async": _httpx_pool_stats(self.async_http) if self.async_http else None,
+                "blob": _requests_pool_stats(self.blob_session),
+            },
+        }
+
+    async def aclose(self):
+        if self.async_http is not None:
+            await self.async_http.aclose()
+        self.http.close()
+        self.blob_session.close()
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_providers() -> ProviderRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderRegistry()
+    return _registry
+
+async def start_providers() -> ProviderRegistry:
+    """Lifespan startup: build the registry, bind async clients, warm up."""
+    registry = get_providers()
+    registry.bind_loop()
+    await registry.warm_up()
+    return registry
+
+async def stop_providers():
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
@@ -0,0 +1,100 @@
+"""
+Ranged File Responses
+Serves a local file with ETag / If-None-Match revalidation, Cache-Control
+and single byte-range requests (206 Partial Content), so browsers and
+CDNs can cache it and media elements can seek.
+"""
+import os
+import re
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def file_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    bare = etag.replace("W/", "")
+    return any(tag.strip().replace("W/", "") == bare for tag in header.split(","))
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the
+    header (multi-range, other units, or an invalid range such as last < first;
+    RFC 7233 2.1), ValueError if valid but unsatisfiable.
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+def _iter_file(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def ranged_file_response(request: Request, path: Path, media_type: str, cache_control: str = "no-cache",
+                         etag: str = None, headers: dict = None) -> Response:
+    """200 / 206 / 304 / 416 for `path` depending on the request's conditional and Range headers."""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = etag or file_etag(stat)
+    base = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        **(headers or {}),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=base)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if range_header and (not if_range or _etag_matches(if_range, etag)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**base, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            return StreamingResponse(
+                _iter_file(path, start, length), status_code=206, media_type=media_type,
+                headers={**base, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(length)}
+            )
+
+    return StreamingResponse(
+        _iter_file(path, 0, size), media_type=media_type, headers={**base, "Content-Length": str(size)}
+    )
@@ -1,64 +1,117 @@
 import os
-import json
-from openai import AzureOpenAI
+import asyncio
+from typing import Dict
+from openai import AsyncAzureOpenAI
+from services.llm import chat_json, achat_json
+from services.providers import get_providers
+from dotenv import load_dotenv
+from pathlib import Path
 
-ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+# Load Env
+env_path = Path(__file__).resolve().parent.parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "").split("/openai")[0]
 API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "nflinterviewOpenAI")
 API_VERSION = "2024-02-15-preview" # or 2025-04-01-preview as in User env
 
-client = AzureOpenAI(
-    azure_endpoint=ENDPOINT,
-    api_key=API_KEY,
-    api_version=API_VERSION
-)
+# Bump when the prompt changes (part of the checkpoint key)
+PROMPT_VERSION = "per-question-v1"
 
-def score_answer(question: str, transcript: str) -> dict:
-    system_prompt = """
-    You are an expert sales recruiter for National Foods. 
-    Score the candidate's answer based on the following rubric.
-    Return STRICT JSON only. No markdown formatting.
-    Target JSON format:
-    {
-      "communication_clarity": 1-5,
-      "sales_mindset_ownership": 1-5,
-      "objection_handling": 1-5,
-      "planning_execution": 1-5,
-      "customer_orientation": 1-5,
-      "notes": ["bullet 1","bullet 2"],
-      "recommendation": "Strong Yes|Yes|Maybe|No"
-    }
-    """
-    
+DIMENSIONS = ["communication_clarity", "sales_mindset_ownership", "resilience_learning", "role_motivation"]
+
+SYSTEM_PROMPT = """
+You are an expert sales recruiter for National Foods.
+Score the candidate's answer to ONE interview question.
+Rate each dimension 1-5, or null if this answer gives no evidence for it.
+Return STRICT JSON only. No markdown formatting.
+Target JSON format:
+{
+  "score": 1-5,
+  "reasoning": "one or two sentences",
+  "communication_clarity": 1-5 | null,
+  "sales_mindset_ownership": 1-5 | null,
+  "resilience_learning": 1-5 | null,
+  "role_motivation": 1-5 | null,
+  "recommendation": "Strong Yes|Yes|Maybe|No"
+}
+"""
+
+def _messages(question: str, transcript: str) -> list:
     user_prompt = f"""
     Question: {question}
     Candidate Answer Transcript: "{transcript}"
-    
+
     Evaluate the answer.
     """
-    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _new_async_client() -> AsyncAzureOpenAI:
+    return AsyncAzureOpenAI(azure_endpoint=ENDPOINT, api_key=API_KEY, api_version=API_VERSION)
+
+async def score_answer_async(client: AsyncAzureOpenAI, question: str, transcript: str) -> dict:
+    """Scores a single answer. Raises on failure so callers can retry just this one."""
+    # In Azure, model needs to be the deployment name usually
+    return await achat_json(_messages(question, transcript), PROMPT_VERSION, temperature=0.3,
+                            deployment=DEPLOYMENT_NAME, client=client)
+
+def score_answer(question: str, transcript: str) -> dict:
     try:
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME, # In Azure, model needs to be the deployment name usually
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        
-        content = response.choices[0].message.content
-        return json.loads(content)
+        return chat_json(_messages(question, transcript), PROMPT_VERSION, temperature=0.3, deployment=DEPLOYMENT_NAME)
     except Exception as e:
         print(f"Scoring error: {e}")
-        return {
-            "error": str(e),
-            "communication_clarity": 0,
-            "sales_mindset_ownership": 0,
-            "objection_handling": 0,
-            "planning_execution": 0,
-            "customer_orientation": 0,
-            "notes": ["Error during scoring"],
-            "recommendation": "No"
-        }
+        return {"error": str(e), "score": 0, "reasoning": "Error during scoring", "recommendation": "No"}
+
+async def score_answers(answers: Dict[str, tuple]) -> Dict[str, object]:
+    """
+    Scores {key: (question, transcript)} concurrently with one async client.
+    Values are score dicts, or the exception for answers that failed.
+    """
+    shared = get_providers().async_openai_for_running_loop()
+    client = shared or _new_async_client()
+    try:
+        keys = list(answers)
+        results = await asyncio.gather(
+            *(score_answer_async(client, *answers[k]) for k in keys),
+            return_exceptions=True
+        )
+        return dict(zip(keys, results))
+    finally:
+        if shared is None:
+            await client.close()
+
+def _recommendation(score: float) -> str:
+    if score >= 4.5:
+        return "Strong Yes"
+    if score >= 3.5:
+        return "Yes"
+    if score >= 2.5:
+        return "Maybe"
+    return "No"
+
+def aggregate_scores(per_question: Dict[str, dict]) -> dict:
+    """
+    Merges per-question results into the Interview.scores shape:
+    {"q1": {"score", "reasoning"}, ..., "overall": {dimensions, recommendation, summary}}.
+    Overall dimensions are means over the answers that gave evidence.
+    """
+    scores = {}
+    for key, result in per_question.items():
+        scores[key] = {"score": result.get("score"), "reasoning": result.get("reasoning", "")}
+
+    overall = {}
+    for dim in DIMENSIONS:
+        values = [r[dim] for r in per_question.values() if isinstance(r.get(dim), (int, float))]
+        overall[dim] = round(sum(values) / len(values), 1) if values else None
+
+    question_scores = [r["score"] for r in per_question.values() if isinstance(r.get("score"), (int, float))]
+    mean_score = sum(question_scores) / len(question_scores) if question_scores else 0
+    overall["recommendation"] = _recommendation(mean_score)
+    overall["summary"] = " ".join(f"{k.upper()}: {v['reasoning']}" for k, v in scores.items() if v["reasoning"])
+
+    scores["overall"] = overall
+    return scores
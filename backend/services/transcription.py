@@ -0,0 +1,110 @@
+"""
+Parallel Transcription
+Sends speech chunks (see services/vad.py) to Google Web Speech through
+a bounded thread pool and reassembles the results in their original order.
+"""
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterable, List, Tuple
+import speech_recognition as sr
+
+# Config
+STT_CONCURRENCY = int(os.getenv("STT_CONCURRENCY", "6"))
+STT_CHUNK_TIMEOUT = float(os.getenv("STT_CHUNK_TIMEOUT", "30")) # seconds per request
+STT_CHUNK_RETRIES = int(os.getenv("STT_CHUNK_RETRIES", "2"))
+# "en-PK" handles South Asian accents much better than the default
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en-PK")
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2 # 16-bit PCM
+
+def transcribe_chunk(index: int, pcm: bytes, start: float, end: float, sample_rate: int = SAMPLE_RATE,
+                     sample_width: int = SAMPLE_WIDTH, language: str = STT_LANGUAGE) -> dict:
+    """Transcribes one chunk with timeout and retry. Never raises."""
+    # Recognizer keeps per-request state (timeouts); one per call keeps threads independent
+    recognizer = sr.Recognizer()
+    recognizer.operation_timeout = STT_CHUNK_TIMEOUT
+    audio = sr.AudioData(pcm, sample_rate, sample_width)
+
+    segment = {
+        "index": index,
+        "audio_sha": hashlib.sha256(pcm).hexdigest(),
+        "start": round(start, 2),
+        "end": round(end, 2),
+        "status": "error",
+        "text": "",
+        "attempts": 0,
+    }
+    began = time.monotonic()
+
+    for attempt in range(STT_CHUNK_RETRIES + 1):
+        segment["attempts"] = attempt + 1
+        try:
+            segment["text"] = recognizer.recognize_google(audio, language=language)
+            segment["status"] = "ok"
+            segment.pop("error", None)
+            break
+        except sr.UnknownValueError:
+            # Silence or unintelligible; retrying will not help
+            segment["status"] = "silence"
+            segment.pop("error", None)
+            break
+        except (sr.RequestError, sr.WaitTimeoutError, OSError) as e:
+            segment["error"] = str(e)
+            if attempt < STT_CHUNK_RETRIES:
+                time.sleep(0.5 * (2 ** attempt))
+
+    segment["latency_ms"] = int((time.monotonic() - began) * 1000)
+    return segment
+
+def transcribe_chunks(chunks: Iterable[Tuple[float, float, bytes]], session_id: str = "",
+                      sample_rate: int = SAMPLE_RATE, sample_width: int = SAMPLE_WIDTH,
+                      max_workers: int = STT_CONCURRENCY, cached=None) -> List[dict]:
+    """
+    Submits every (start_s, end_s, pcm) chunk as soon as it is produced and
+    returns one segment dict per chunk, in input order (status: ok | silence | error).
+    `cached(audio_sha)` may return a previously stored segment to skip STT.
+    At most `max_workers` chunks are in flight: decoding is much faster than
+    STT, so the producer waits for a free slot instead of queueing the
+    whole interview's PCM in the executor.
+    """
+    max_workers = max(1, max_workers)
+    slots = threading.BoundedSemaphore(max_workers)
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stt") as executor:
+        for index, (start, end, pcm) in enumerate(chunks):
+            if not pcm:
+                continue
+            audio_sha = hashlib.sha256(pcm).hexdigest()
+            hit = cached(audio_sha) if cached else None
+            if hit:
+                done = Future()
+                done.set_result(dict(hit, index=index, start=round(start, 2), end=round(end, 2), cached=True))
+                futures.append(done)
+                continue
+            slots.acquire()
+            future = executor.submit(transcribe_chunk, index, pcm, start, end, sample_rate, sample_width)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+        segments = [f.result() for f in futures]
+
+    for seg in segments:
+        if seg["status"] == "ok":
+            print(f"[{session_id}] Chunk {seg['index']}: {seg['text'][:20]}...")
+        elif seg["status"] == "error":
+            print(f"[{session_id}] STT Chunk {seg['index']} Error: {seg.get('error')}")
+    return segments
+
+def join_segments(segments: List[dict]) -> str:
+    """Full transcript in order; silent chunks become '[...]', failed chunks are skipped."""
+    parts = []
+    for seg in segments:
+        if seg["status"] == "ok":
+            parts.append(seg["text"])
+        elif seg["status"] == "silence":
+            parts.append("[...]")
+    return " ".join(parts)
@@ -1,10 +1,10 @@
 import os
-from elevenlabs.client import ElevenLabs
+from services.providers import get_providers
 
 API_KEY = os.getenv("ELEVENLABS_API_KEY")
 VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "WoB1yCV3pS7cFlDlu8ZU")
-
-client = ElevenLabs(api_key=API_KEY)
+MODEL_ID = "eleven_turbo_v2_5"
+OUTPUT_FORMAT = "mp3_44100_128"
 
 QUESTIONS = {
     1: "Walk me through your sales experience and the types of products you’ve sold.",
@@ -17,16 +17,22 @@ QUESTIONS = {
 def generate_audio_stream(text: str):
     """Generates audio stream for arbitrary text."""
     if not text: return None
-    return client.text_to_speech.convert(
+    return get_providers().elevenlabs.text_to_speech.convert(
         voice_id=VOICE_ID,
-        output_format="mp3_44100_128",
+        output_format=OUTPUT_FORMAT,
         text=text,
-        model_id="eleven_turbo_v2_5"
+        model_id=MODEL_ID
     )
 
-def get_question_audio_stream(key):
-    """Generates audio for the given key (1, 2, 3, 'intro', 'outro')."""
-    text = QUESTIONS.get(key)
-    if not text:
-        return None
-    return generate_audio_stream(text)
+def stream_audio(text: str):
+    """
+    Streaming endpoint: yields MP3 bytes as the provider generates them,
+    instead of after the whole clip is rendered.
+    """
+    if not text: return None
+    return get_providers().elevenlabs.text_to_speech.stream(
+        voice_id=VOICE_ID,
+        output_format=OUTPUT_FORMAT,
+        text=text,
+        model_id=MODEL_ID
+    )
@@ -0,0 +1,94 @@
+"""
+Streaming multipart parsing.
+Feeds a single file field of a multipart/form-data request into a sink
+as the body arrives, instead of spooling the whole upload first.
+"""
+from fastapi import Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+from multipart.exceptions import MultipartParseError
+
+
+class _FilePartCollector:
+    """MultipartParser callbacks that keep only the bytes of one named field."""
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name.encode()
+        self.found = False
+        self.pending = []
+
+        self._header_field = b""
+        self._header_value = b""
+        self._in_target = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._in_target = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            _, params = parse_options_header(self._header_value)
+            if params.get(b"name") == self.field_name:
+                self._in_target = True
+                self.found = True
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_target:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        self._in_target = False
+
+
+async def stream_multipart_file(request: Request, field_name: str, write) -> bool:
+    """
+    Parses the request body incrementally and passes every chunk of
+    `field_name` to the blocking `write(bytes)` callable (run in a threadpool).
+    Returns False if the field was not present; a malformed body is a 400.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data with a boundary")
+
+    collector = _FilePartCollector(field_name)
+    parser = MultipartParser(boundary, collector.callbacks())
+
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        try:
+            parser.write(chunk)
+        except MultipartParseError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+        if collector.pending:
+            data = b"".join(collector.pending)
+            collector.pending.clear()
+            await run_in_threadpool(write, data)
+
+    try:
+        parser.finalize()
+    except MultipartParseError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+    if collector.pending:
+        await run_in_threadpool(write, b"".join(collector.pending))
+        collector.pending.clear()
+
+    return collector.found
@@ -0,0 +1,171 @@
+"""
+Voice Activity Detection
+Energy-based VAD over 16-bit mono PCM, vectorized with NumPy.
+Used to cut transcription chunks at pauses, drop silence before STT,
+and trim leading/trailing silence from answer clips.
+"""
+import os
+from collections import deque
+from typing import List, Tuple
+import numpy as np
+
+# Config
+FRAME_MS = 30
+SPEECH_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10")) # above the noise floor
+MIN_SPEECH_DBFS = -50.0 # never call anything quieter than this speech
+MAX_THRESHOLD_DBFS = -30.0 # normal speech is louder than this, whatever the floor says
+HANGOVER_MS = 200 # padding kept around speech
+MIN_SPEECH_MS = 90 # shorter bursts are clicks/noise
+MIN_PAUSE_MS = int(os.getenv("VAD_MIN_PAUSE_MS", "400"))
+MIN_CHUNK_SECONDS = float(os.getenv("VAD_MIN_CHUNK_SECONDS", "10"))
+MAX_CHUNK_SECONDS = float(os.getenv("VAD_MAX_CHUNK_SECONDS", "30"))
+NOISE_HISTORY_SECONDS = 60
+
+def frame_energies(pcm: bytes, sample_rate: int = 16000) -> np.ndarray:
+    """RMS level of each complete frame in dBFS."""
+    frame_len = sample_rate * FRAME_MS // 1000
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(rms / 32768.0 + 1e-9)
+
+def _dilate(mask: np.ndarray, n: int) -> np.ndarray:
+    if n <= 0 or not len(mask):
+        return mask
+    return np.convolve(mask.astype(np.int32), np.ones(2 * n + 1, dtype=np.int32), mode="same") > 0
+
+def _erode(mask: np.ndarray, n: int) -> np.ndarray:
+    return ~_dilate(~mask, n)
+
+def speech_mask(energies: np.ndarray, noise_floor: float = None) -> np.ndarray:
+    """Boolean speech flag per frame (clicks removed, hangover applied)."""
+    if not len(energies):
+        return np.zeros(0, dtype=bool)
+    if noise_floor is None:
+        noise_floor = float(np.percentile(energies, 10))
+    threshold = min(max(noise_floor + SPEECH_MARGIN_DB, MIN_SPEECH_DBFS), MAX_THRESHOLD_DBFS)
+
+    mask = energies > threshold
+    # Opening removes short bursts, dilation keeps word onsets/tails
+    k = max(1, MIN_SPEECH_MS // FRAME_MS // 2)
+    mask = _dilate(_erode(mask, k), k)
+    return _dilate(mask, HANGOVER_MS // FRAME_MS)
+
+def speech_regions(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """[(start_frame, end_frame)) runs of speech."""
+    if not len(mask):
+        return []
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def trim_silence(pcm: bytes, sample_rate: int = 16000) -> bytes:
+    """Drops leading and trailing silence; returns b'' if there is no speech."""
+    regions = speech_regions(speech_mask(frame_energies(pcm, sample_rate)))
+    if not regions:
+        return b""
+    frame_bytes = sample_rate * FRAME_MS // 1000 * 2
+    return pcm[regions[0][0] * frame_bytes:regions[-1][1] * frame_bytes]
+
+class VadChunker:
+    """
+    Streaming chunker: feed PCM frames, get (start_s, end_s, pcm) speech chunks.
+    Chunks end at the first pause after MIN_CHUNK_SECONDS, or at the quietest
+    frame near MAX_CHUNK_SECONDS. Silence between speech regions is dropped.
+    """
+
+    def __init__(self, sample_rate: int = 16000, min_chunk_seconds: float = MIN_CHUNK_SECONDS,
+                 max_chunk_seconds: float = MAX_CHUNK_SECONDS):
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * FRAME_MS // 1000 * 2
+        self.frame_seconds = FRAME_MS / 1000
+        self.min_frames = int(min_chunk_seconds / self.frame_seconds)
+        self.max_frames = int(max_chunk_seconds / self.frame_seconds)
+        self.pause_frames = max(1, MIN_PAUSE_MS // FRAME_MS)
+
+        self._buffer = bytearray()
+        self._buffer_start = 0.0
+        self._history = deque(maxlen=int(NOISE_HISTORY_SECONDS / self.frame_seconds))
+        self.stats = {"chunks": 0, "speech_seconds": 0.0, "dropped_seconds": 0.0}
+
+    def feed(self, pcm: bytes) -> List[Tuple[float, float, bytes]]:
+        self._buffer.extend(pcm)
+        chunks = []
+        while True:
+            energies = frame_energies(bytes(self._buffer), self.sample_rate)
+            cut = self._find_cut(energies)
+            if cut is None:
+                break
+            chunks.extend(self._emit(cut, energies))
+        return chunks
+
+    def flush(self) -> List[Tuple[float, float, bytes]]:
+        """Emits whatever is left at end of stream."""
+        if not self._buffer:
+            return []
+        energies = frame_energies(bytes(self._buffer), self.sample_rate)
+        return self._emit(None, energies)
+
+    def _noise_floor(self, energies: np.ndarray) -> float:
+        history = np.fromiter(self._history, dtype=np.float32, count=len(self._history))
+        return float(np.percentile(np.concatenate((history, energies)), 10))
+
+    def _find_cut(self, energies: np.ndarray):
+        n = len(energies)
+        if n < self.min_frames + self.pause_frames:
+            return None
+
+        mask = speech_mask(energies, self._noise_floor(energies))
+        # First pause long enough, starting after the minimum chunk length
+        for start, end in self._silence_runs(mask):
+            if self.min_frames <= start <= self.max_frames and end - start >= self.pause_frames:
+                return start + self.pause_frames // 2
+        if n >= self.max_frames:
+            # No pause: cut at the quietest frame in the last quarter
+            window_start = self.max_frames * 3 // 4
+            return window_start + int(np.argmin(energies[window_start:self.max_frames]))
+        return None
+
+    def _silence_runs(self, mask: np.ndarray):
+        return speech_regions(~mask)
+
+    def _emit(self, cut, energies: np.ndarray) -> List[Tuple[float, float, bytes]]:
+        if cut is None:
+            segment = bytes(self._buffer)
+            cut = len(energies)
+        else:
+            segment = bytes(self._buffer[:cut * self.frame_bytes])
+        seg_energies = energies[:cut]
+        mask = speech_mask(seg_energies, self._noise_floor(seg_energies))
+        regions = speech_regions(mask)
+
+        chunks = []
+        if regions:
+            pcm = b"".join(segment[s * self.frame_bytes:e * self.frame_bytes] for s, e in regions)
+            start = self._buffer_start + regions[0][0] * self.frame_seconds
+            end = self._buffer_start + regions[-1][1] * self.frame_seconds
+            chunks.append((round(start, 2), round(end, 2), pcm))
+            self.stats["chunks"] += 1
+            self.stats["speech_seconds"] += len(pcm) / (self.sample_rate * 2)
+
+        seg_seconds = len(segment) / (self.sample_rate * 2)
+        self.stats["dropped_seconds"] += seg_seconds - sum(len(c[2]) for c in chunks) / (self.sample_rate * 2)
+        self._history.extend(seg_energies.tolist())
+        del self._buffer[:len(segment)]
+        self._buffer_start += seg_seconds
+        return chunks
+
+def vad_chunks(frames, sample_rate: int = 16000, **kwargs):
+    """Generator adapter: PCM frames in, (start_s, end_s, pcm) speech chunks out."""
+    chunker = VadChunker(sample_rate, **kwargs)
+    for frame in frames:
+        for chunk in chunker.feed(frame):
+            yield chunk
+    for chunk in chunker.flush():
+        yield chunk
+    print(f"VAD: {chunker.stats['chunks']} chunks, {chunker.stats['speech_seconds']:.1f}s speech, "
+          f"{chunker.stats['dropped_seconds']:.1f}s silence dropped")
@@ -1,10 +1,12 @@
 import { useRef, useEffect } from 'react';
 import { useFrame } from '@react-three/fiber';
+import { fetchLipSyncEnvelope, sampleLipSync, LipSyncEnvelope } from '@/lib/lipSync';
 
 export function useAudioLipSync({ audioRef }: { audioRef: React.RefObject<HTMLAudioElement> }) {
     const analyserRef = useRef<AnalyserNode | null>(null);
     const dataArrayRef = useRef<Uint8Array | null>(null);
     const volumeRef = useRef(0);
+    const envelopeRef = useRef<LipSyncEnvelope | null>(null);
 
     useEffect(() => {
         if (!audioRef.current) return;
@@ -45,6 +47,27 @@ export function useAudioLipSync({ audioRef }: { audioRef: React.RefObject<HTMLAu
             if (audioContext && audioContext.state === 'suspended') audioContext.resume();
         };
 
+        // Precomputed envelope from the server: no AnalyserNode / FFT at all
+        const envelopeUrl = audio.dataset.lipSync;
+        if (envelopeUrl) {
+            let cancelled = false;
+            fetchLipSyncEnvelope(envelopeUrl).then((envelope) => {
+                if (cancelled) return;
+                if (envelope) {
+                    envelopeRef.current = envelope;
+                    return;
+                }
+                // No envelope: fall back to the analyser
+                audio.addEventListener('play', handlePlay);
+                if (!audio.paused) handlePlay();
+            });
+            return () => {
+                cancelled = true;
+                envelopeRef.current = null;
+                audio.removeEventListener('play', handlePlay);
+            };
+        }
+
         audio.addEventListener('play', handlePlay);
 
         return () => {
@@ -55,7 +78,12 @@ export function useAudioLipSync({ audioRef }: { audioRef: React.RefObject<HTMLAu
     }, [audioRef]);
 
     useFrame(() => {
-        if (analyserRef.current && dataArrayRef.current) {
+        const audio = audioRef.current;
+        if (envelopeRef.current && audio) {
+            const frame = sampleLipSync(envelopeRef.current, audio.currentTime);
+            const target = frame && !audio.paused ? frame.level : 0;
+            volumeRef.current += (target - volumeRef.current) * 0.2; // Lerp
+        } else if (analyserRef.current && dataArrayRef.current) {
             // @ts-ignore
             analyserRef.current.getByteFrequencyData(dataArrayRef.current);
             const sum = dataArrayRef.current.reduce((a, b) => a + b, 0);
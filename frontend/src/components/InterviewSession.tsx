@@ -10,6 +10,7 @@ import dynamic from 'next/dynamic';
 const TalkingAvatar = dynamic(() => import('./TalkingAvatar'), { ssr: false });
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8002/api';
+const WS_URL = API_URL.replace(/^http/, 'ws');
 
 const QUESTIONS = [
     { id: 1, text: "Walk me through your sales experience and the types of products you've sold." },
@@ -22,8 +23,13 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
     const videoRef = useRef<HTMLVideoElement>(null);
     const mediaRecorderRef = useRef<MediaRecorder | null>(null);
     const audioRecorderRef = useRef<MediaRecorder | null>(null); // Separate audio-only recorder
-    const chunksRef = useRef<Blob[]>([]); // Full video interview
+    const chunkSeqRef = useRef(0); // Next sequence number for streamed video chunks
+    const failedChunksRef = useRef<Map<number, Blob>>(new Map()); // Only chunks the server has not acknowledged
+    const pendingChunksRef = useRef<Set<Promise<void>>>(new Set());
     const audioChunksRef = useRef<Blob[]>([]); // Audio-only for analysis
+    const audioStreamRef = useRef<MediaStream | null>(null);
+    const liveSocketRef = useRef<WebSocket | null>(null); // Streams the current answer to /ws/analyze
+    const liveFailedRef = useRef(false);
 
     // --- State ---
     const [phase, setPhase] = useState<'init' | 'intro' | 'question' | 'analysing' | 'outro' | 'uploading' | 'upload-error'>('init');
@@ -44,6 +50,8 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
     const qIndexRef = useRef(0);
     const currentAttemptRef = useRef(0);
     const isAnalyzingRef = useRef(false);
+    const recordingStartRef = useRef(0); // performance.now() when the video recorder started
+    const answerStartRef = useRef(0); // performance.now() when the current answer capture started
 
     // Debug helper
     const log = (msg: string) => {
@@ -119,41 +127,127 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
     };
 
     const initRecorders = (stream: MediaStream) => {
-        // Video recorder (full interview)
+        // Video recorder (full interview), streamed to the server chunk by chunk
         const videoRec = new MediaRecorder(stream, { mimeType: 'video/webm' });
         videoRec.ondataavailable = (e) => {
-            if (e.data.size > 0) chunksRef.current.push(e.data);
+            if (e.data.size > 0) queueChunkUpload(chunkSeqRef.current++, e.data);
         };
         videoRec.start(1000);
+        recordingStartRef.current = performance.now();
         mediaRecorderRef.current = videoRec;
 
-        // Audio-only recorder for analysis (cleaner data)
+        // Audio-only stream for analysis (cleaner data); one recorder per answer, see startAudioCapture
         const audioTrack = stream.getAudioTracks()[0];
-        const audioStream = new MediaStream([audioTrack]);
-        const audioRec = new MediaRecorder(audioStream, { mimeType: 'audio/webm' });
-        audioRec.ondataavailable = (e) => {
-            if (e.data.size > 0) audioChunksRef.current.push(e.data);
-        };
-        audioRec.start(500);
-        audioRecorderRef.current = audioRec;
+        audioStreamRef.current = new MediaStream([audioTrack]);
+    };
+
+    // --- Chunk Upload ---
+    const uploadChunk = async (seq: number, chunk: Blob, retries = 3) => {
+        for (let i = 0; i <= retries; i++) {
+            try {
+                await api.put(`/interview/${sessionId}/chunks/${seq}`, chunk, {
+                    headers: { 'Content-Type': 'application/octet-stream' }
+                });
+                return;
+            } catch (e) {
+                if (i === retries) throw e;
+                await new Promise(r => setTimeout(r, 500 * 2 ** i));
+            }
+        }
+    };
+
+    const queueChunkUpload = (seq: number, chunk: Blob) => {
+        const p = uploadChunk(seq, chunk)
+            .then(() => { failedChunksRef.current.delete(seq); })
+            .catch(() => {
+                // Keep it for a final retry in finishInterview
+                failedChunksRef.current.set(seq, chunk);
+                log(`Chunk ${seq} upload failed`);
+            })
+            .finally(() => { pendingChunksRef.current.delete(p); });
+        pendingChunksRef.current.add(p);
     };
 
+    const stopRecorder = (rec: MediaRecorder | null) => new Promise<void>(resolve => {
+        if (!rec || rec.state !== 'recording') return resolve();
+        // The final ondataavailable fires before onstop
+        rec.addEventListener('stop', () => resolve(), { once: true });
+        rec.stop();
+    });
+
     // Start fresh audio capture for this answer
     const startAudioCapture = () => {
         audioChunksRef.current = [];
+        answerStartRef.current = performance.now();
+        if (!audioStreamRef.current) return;
+
+        // New recorder per answer so the clip starts with a webm header
+        const prev = audioRecorderRef.current;
+        if (prev && prev.state === 'recording') { prev.ondataavailable = null; prev.stop(); }
+        const audioRec = new MediaRecorder(audioStreamRef.current, { mimeType: 'audio/webm' });
+        audioRec.ondataavailable = (e) => {
+            if (e.data.size === 0) return;
+            audioChunksRef.current.push(e.data); // Kept for the HTTP fallback
+            const ws = liveSocketRef.current;
+            if (ws && ws.readyState === WebSocket.OPEN) ws.send(e.data);
+        };
+        openLiveAnalysis();
+        audioRec.start(250);
+        audioRecorderRef.current = audioRec;
         log("Audio capture started");
     };
 
+    // --- Live Analysis (WebSocket; HTTP /analyze is the fallback) ---
+    const openLiveAnalysis = () => {
+        liveSocketRef.current?.close();
+        liveSocketRef.current = null;
+        liveFailedRef.current = false;
+        try {
+            const ws = new WebSocket(`${WS_URL}/interview/ws/analyze`);
+            ws.onopen = () => {
+                ws.send(JSON.stringify({
+                    type: 'start',
+                    session_id: sessionId,
+                    question_id: QUESTIONS[qIndexRef.current].id,
+                    question_text: QUESTIONS[qIndexRef.current].text,
+                    attempt: currentAttemptRef.current,
+                    clip_start_ms: Math.round(answerStartRef.current - recordingStartRef.current),
+                }));
+                // Catch up on chunks recorded while connecting
+                audioChunksRef.current.forEach(chunk => ws.send(chunk));
+            };
+            // Ignore events from a socket that has already been replaced
+            ws.onerror = () => { if (liveSocketRef.current === ws) liveFailedRef.current = true; };
+            ws.onclose = () => { if (liveSocketRef.current === ws) liveFailedRef.current = true; };
+            liveSocketRef.current = ws;
+        } catch (e) {
+            liveFailedRef.current = true;
+        }
+    };
+
+    const finishLiveAnalysis = (ws: WebSocket, clipEndMs: number, timeoutMs: number) => new Promise<any>((resolve, reject) => {
+        const timeoutId = setTimeout(() => { ws.close(); reject(new Error('Live analysis timeout')); }, timeoutMs);
+        ws.onmessage = (e) => {
+            const msg = JSON.parse(e.data);
+            if (msg.type === 'result') {
+                clearTimeout(timeoutId);
+                resolve(msg);
+            }
+        };
+        ws.onclose = () => { clearTimeout(timeoutId); reject(new Error('Live analysis closed')); };
+        // The server spends at most this budget and answers with its best decision so far
+        ws.send(JSON.stringify({ type: 'end', clip_end_ms: clipEndMs, budget_ms: Math.round(timeoutMs) }));
+    });
+
     // --- Smart Logic ---
     const triggerAnalysis = async () => {
         if (isAnalyzingRef.current || subStateRef.current !== 'listening') return;
         isAnalyzingRef.current = true;
 
-        // Flush audio recorder
-        audioRecorderRef.current?.requestData();
-
-        // Small delay to ensure data is flushed
-        await new Promise(r => setTimeout(r, 100));
+        // Stop this answer's recorder; the final chunk is delivered (and streamed) before onstop
+        await stopRecorder(audioRecorderRef.current);
+        const deadline = performance.now() + 8000;
+        const clipEndMs = Math.round(performance.now() - recordingStartRef.current);
 
         setSubState('processing');
         setPhase('analysing');
@@ -161,28 +255,56 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
         const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' });
         log(`Audio blob size: ${audioBlob.size} bytes`);
 
+        const ws = liveSocketRef.current;
+        liveSocketRef.current = null;
+
         if (audioBlob.size < 500) {
             log("Empty audio -> Nudging");
+            ws?.close();
             isAnalyzingRef.current = false;
             handleAction('nudge');
             return;
         }
 
+        // Fast path: the server has been transcribing while the candidate spoke
+        if (ws && ws.readyState === WebSocket.OPEN && !liveFailedRef.current) {
+            try {
+                const result = await finishLiveAnalysis(ws, clipEndMs, deadline - performance.now());
+                const action = result.action || 'next';
+                log(`Analysis: "${result.transcript || ''}" -> ${action} (live, ${result.decided_by})`);
+                ws.close();
+                isAnalyzingRef.current = false;
+                handleAction(action);
+                return;
+            } catch (e: any) {
+                log(`Live analysis failed: ${e.message} -> HTTP`);
+            }
+        } else {
+            ws?.close();
+        }
+
         const formData = new FormData();
         formData.append('file', audioBlob, 'answer.webm');
         formData.append('question_text', QUESTIONS[qIndexRef.current].text);
         formData.append('attempt', currentAttemptRef.current.toString());
+        // Lets the backend reuse this transcript instead of re-transcribing the full video
+        formData.append('session_id', sessionId);
+        formData.append('question_id', QUESTIONS[qIndexRef.current].id.toString());
+        formData.append('clip_start_ms', Math.round(answerStartRef.current - recordingStartRef.current).toString());
+        formData.append('clip_end_ms', clipEndMs.toString());
 
         try {
+            const budgetMs = Math.max(deadline - performance.now(), 1000);
+            formData.append('budget_ms', Math.round(budgetMs).toString());
             const controller = new AbortController();
-            const timeoutId = setTimeout(() => controller.abort(), 8000);
+            const timeoutId = setTimeout(() => controller.abort(), budgetMs);
 
             const res = await api.post('/interview/analyze', formData, { signal: controller.signal });
             clearTimeout(timeoutId);
 
             const action = res.data.action || 'next';
             const transcript = res.data.transcript || '';
-            log(`Analysis: "${transcript}" -> ${action}`);
+            log(`Analysis: "${transcript}" -> ${action} (${res.data.decided_by})`);
 
             handleAction(action);
 
@@ -220,18 +342,12 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
         log(`Playing ${action}: "${text.substring(0, 30)}..."`);
 
         try {
-            const response = await fetch(`${API_URL}/interview/synthesize`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text })
-            });
-
-            if (!response.ok) throw new Error("TTS Error");
-
-            const blob = await response.blob();
-            const url = URL.createObjectURL(blob);
-            const audio = new Audio(url);
+            // Streamed: playback starts while the clip is still being generated
+            const audio = new Audio();
             audio.crossOrigin = "anonymous"; // Required for Web Audio API
+            audio.src = `${API_URL}/interview/synthesize/stream?text=${encodeURIComponent(text)}`;
+            // Precomputed mouth animation (ready once the clip finishes rendering)
+            audio.dataset.lipSync = `${API_URL}/interview/synthesize/envelope?text=${encodeURIComponent(text)}`;
 
             // Set both refs for lip sync
             ttsAudioRef.current = audio;
@@ -285,6 +401,7 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
         if (ttsAudioRef.current) { ttsAudioRef.current.pause(); ttsAudioRef.current.onended = null; }
         const audio = new Audio(`${API_URL}/interview/audio/${key}`);
         audio.crossOrigin = "anonymous"; // Required for Web Audio API analysis
+        audio.dataset.lipSync = `${API_URL}/interview/audio/${key}/envelope`;
         ttsAudioRef.current = audio;
         audioRef.current = audio; // For compatibility
 
@@ -341,18 +458,24 @@ export default function InterviewSession({ sessionId }: { sessionId: string }) {
     };
 
     const finishInterview = async () => {
-        if (mediaRecorderRef.current?.state === 'recording') mediaRecorderRef.current.stop();
         if (audioRecorderRef.current?.state === 'recording') audioRecorderRef.current.stop();
+        liveSocketRef.current?.close();
         setPhase('uploading');
-
-        const blob = new Blob(chunksRef.current, { type: 'video/webm' });
-        const formData = new FormData();
-        formData.append('file', blob);
+        await stopRecorder(mediaRecorderRef.current);
 
         try {
-            await api.post(`/interview/${sessionId}/complete`, formData, {
-                onUploadProgress: (ev) => setUploadProgress(Math.round((ev.loaded * 100) / (ev.total || blob.size)))
-            });
+            // Most chunks are already stored; wait for in-flight ones and retry failures
+            await Promise.all(Array.from(pendingChunksRef.current));
+            const total = chunkSeqRef.current;
+            for (const [seq, chunk] of Array.from(failedChunksRef.current.entries())) {
+                await uploadChunk(seq, chunk);
+                failedChunksRef.current.delete(seq);
+                setUploadProgress(Math.round(((total - failedChunksRef.current.size) * 100) / Math.max(total, 1)));
+            }
+
+            // Server only commits the block list and queues processing
+            await api.post(`/interview/${sessionId}/complete`, { chunks: total });
+            setUploadProgress(100);
             router.push(`/recruiter/${sessionId}`);
         } catch (e) {
             setPhase('upload-error');
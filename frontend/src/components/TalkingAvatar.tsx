@@ -4,6 +4,7 @@ import React, { useRef, useEffect, Suspense } from 'react';
 import { Canvas, useFrame } from '@react-three/fiber';
 import { OrbitControls, useGLTF } from '@react-three/drei';
 import * as THREE from 'three';
+import { fetchLipSyncEnvelope, sampleLipSync, LipSyncEnvelope } from '@/lib/lipSync';
 
 interface AvatarProps {
     audioRef: React.RefObject<HTMLAudioElement | null>;
@@ -17,6 +18,8 @@ function Avatar({ audioRef, isSpeaking }: AvatarProps) {
     const analyserRef = useRef<AnalyserNode | null>(null);
     const audioContextRef = useRef<AudioContext | null>(null);
     const lastAudioRef = useRef<HTMLAudioElement | null>(null);
+    const envelopeRef = useRef<LipSyncEnvelope | null>(null);
+    const envelopePendingRef = useRef(false);
 
     // Smooth animation values
     const currentMouthOpen = useRef(0);
@@ -36,19 +39,9 @@ function Avatar({ audioRef, isSpeaking }: AvatarProps) {
         });
     }, [scene]);
 
-    // Setup audio analysis - reconnect when audio element changes
-    useEffect(() => {
-        const audio = audioRef.current;
-        if (!audio || !isSpeaking) return;
-
-        // Check if this is a different audio element
-        if (audio === lastAudioRef.current && analyserRef.current) {
-            return; // Same audio, already connected
-        }
-
+    // Fallback: real-time FFT of the playing audio
+    const connectAnalyser = (audio: HTMLAudioElement) => {
         console.log('Connecting audio for lip sync...');
-        lastAudioRef.current = audio;
-
         try {
             // Create fresh AudioContext
             if (audioContextRef.current) {
@@ -68,10 +61,37 @@ function Avatar({ audioRef, isSpeaking }: AvatarProps) {
         } catch (e: any) {
             console.log('Audio setup:', e.message);
         }
+    };
+
+    // Prefer the precomputed envelope (audio.dataset.lipSync); reconnect when audio element changes
+    useEffect(() => {
+        const audio = audioRef.current;
+        if (!audio || !isSpeaking) return;
+
+        // Check if this is a different audio element
+        if (audio === lastAudioRef.current) {
+            return; // Same audio, already set up
+        }
+        lastAudioRef.current = audio;
+        envelopeRef.current = null;
+        analyserRef.current = null;
+
+        const envelopeUrl = audio.dataset.lipSync;
+        if (!envelopeUrl) {
+            connectAnalyser(audio);
+            return;
+        }
+        envelopePendingRef.current = true;
+        fetchLipSyncEnvelope(envelopeUrl).then((envelope) => {
+            if (lastAudioRef.current !== audio) return; // a newer clip took over
+            envelopePendingRef.current = false;
+            if (envelope) envelopeRef.current = envelope;
+            else connectAnalyser(audio);
+        });
     }, [audioRef.current, isSpeaking]);
 
     // Lip sync animation with smooth, natural movement
-    useFrame((_, delta) => {
+    useFrame((state, delta) => {
         if (!headRef.current || !headRef.current.morphTargetInfluences) return;
 
         const morphDict = morphTargetDictRef.current;
@@ -81,7 +101,18 @@ function Avatar({ audioRef, isSpeaking }: AvatarProps) {
         let targetMouth = 0;
         let targetAA = 0, targetE = 0, targetO = 0, targetI = 0;
 
-        if (isSpeaking && analyserRef.current) {
+        // mouth 0..1 and band weights, from the envelope or the analyser
+        let voice: { mouth: number, bass: number, mid: number, high: number } | null = null;
+        const audio = lastAudioRef.current;
+
+        if (isSpeaking && envelopeRef.current && audio) {
+            const frame = sampleLipSync(envelopeRef.current, audio.currentTime);
+            if (frame) voice = { mouth: frame.level * 0.7, bass: frame.low, mid: frame.mid, high: frame.high };
+        } else if (isSpeaking && envelopePendingRef.current) {
+            // Envelope still rendering (streamed clip): generic talking motion until it arrives
+            const t = state.clock.elapsedTime;
+            voice = { mouth: 0.15 + 0.15 * Math.abs(Math.sin(t * 9)), bass: 0, mid: 1, high: 0 };
+        } else if (isSpeaking && analyserRef.current) {
             const dataArray = new Uint8Array(analyserRef.current.frequencyBinCount);
             analyserRef.current.getByteFrequencyData(dataArray);
 
@@ -91,23 +122,26 @@ function Avatar({ audioRef, isSpeaking }: AvatarProps) {
             const high = dataArray.slice(16, 40).reduce((a, b) => a + b, 0) / 24 / 255;
             const overall = (bass + mid * 2 + high) / 4;
 
-            if (overall > 0.03) {
-                targetMouth = Math.min(0.7, overall * 2);
-
-                // Natural viseme variation based on frequencies
-                if (bass > mid * 0.8) {
-                    // Low sounds: O, U
-                    targetO = targetMouth * 0.8;
-                    targetAA = targetMouth * 0.3;
-                } else if (high > mid * 1.2) {
-                    // High sounds: E, I, S
-                    targetE = targetMouth * 0.7;
-                    targetI = targetMouth * 0.5;
-                } else {
-                    // Mid sounds: A, mixed
-                    targetAA = targetMouth * 0.8;
-                    targetE = targetMouth * 0.2;
-                }
+            if (overall > 0.03) voice = { mouth: Math.min(0.7, overall * 2), bass, mid, high };
+        }
+
+        if (voice && voice.mouth > 0.02) {
+            const { bass, mid, high } = voice;
+            targetMouth = voice.mouth;
+
+            // Natural viseme variation based on frequencies
+            if (bass > mid * 0.8) {
+                // Low sounds: O, U
+                targetO = targetMouth * 0.8;
+                targetAA = targetMouth * 0.3;
+            } else if (high > mid * 1.2) {
+                // High sounds: E, I, S
+                targetE = targetMouth * 0.7;
+                targetI = targetMouth * 0.5;
+            } else {
+                // Mid sounds: A, mixed
+                targetAA = targetMouth * 0.8;
+                targetE = targetMouth * 0.2;
             }
         }
 
@@ -0,0 +1,36 @@
+// Server-computed lip-sync envelopes (backend/services/lipsync.py).
+// Each frame is `channels` bytes: level, low, mid, high (0-255), `rate` frames per second.
+
+export interface LipSyncEnvelope {
+    rate: number;
+    channels: number;
+    data: Uint8Array;
+}
+
+export interface LipSyncFrame {
+    level: number; // 0..1 loudness relative to the clip's peak
+    low: number;   // 0..1 share of energy per band
+    mid: number;
+    high: number;
+}
+
+export const fetchLipSyncEnvelope = async (url: string): Promise<LipSyncEnvelope | null> => {
+    try {
+        const res = await fetch(url);
+        if (!res.ok) return null;
+        return {
+            rate: Number(res.headers.get('X-Envelope-Rate')) || 60,
+            channels: Number(res.headers.get('X-Envelope-Channels')) || 4,
+            data: new Uint8Array(await res.arrayBuffer()),
+        };
+    } catch {
+        return null;
+    }
+};
+
+export const sampleLipSync = (envelope: LipSyncEnvelope, time: number): LipSyncFrame | null => {
+    const i = Math.floor(time * envelope.rate) * envelope.channels;
+    if (i < 0 || i + envelope.channels > envelope.data.length) return null;
+    const d = envelope.data;
+    return { level: d[i] / 255, low: d[i + 1] / 255, mid: d[i + 2] / 255, high: d[i + 3] / 255 };
+};